@@ -0,0 +1,41 @@
+"""Run the API with uvicorn and the tuned permessage-deflate settings.
+
+    python -m backend.app --host 0.0.0.0 --port 8192
+
+With ``--workers N`` (or WORKERS) the workers share one capture hub (see
+services/capture_hub.py) on CAPTURE_HUB_SOCKET, which defaults to a
+socket in the temp directory named after the port.
+"""
+import argparse
+import os
+import tempfile
+
+import uvicorn
+
+from .websocket.deflate import DeflateWebSocketProtocol
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8192)
+    parser.add_argument("--reload", action="store_true")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WORKERS") or 1))
+    args = parser.parse_args()
+
+    if args.workers > 1 and not os.environ.get("CAPTURE_HUB_SOCKET"):
+        os.environ["CAPTURE_HUB_SOCKET"] = os.path.join(
+            tempfile.gettempdir(), f"claude-code-control-{os.getuid()}-{args.port}.sock")
+
+    uvicorn.run(
+        f"{__package__}.main:app",
+        host=args.host,
+        port=args.port,
+        reload=args.reload,
+        workers=args.workers,
+        ws=DeflateWebSocketProtocol,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Server-side SGR parsing for terminal captures.
+
+Turns ``capture-pane -e`` lines into style runs so clients that ask for the
+``spans`` render profile do not have to parse escape sequences, and strips
+them for the ``plain`` profile. Semantics follow the Flutter client's
+AnsiParser (flutter_app/lib/utils/ansi_parser.dart), except that styles
+carry over from one line to the next the way tmux emits them.
+
+A style is a tuple ``(fg, bg, attrs)``: colors are None (default), a
+palette index 0-255 (30-37 -> 0-7, 90-97 -> 8-15, 38;5;n -> n) or a
+``"#rrggbb"`` string, and attrs is a bitmask of the ATTR_* flags. On the
+wire each distinct style becomes a dict in a per-message ``styles`` table
+(``{"fg", "bg", "bold", "dim", "italic", "underline", "reverse",
+"strike"}``, defaults omitted) and each line a list of ``[text, style
+index]`` runs.
+
+parse_line() is memoized on (line, incoming style): unchanged lines of
+the next frame, and identical lines across targets, are never re-parsed.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+RENDER_PROFILES = ("raw", "plain", "spans")
+
+ATTR_BOLD = 1
+ATTR_DIM = 2
+ATTR_ITALIC = 4
+ATTR_UNDERLINE = 8
+ATTR_REVERSE = 16
+ATTR_STRIKE = 32
+
+_ATTR_NAMES = (
+    (ATTR_BOLD, "bold"),
+    (ATTR_DIM, "dim"),
+    (ATTR_ITALIC, "italic"),
+    (ATTR_UNDERLINE, "underline"),
+    (ATTR_REVERSE, "reverse"),
+    (ATTR_STRIKE, "strike"),
+)
+_SET_ATTRS = {1: ATTR_BOLD, 2: ATTR_DIM, 3: ATTR_ITALIC, 4: ATTR_UNDERLINE, 7: ATTR_REVERSE, 9: ATTR_STRIKE}
+_CLEAR_ATTRS = {
+    22: ATTR_BOLD | ATTR_DIM,
+    23: ATTR_ITALIC,
+    24: ATTR_UNDERLINE,
+    27: ATTR_REVERSE,
+    29: ATTR_STRIKE,
+}
+
+# Distinct (line, style) pairs remembered by parse_line
+PARSE_CACHE_SIZE = 16384
+
+Color = Union[None, int, str]
+Style = Tuple[Color, Color, int]
+DEFAULT_STYLE: Style = (None, None, 0)
+Span = Tuple[str, Style]
+
+# CSI sequences (SGR is the one with final byte "m") and OSC sequences
+# such as hyperlinks, terminated by BEL or ST
+_ESCAPE_PATTERN = re.compile(r'\x1b\[([0-9;:?]*)[ -/]*([@-~])|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)?')
+
+
+def _extended_color(params: List[int], i: int) -> Tuple[Color, int]:
+    """Color for 38/48 at params[i]; returns (color or False, params consumed)"""
+    if i + 2 < len(params) and params[i + 1] == 5:
+        return params[i + 2] & 0xFF, 2
+    if i + 4 < len(params) and params[i + 1] == 2:
+        r, g, b = (min(255, p) for p in params[i + 2:i + 5])
+        return f"#{r:02x}{g:02x}{b:02x}", 4
+    return False, 0
+
+
+def apply_sgr(style: Style, params_text: str) -> Style:
+    """Style after one SGR sequence with the given parameters"""
+    fg, bg, attrs = style
+    if not params_text:
+        return DEFAULT_STYLE
+    params = [int(p) if p.isdigit() else 0 for p in params_text.replace(":", ";").split(";")]
+    i = 0
+    while i < len(params):
+        p = params[i]
+        if p == 0:
+            fg, bg, attrs = DEFAULT_STYLE
+        elif p in _SET_ATTRS:
+            attrs |= _SET_ATTRS[p]
+        elif p in _CLEAR_ATTRS:
+            attrs &= ~_CLEAR_ATTRS[p]
+        elif 30 <= p <= 37:
+            fg = p - 30
+        elif p == 38 or p == 48:
+            color, used = _extended_color(params, i)
+            if color is not False:
+                if p == 38:
+                    fg = color
+                else:
+                    bg = color
+            i += used
+        elif p == 39:
+            fg = None
+        elif 40 <= p <= 47:
+            bg = p - 40
+        elif p == 49:
+            bg = None
+        elif 90 <= p <= 97:
+            fg = p - 90 + 8
+        elif 100 <= p <= 107:
+            bg = p - 100 + 8
+        i += 1
+    return fg, bg, attrs
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_line(line: str, style: Style = DEFAULT_STYLE) -> Tuple[Tuple[Span, ...], Style]:
+    """Split a line into (text, style) runs; returns the runs and the style at its end"""
+    if "\x1b" not in line:
+        return ((line, style),) if line else (), style
+    spans: List[Span] = []
+    last = 0
+    for match in _ESCAPE_PATTERN.finditer(line):
+        if match.start() > last:
+            spans.append((line[last:match.start()], style))
+        last = match.end()
+        if match.group(2) == "m":
+            style = apply_sgr(style, match.group(1))
+    if last < len(line):
+        spans.append((line[last:], style))
+    # Merge neighbours a no-op sequence split apart
+    merged: List[Span] = []
+    for text, span_style in spans:
+        if merged and merged[-1][1] == span_style:
+            merged[-1] = (merged[-1][0] + text, span_style)
+        else:
+            merged.append((text, span_style))
+    return tuple(merged), style
+
+
+def strip_ansi(line: str) -> str:
+    if "\x1b" not in line:
+        return line
+    return _ESCAPE_PATTERN.sub("", line)
+
+
+def style_dict(style: Style) -> Dict[str, Any]:
+    fg, bg, attrs = style
+    result: Dict[str, Any] = {}
+    if fg is not None:
+        result["fg"] = fg
+    if bg is not None:
+        result["bg"] = bg
+    for flag, name in _ATTR_NAMES:
+        if attrs & flag:
+            result[name] = True
+    return result
+
+
+class StyleTable:
+    """Collects the distinct styles of one message"""
+
+    def __init__(self):
+        self._index: Dict[Style, int] = {}
+        self.styles: List[Dict[str, Any]] = []
+
+    def encode_line(self, spans: Tuple[Span, ...]) -> List[List[Any]]:
+        runs = []
+        for text, style in spans:
+            index = self._index.get(style)
+            if index is None:
+                index = self._index[style] = len(self.styles)
+                self.styles.append(style_dict(style))
+            runs.append([text, index])
+        return runs
+
+
+def parse_lines(lines: List[str], style: Style = DEFAULT_STYLE) -> List[Tuple[Tuple[Span, ...], Style]]:
+    """parse_line over consecutive lines, carrying the style across them"""
+    parsed = []
+    for line in lines:
+        spans, end = parse_line(line, style)
+        parsed.append((spans, style))
+        style = end
+    return parsed
+
+
+def line_start_styles(lines: List[str]) -> List[Style]:
+    """Style in effect at the start of each line"""
+    return [start for _, start in parse_lines(lines)]
+
+
+def spans_view(lines: List[str], starts: Optional[List[Style]] = None,
+               indices: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Style table and runs for `lines` (or only the lines at `indices`)"""
+    if starts is None:
+        starts = line_start_styles(lines)
+    table = StyleTable()
+    selected = range(len(lines)) if indices is None else indices
+    encoded = [table.encode_line(parse_line(lines[i], starts[i])[0]) for i in selected]
+    return {"styles": table.styles, "lines": encoded}
@@ -0,0 +1,93 @@
+"""Detection of numbered Yes/No menus (e.g. "1. Yes" / "2. No") at the
+bottom of a pane.
+
+A port of the Flutter client's ChoiceDetector
+(flutter_app/lib/utils/choice_detector.dart): only the last
+CHOICE_TAIL_LINES lines count, the numbers must run 1, 2, ... up to the
+last numbered line, and every option must start with "Yes" or "No".
+
+ChoiceTracker runs it once per frame, and only when a change touched that
+tail, so the monitor can tell clients when a menu appears or goes away
+(``{"type": "choices", "target", "seq", "timestamp", "choices":
+[{"number", "text"}, ...]}``, an empty list once it is gone). Only
+connections that opted into events get it; plain per-target clients
+keep receiving nothing but output, heartbeats and pongs.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from .ansi import strip_ansi
+
+# Same as AppConfig.choiceTailLines on the client
+CHOICE_TAIL_LINES = 20
+
+_CHOICE_PATTERN = re.compile(r'([0-9]+)\.\s+(.+)$')
+_YES_NO_PREFIXES = ("Yes", "No")
+
+
+def tail_range(lines: List[str]) -> range:
+    """Indices of the lines detect() looks at (the output is trimmed first)"""
+    end = len(lines)
+    while end > 0 and not lines[end - 1].strip():
+        end -= 1
+    return range(max(0, end - CHOICE_TAIL_LINES), end)
+
+
+def detect_lines(lines: List[str]) -> List[Dict[str, Any]]:
+    """Choices as [{"number", "text"}], or [] when there is no Yes/No menu"""
+    matched = []
+    for i in tail_range(lines):
+        match = _CHOICE_PATTERN.search(strip_ansi(lines[i]).strip())
+        if match is not None:
+            matched.append((int(match.group(1)), match.group(2)))
+    if len(matched) < 2:
+        return []
+
+    # Consecutive numbers ending at the last numbered line
+    result = [matched[-1]]
+    for number, text in reversed(matched[:-1]):
+        if number == result[0][0] - 1:
+            result.insert(0, (number, text))
+    if len(result) < 2 or result[0][0] != 1:
+        return []
+
+    if not all(text.strip().startswith(_YES_NO_PREFIXES) for _, text in result):
+        return []
+    return [{"number": number, "text": text} for number, text in result]
+
+
+def detect(output: str) -> List[Dict[str, Any]]:
+    if not output:
+        return []
+    return detect_lines(output.split('\n'))
+
+
+class ChoiceTracker:
+    """Choices of one target across its frames"""
+
+    __slots__ = ("choices", "_tail", "detections")
+
+    def __init__(self):
+        self.choices: List[Dict[str, Any]] = []
+        self._tail: Optional[range] = None
+        # Frames whose tail had to be scanned again
+        self.detections = 0
+
+    def update(self, lines: List[str], changes: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+        """New choices if they changed with this frame, else None.
+
+        `changes` are the frame's delta changes (None for a keyframe, which
+        is always scanned).
+        """
+        tail = tail_range(lines)
+        if changes is not None and tail == self._tail and not any(
+                change["start"] < tail.stop and change["start"] + len(change["lines"]) > tail.start
+                for change in changes):
+            return None
+        self._tail = tail
+        self.detections += 1
+        choices = detect_lines(lines)
+        if choices == self.choices:
+            return None
+        self.choices = choices
+        return choices
@@ -1,11 +1,27 @@
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from .config import settings
 from .routers import tmux_router, settings_router, file_router
+from .routers.tmux import capture_scheduler, pane_aliases
+from .services.output_events import close_output_events
+from .services.tmux_control import close_control_clients
 
-app = FastAPI(title=settings.app_name)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Also releases the capture hub if this worker owns it
+    await capture_scheduler.close()
+    await pane_aliases.close()
+    await close_output_events()
+    await close_control_clients()
+
+
+app = FastAPI(title=settings.app_name, lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
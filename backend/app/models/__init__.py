@@ -1,3 +1,3 @@
-from .tmux import CommandRequest, TmuxSettings, TmuxOutput, ApiResponse
+from .tmux import CommandRequest, InputItem, InputRequest, TmuxSettings, TmuxOutput, ScrollbackPage, ApiResponse
 
-__all__ = ["CommandRequest", "TmuxSettings", "TmuxOutput", "ApiResponse"]
\ No newline at end of file
+__all__ = ["CommandRequest", "InputItem", "InputRequest", "TmuxSettings", "TmuxOutput", "ScrollbackPage", "ApiResponse"]
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Any
+from pydantic import BaseModel, model_validator
+from typing import List, Optional, Any
 
 
 class CommandRequest(BaseModel):
@@ -8,6 +8,22 @@ class CommandRequest(BaseModel):
     literal: bool = True  # True: send text literally (-l), False: interpret key names
 
 
+class InputItem(BaseModel):
+    text: Optional[str] = None  # sent literally
+    key: Optional[str] = None  # tmux key name: Enter, Escape, C-c, Up, ...
+
+    @model_validator(mode="after")
+    def _one_of_text_or_key(self):
+        if (self.text is None) == (self.key is None):
+            raise ValueError("each item needs exactly one of text or key")
+        return self
+
+
+class InputRequest(BaseModel):
+    target: str
+    items: List[InputItem]  # sent in order in a single tmux call
+
+
 class TmuxSettings(BaseModel):
     capture_history: bool = True
 
@@ -18,6 +34,16 @@ class TmuxOutput(BaseModel):
     target: str
 
 
+class ScrollbackPage(BaseModel):
+    content: str
+    timestamp: str
+    target: str
+    start: int  # absolute index of the first line, 0 = oldest history line
+    end: int  # absolute index after the last line
+    history_size: int
+    cursor: Optional[str] = None  # pass back for the next older page; None at the top
+
+
 class ApiResponse(BaseModel):
     success: bool
     message: str
@@ -1,28 +1,67 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 from typing import Optional, TypeVar, Callable, Awaitable
+import hashlib
 import json
+import os
 import asyncio
 import logging
 
-from ..models import CommandRequest, TmuxOutput, ApiResponse
+from ..models import CommandRequest, InputRequest, TmuxOutput, ScrollbackPage, ApiResponse
+from ..ansi import RENDER_PROFILES
+from ..serialization import dumps, json_response
+from ..streaming import gzip_chunks, ndjson_lines, prepend
 
 logger = logging.getLogger(__name__)
 from ..services import TmuxService
+from ..services.tmux_service import clamp_window_size, validate_tmux_target
+from ..services.capture_hub import CaptureHub, HubClient
+from ..services.capture_scheduler import CaptureScheduler
+from ..services.overview import DEFAULT_OVERVIEW_INTERVAL, DEFAULT_OVERVIEW_LINES, OverviewStream
+from ..services.pane_aliases import PaneAliases
+from ..services.resize import DEFAULT_RESIZE_DEBOUNCE, RESIZE_POLICIES, ResizeCoordinator
+from ..services.scrollback import (
+    DEFAULT_BUFFER_BUDGET, DEFAULT_PAGE_LINES, MAX_PAGE_LINES, CursorExpired, ScrollbackCursor, ScrollbackStore,
+)
 from ..websocket import ConnectionManager
+from ..websocket.binary import SUBPROTOCOL, parse_client_message
+from ..websocket.compression import COMPRESSION_MODES, deflate_stats
+from ..websocket.frames import FrameStream
+from ..websocket.input import InputQueue, input_ack_message, parse_input_message
 
 router = APIRouter(prefix="/api/tmux", tags=["tmux"])
 tmux_service = TmuxService()
 manager = ConnectionManager()
 
-# Background task to monitor tmux output
-background_tasks = {}
-last_outputs = {}
-target_intervals: dict[str, float] = {}
+# Keyed by pane id: every spelling of a target shares one (see pane_aliases)
+frame_streams: dict[str, FrameStream] = {}
 
 DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_OUTPUT_MAX_AGE = 1.0
 MIN_POLL_INTERVAL = 0.1
 MAX_POLL_INTERVAL = 10.0
+# An idle polled target's cheap activity probe backs off no further than this
+MAX_PROBE_INTERVAL = 1.0
+# Event-driven monitoring: let a burst of %output settle before capturing
+OUTPUT_EVENT_SETTLE = 0.02
+# Memory for the in-memory scrollback of monitored targets
+SCROLLBACK_BUFFER_BYTES = int(os.environ.get("SCROLLBACK_BUFFER_MB") or 0) * 1024 * 1024 or DEFAULT_BUFFER_BUDGET
+# Which client's size wins when several share a window (see services/resize.py)
+RESIZE_POLICY = os.environ.get("RESIZE_POLICY", "latest").lower()
+if RESIZE_POLICY not in RESIZE_POLICIES:
+    logger.warning(f"Unknown RESIZE_POLICY {RESIZE_POLICY}, using latest")
+    RESIZE_POLICY = "latest"
+RESIZE_DEBOUNCE = float(os.environ.get("RESIZE_DEBOUNCE_MS") or DEFAULT_RESIZE_DEBOUNCE * 1000) / 1000
+# Unix socket of the capture hub shared by all workers, unset for a
+# single worker (see services/capture_hub.py)
+CAPTURE_HUB_SOCKET = os.environ.get("CAPTURE_HUB_SOCKET") or None
+# Rate and depth of the all-panes overview (see services/overview.py)
+OVERVIEW_INTERVAL = float(os.environ.get("OVERVIEW_INTERVAL_MS") or DEFAULT_OVERVIEW_INTERVAL * 1000) / 1000
+OVERVIEW_LINES = int(os.environ.get("OVERVIEW_LINES") or DEFAULT_OVERVIEW_LINES)
+# How old a monitored target's last capture may be to answer GET /output
+# without capturing again; 0 always captures
+OUTPUT_MAX_AGE = float(os.environ.get("OUTPUT_MAX_AGE_MS") or DEFAULT_OUTPUT_MAX_AGE * 1000) / 1000
 
 T = TypeVar('T')
 
@@ -58,6 +97,27 @@ def _require_success(success: bool, failure_detail: str) -> None:
         raise HTTPException(status_code=500, detail=failure_detail)
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header (weak comparison, per RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def _conditional_response(request: Request, payload: ApiResponse) -> Response:
+    """Serialize payload with a strong ETag, answering 304 if the client has it"""
+    response = json_response(payload)
+    etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
+
+
 @router.post("/send-command")
 async def send_command(request: CommandRequest):
     """Send command to tmux session"""
@@ -66,6 +126,7 @@ async def send_command(request: CommandRequest):
     async def _op():
         success = await tmux_service.send_command(request.command, request.target, literal=request.literal)
         _require_success(success, "Failed to send command")
+        _request_capture(request.target)
         return ApiResponse(success=True, message="Command sent successfully")
 
     return await _handle_tmux_operation(_op, "sending command")
@@ -79,20 +140,62 @@ async def send_enter(target: str):
     async def _op():
         success = await tmux_service.send_enter(target)
         _require_success(success, "Failed to send enter")
+        _request_capture(target)
         return ApiResponse(success=True, message="Enter sent successfully")
 
     return await _handle_tmux_operation(_op, "sending enter")
 
 
+@router.post("/send-input")
+async def send_input(request: InputRequest):
+    """Send an ordered batch of text and keys (e.g. a command, then Enter) in one tmux call"""
+    _validate_target(request.target)
+
+    async def _op():
+        items = [("key", item.key) if item.key is not None else ("text", item.text)
+                 for item in request.items]
+        success = await tmux_service.send_input(request.target, items)
+        _require_success(success, "Failed to send input")
+        _request_capture(request.target)
+        return ApiResponse(success=True, message="Input sent successfully")
+
+    return await _handle_tmux_operation(_op, "sending input")
+
+
+async def _window_size(target: str):
+    return await tmux_service.get_window_size(target)
+
+
+async def _resize_window(target: str, cols: int, rows: int) -> bool:
+    return await tmux_service.resize_pane(target, cols, rows)
+
+
+# Resize requests, debounced and merged per window
+resize_coordinator = ResizeCoordinator(
+    _window_size, _resize_window, policy=RESIZE_POLICY, debounce=RESIZE_DEBOUNCE,
+)
+
+
 @router.post("/resize")
-async def resize_pane(target: str, cols: int = 80, rows: int = 24):
-    """Resize tmux pane to match frontend terminal dimensions"""
+async def resize_pane(request: Request, target: str, cols: int = 80, rows: int = 24,
+                      client_id: Optional[str] = None):
+    """Resize tmux pane to match frontend terminal dimensions.
+
+    Requests for the same window are merged (see services/resize.py);
+    `client_id` tells apart clients behind the same address.
+    """
     _validate_target(target)
+    client = client_id or (request.client.host if request.client else "unknown")
 
     async def _op():
-        success = await tmux_service.resize_pane(target, cols, rows)
-        _require_success(success, "Failed to resize pane")
-        return ApiResponse(success=True, message=f"Pane resized to {cols}x{rows}")
+        size = clamp_window_size(cols, rows)
+        result = await resize_coordinator.request(target, f"http:{client}", *size)
+        _require_success(result is not None, "Failed to resize pane")
+        return ApiResponse(
+            success=True,
+            message=f"Pane resized to {result.cols}x{result.rows}",
+            data={"cols": result.cols, "rows": result.rows, "resized": result.resized},
+        )
 
     return await _handle_tmux_operation(_op, "resizing pane")
 
@@ -101,9 +204,18 @@ async def resize_pane(target: str, cols: int = 80, rows: int = 24):
 async def get_output(target: str, include_history: bool = False, lines: Optional[int] = None):
     """Get current tmux target output, optionally including scrollback history"""
     _validate_target(target)
+    if lines is not None and lines < 0:
+        raise HTTPException(status_code=422, detail="lines must not be negative")
+    # Like tmux capture-pane, 0 means the whole history
+    lines = lines or None
 
     async def _op():
-        output = await tmux_service.get_output(target, include_history=include_history, lines=lines)
+        if include_history:
+            output = await _buffered_history_output(target, lines)
+        else:
+            output = _monitored_output(target)
+        if output is None:
+            output = await tmux_service.get_output(target, include_history=include_history, lines=lines)
         return TmuxOutput(
             content=output,
             timestamp=datetime.now().isoformat(),
@@ -113,26 +225,94 @@ async def get_output(target: str, include_history: bool = False, lines: Optional
     return await _handle_tmux_operation(_op, "getting output")
 
 
+async def _open_history_stream(target: str, escapes: bool = True):
+    """Start streaming a target's full history, raising HTTP errors before the response starts"""
+    chunks = tmux_service.stream_history(target, escapes=escapes)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error streaming output: {str(e)}")
+    return prepend(first, chunks)
+
+
+@router.get("/output/stream")
+async def stream_output(target: str, format: str = "ndjson"):
+    """Full history and screen, streamed as NDJSON line batches or chunked text"""
+    _validate_target(target)
+    if format not in ("ndjson", "text"):
+        raise HTTPException(status_code=422, detail="format must be ndjson or text")
+
+    body = await _open_history_stream(target)
+    if format == "text":
+        return StreamingResponse(body, media_type="text/plain; charset=utf-8")
+    return StreamingResponse(ndjson_lines(body, target), media_type="application/x-ndjson")
+
+
+@router.get("/output/export")
+async def export_output(target: str, escapes: bool = False):
+    """Download a target's full history as a gzip-compressed text file"""
+    _validate_target(target)
+    body = await _open_history_stream(target, escapes=escapes)
+    filename = f"{target.replace(':', '_')}-{datetime.now():%Y%m%d-%H%M%S}.txt.gz"
+    return StreamingResponse(
+        gzip_chunks(body),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/scrollback")
+async def get_scrollback(target: str, lines: int = DEFAULT_PAGE_LINES, cursor: Optional[str] = None):
+    """Page backwards through a target's scrollback, `lines` rows at a time"""
+    _validate_target(target)
+    if not 1 <= lines <= MAX_PAGE_LINES:
+        raise HTTPException(status_code=422, detail=f"lines must be between 1 and {MAX_PAGE_LINES}")
+
+    async def _op():
+        try:
+            page = await _buffered_scrollback_page(target, lines, cursor)
+            if page is None:
+                page = await tmux_service.get_scrollback_page(target, lines=lines, cursor=cursor)
+        except CursorExpired as e:
+            raise HTTPException(status_code=410, detail=str(e))
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return ScrollbackPage(timestamp=datetime.now().isoformat(), target=target, **page)
+
+    return await _handle_tmux_operation(_op, "getting scrollback")
+
+
 @router.get("/sessions")
-async def get_sessions():
+async def get_sessions(request: Request):
     """Get list of available tmux sessions"""
     async def _op():
         sessions = await tmux_service.get_sessions()
-        return ApiResponse(
+        return _conditional_response(request, ApiResponse(
             success=True,
             message="Sessions retrieved successfully",
             data={"sessions": sessions, "count": len(sessions)}
-        )
+        ))
 
     return await _handle_tmux_operation(_op, "getting sessions")
 
 
 @router.get("/hierarchy")
-async def get_hierarchy():
+async def get_hierarchy(request: Request):
     """Get complete tmux hierarchy (sessions -> windows -> panes)"""
     async def _op():
         hierarchy = await tmux_service.get_hierarchy()
-        return ApiResponse(success=True, message="Hierarchy retrieved successfully", data=hierarchy)
+        return _conditional_response(
+            request,
+            ApiResponse(success=True, message="Hierarchy retrieved successfully", data=hierarchy)
+        )
 
     return await _handle_tmux_operation(_op, "getting hierarchy")
 
@@ -219,95 +399,423 @@ async def rename_window(session_name: str, window_index: str, new_name: str):
 
 
 @router.get("/status")
-async def get_status():
+async def get_status(request: Request):
     """Get tmux status and available sessions"""
     async def _op():
         sessions = await tmux_service.get_sessions()
-        return ApiResponse(
+        return _conditional_response(request, ApiResponse(
             success=True,
             message="Status retrieved successfully",
             data={"sessions": sessions, "active_connections": manager.get_total_connections()}
-        )
+        ))
 
     return await _handle_tmux_operation(_op, "getting status")
 
 
-async def monitor_target_output(target: str):
-    """Background task to monitor specific tmux target output"""
-    global background_tasks, last_outputs
+@router.get("/compression")
+async def get_compression_stats():
+    """Achieved compression ratio and CPU cost per monitored target"""
+    async def _op():
+        targets = set(frame_streams) | set(deflate_stats)
+        data = {}
+        for target in sorted(targets):
+            stream = frame_streams.get(target)
+            deflate = deflate_stats.get(target)
+            data[target] = {
+                "zstd": stream.compression_stats() if stream is not None else None,
+                "deflate": deflate.as_dict() if deflate is not None else None,
+            }
+        return ApiResponse(success=True, message="Compression statistics retrieved", data=data)
+
+    return await _handle_tmux_operation(_op, "getting compression statistics")
+
+
+@router.get("/stats")
+async def get_monitor_stats():
+    """Counters of this worker's monitoring machinery: connections and their
+    send queues, the capture hub (if this worker runs it), the overview
+    stream, pane aliases, resizes and the scrollback buffers"""
+    async def _op():
+        hub = getattr(capture_scheduler, "hub", None)
+        data = {
+            "connections": manager.get_connection_stats(),
+            "capture_hub": hub.stats() if hub is not None else None,
+            "overview": overview_stream.stats(),
+            "pane_aliases": pane_aliases.stats(),
+            "resize": resize_coordinator.stats(),
+            "scrollback": scrollback_store.stats(),
+        }
+        return ApiResponse(success=True, message="Monitor statistics retrieved", data=data)
+
+    return await _handle_tmux_operation(_op, "getting monitor statistics")
+
+
+async def _capture_targets(targets: list[str]) -> dict[str, str]:
+    outputs = await tmux_service.capture_targets(targets)
+    try:
+        await scrollback_store.sync(targets)
+    except Exception as e:
+        logger.error(f"Error syncing scrollback for {len(targets)} targets: {e}")
+    return outputs
+
+
+async def _probe_targets(targets: list[str]):
+    return await tmux_service.probe_targets(targets)
+
+
+async def _subscribe_output(target: str):
+    return await tmux_service.subscribe_output(target)
+
+
+async def publish_target_output(target: str, output: str):
+    """Broadcast a pane's captured output if it changed, to the clients of
+    every alias of it"""
+    stream = frame_streams.get(target)
+    if stream is None:
+        stream = frame_streams[target] = FrameStream(target)
+    frame = stream.update(output)
+    if frame is not None:
+        for alias in pane_aliases.aliases(target):
+            await manager.broadcast_frame(alias, frame)
+            if frame.choices is not None:
+                await manager.broadcast_event(alias, frame.choices_message(alias))
+
+
+async def _resolve_pane_ids(targets: list[str]):
+    return await tmux_service.resolve_pane_ids(targets)
+
+
+async def _move_alias(alias: str, old: str, new: str):
+    """An alias now names another pane: monitor that one and resync its clients"""
+    capture_scheduler.add(new)
+    if not pane_aliases.in_use(old):
+        _stop_monitoring(old)
+    manager.resync(alias)
+    stream = frame_streams.get(new)
+    if stream is not None and stream.last is not None:
+        await manager.broadcast_frame(alias, stream.last)
+
+
+# Monitors, frame streams and scrollback are keyed by tmux's pane id, so
+# "main", "main:0" and "main:0.0" share one capture while clients still
+# see the target they asked for
+pane_aliases = PaneAliases(_resolve_pane_ids, _move_alias)
+tmux_service.add_topology_listener(pane_aliases.topology_changed)
+
+
+async def _seed_scrollback(target: str):
+    return await tmux_service.seed_scrollback(target)
 
-    while target in background_tasks:
-        try:
-            current_output = await tmux_service.get_output(target)
 
-            if current_output != last_outputs.get(target, ""):
-                last_outputs[target] = current_output
-                output_data = TmuxOutput(
-                    content=current_output,
-                    timestamp=datetime.now().isoformat(),
-                    target=target
-                )
-                await manager.broadcast_to_session(target, json.dumps(output_data.dict()))
+async def _history_sizes(targets: list[str]):
+    return await tmux_service.history_sizes(targets)
 
-            interval = target_intervals.get(target, DEFAULT_POLL_INTERVAL)
-            await asyncio.sleep(interval)
 
-        except Exception as e:
-            logger.error(f"Error in monitor task for target {target}: {e}")
-            await asyncio.sleep(5)
+async def _history_tails(rows: dict[str, int]):
+    return await tmux_service.capture_history_tails(rows)
+
+
+# Scrollback of monitored targets, seeded on the first history read and
+# extended after every capture batch
+scrollback_store = ScrollbackStore(
+    _seed_scrollback, _history_sizes, _history_tails, budget=SCROLLBACK_BUFFER_BYTES,
+)
+
+
+async def _buffered_scrollback_page(target: str, lines: int, cursor: Optional[str]):
+    """A scrollback page from memory for monitored targets, or None"""
+    target = pane_aliases.key(target)
+    if target not in capture_scheduler:
+        return None
+    position = ScrollbackCursor.decode(cursor) if cursor else None
+    buffer = await scrollback_store.get(target)
+    return buffer.page(lines, position) if buffer is not None else None
+
+
+def _monitored_output(target: str) -> Optional[str]:
+    """get_output() from the monitor's latest capture if it is fresh enough, or None"""
+    target = pane_aliases.key(target)
+    stream = frame_streams.get(target)
+    if OUTPUT_MAX_AGE <= 0 or target not in capture_scheduler or stream is None:
+        return None
+    return stream.fresh_content(OUTPUT_MAX_AGE)
+
+
+async def _buffered_history_output(target: str, lines: Optional[int]) -> Optional[str]:
+    """get_output(include_history=True) from memory for monitored targets
+    whose latest capture is fresh enough, or None"""
+    content = _monitored_output(target)
+    if content is None:
+        return None
+    buffer = await scrollback_store.get(pane_aliases.key(target))
+    history = buffer.tail(lines) if buffer is not None else None
+    if history is None:
+        return None
+    return '\n'.join([*history, content]).rstrip('\n')
+
+
+def _mark_current(target: str):
+    """A probe or capture found a target unchanged: its output is still fresh"""
+    stream = frame_streams.get(target)
+    if stream is not None:
+        stream.touch()
+
+
+def _make_scheduler(capture, on_output, on_current) -> CaptureScheduler:
+    return CaptureScheduler(
+        capture,
+        on_output,
+        on_current=on_current,
+        subscribe=_subscribe_output,
+        probe=_probe_targets,
+        interval=DEFAULT_POLL_INTERVAL,
+        event_interval=MAX_POLL_INTERVAL,
+        max_interval=MAX_PROBE_INTERVAL,
+        settle=OUTPUT_EVENT_SETTLE,
+    )
+
+
+async def _capture_for_hub(targets: list[str]) -> dict[str, str]:
+    return await tmux_service.capture_targets(targets)
+
+
+async def _publish_hub_output(target: str, output: str):
+    """Output captured by the hub; this worker's scrollback catches up when
+    it is next read rather than once per output in every worker"""
+    scrollback_store.mark_stale(target)
+    await publish_target_output(target, output)
+
+
+# One scheduler captures every monitored target in batches; targets with a
+# control-mode output subscription are captured when tmux reports output,
+# polled ones only when their activity fingerprint changes. With
+# CAPTURE_HUB_SOCKET it runs in a single hub process that every worker
+# subscribes to (see services/capture_hub.py)
+if CAPTURE_HUB_SOCKET:
+    capture_scheduler = HubClient(
+        CAPTURE_HUB_SOCKET,
+        _publish_hub_output,
+        make_hub=lambda: CaptureHub(
+            lambda on_output, on_current: _make_scheduler(_capture_for_hub, on_output, on_current)),
+        on_current=_mark_current,
+    )
+else:
+    capture_scheduler = _make_scheduler(_capture_targets, publish_target_output, _mark_current)
+
+
+async def _capture_pane_tails(lines: int):
+    return await tmux_service.capture_pane_tails(lines)
+
+
+async def _publish_overview(message: str):
+    for websocket in list(overview_stream.clients):
+        await manager.send_personal_message(message, websocket, None)
+
+
+# Last lines of every pane for dashboards, captured in one batch per tick
+# while any multiplexed connection asks for it
+overview_stream = OverviewStream(
+    _capture_pane_tails, _publish_overview, interval=OVERVIEW_INTERVAL, lines=OVERVIEW_LINES,
+)
+
+
+async def _receive_client_message(websocket: WebSocket) -> Optional[dict]:
+    """Next client message as a dict: JSON text or a binary-format frame"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return parse_client_message(message["bytes"])
+    try:
+        parsed = json.loads(message.get("text") or "")
+    except json.JSONDecodeError:
+        return None  # Ignore invalid JSON
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _connection_options(websocket: WebSocket) -> dict:
+    """Protocol options a client picked with query parameters and subprotocols"""
+    # ?compression=zstd opts into binary zstd frames (see websocket/compression.py)
+    compression = websocket.query_params.get("compression", "none").lower()
+    if compression not in COMPRESSION_MODES:
+        compression = "none"
+    # ?render=plain|spans has the server strip or parse SGR sequences (see ansi.py)
+    profile = websocket.query_params.get("render", "raw").lower()
+    if profile not in RENDER_PROFILES:
+        profile = "raw"
+    return {
+        # ?delta=1 opts into keyframe/delta frames (see websocket/frames.py)
+        "delta": websocket.query_params.get("delta", "").lower() in ("1", "true"),
+        "compression": compression,
+        # Offering the binary subprotocol opts into binary frames (see websocket/binary.py)
+        "binary_frames": SUBPROTOCOL in websocket.scope.get("subprotocols", []),
+        "profile": profile,
+        # ?events=1 opts a plain client into events such as `choices`
+        "events": websocket.query_params.get("events", "").lower() in ("1", "true"),
+    }
+
+
+async def _start_target(websocket: WebSocket, target: str, send_current: bool):
+    """Monitor a target a connection just subscribed to and catch it up"""
+    key = await pane_aliases.attach(target)
+    if not manager.has_connections_for_session(target):
+        _release_target(target)  # Gone while the target was resolved
+        return
+    # Start monitoring this pane if no other connection already did
+    capture_scheduler.add(key)
+
+    # Delta clients need a keyframe before they can apply deltas
+    stream = frame_streams.get(key)
+    if stream is None or stream.last is None:
+        return
+    choices = stream.current_choices_message(target) if manager.wants_events(websocket) else None
+    if send_current or choices is not None:
+        await manager.send_frame(websocket, target, stream.last, keyframe=True)
+    # Tell late joiners about a menu that is already waiting for an answer,
+    # after the screen it is on
+    if choices is not None:
+        manager.send_after_frame(websocket, target, choices)
+
+
+def _request_capture(target: str):
+    """Input was sent: capture a monitored target now, whatever its probe
+    backoff, so the echo shows up right away"""
+    capture_scheduler.request(pane_aliases.key(target))
+
+
+def _stop_monitoring(key: str):
+    capture_scheduler.remove(key)
+    frame_streams.pop(key, None)
+    scrollback_store.discard(key)
+
+
+def _release_target(target: str):
+    """Stop monitoring a target once its last connection is gone (and its
+    pane once no other alias of it has connections)"""
+    if not manager.has_connections_for_session(target):
+        deflate_stats.pop(target, None)
+        key = pane_aliases.detach(target)
+        if key is not None:
+            _stop_monitoring(key)
+
+
+class _TargetMessages:
+    """Handles the messages about one target (input, refresh rate, resize,
+    resync) for a connection, with one InputQueue per target"""
+
+    __slots__ = ("websocket", "inputs", "resize_client", "resizes")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        # Keystrokes, applied in seq order per target (see websocket/input.py)
+        self.inputs: dict[str, InputQueue] = {}
+        # This connection's entry in the window's resize policy
+        self.resize_client = f"ws:{id(websocket)}"
+        # Resize requests waiting for their debounced flush
+        self.resizes: set[asyncio.Task] = set()
+
+    def _input_queue(self, target: str) -> InputQueue:
+        queue = self.inputs.get(target)
+        if queue is None:
+            async def send_input(items):
+                sent = await tmux_service.send_input(pane_aliases.key(target), items)
+                _request_capture(target)
+                return sent
+
+            async def send_ack(message):
+                await manager.send_personal_message(message, self.websocket, target)
+
+            queue = self.inputs[target] = InputQueue(send_input, send_ack)
+        return queue
+
+    async def handle(self, target: str, parsed: dict) -> bool:
+        """Apply a message to a target; False if it is not a target message"""
+        kind = parsed.get("type")
+        if kind == "input":
+            seq, items = parse_input_message(parsed)
+            if seq is None:
+                await manager.send_personal_message(
+                    input_ack_message(None, False, error="seq is required"), self.websocket, target)
+            else:
+                self._input_queue(target).submit(seq, items)
+        elif kind == "set_refresh_rate":
+            interval = parsed.get("interval", DEFAULT_POLL_INTERVAL)
+            if isinstance(interval, (int, float)):
+                clamped = max(MIN_POLL_INTERVAL, min(MAX_POLL_INTERVAL, float(interval)))
+                capture_scheduler.set_interval(pane_aliases.key(target), clamped)
+        elif kind == "resize":
+            cols, rows = parsed.get("cols"), parsed.get("rows")
+            if isinstance(cols, int) and isinstance(rows, int):
+                # Not awaited: the merged resize lands after the debounce
+                task = asyncio.ensure_future(resize_coordinator.request(
+                    pane_aliases.key(target), self.resize_client, *clamp_window_size(cols, rows)))
+                self.resizes.add(task)
+                task.add_done_callback(lambda done: self._resized(target, done))
+        elif kind == "resync":
+            stream = frame_streams.get(pane_aliases.key(target))
+            if stream is not None and stream.last is not None:
+                await manager.send_frame(self.websocket, target, stream.last, keyframe=True)
+        else:
+            return False
+        return True
+
+    def _resized(self, target: str, task: asyncio.Task):
+        self.resizes.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logger.error(f"Error resizing {target}: {error}")
+        elif task.result() is None:
+            logger.warning(f"Failed to resize {target}")
+
+    def drop(self, target: str):
+        queue = self.inputs.pop(target, None)
+        if queue is not None:
+            queue.close()
+
+    def close(self):
+        for queue in self.inputs.values():
+            queue.close()
+        self.inputs.clear()
+        resize_coordinator.forget(self.resize_client)
 
 
 @router.websocket("/ws/{target:path}")
 async def websocket_endpoint(websocket: WebSocket, target: str):
     """WebSocket endpoint for real-time tmux output of specific target"""
-    global background_tasks
-
     if not target or not target.strip():
         await websocket.close(code=1008, reason="target is required")
         return
 
-    await manager.connect(websocket, target)
-
-    # Start background monitoring for this target if not already running
-    if target not in background_tasks:
-        task = asyncio.create_task(monitor_target_output(target))
-        background_tasks[target] = task
+    options = _connection_options(websocket)
+    await manager.connect(websocket, target, **options)
 
-    # Send initial heartbeat
-    try:
-        await websocket.send_text(json.dumps({"type": "heartbeat", "timestamp": datetime.now().isoformat()}))
-    except Exception as e:
-        logger.warning(f"Failed to send initial heartbeat: {e}")
+    # Send initial heartbeat; all sends go through the connection's queue
+    await manager.send_heartbeat(websocket, target)
+    await _start_target(websocket, target, send_current=options["delta"])
 
     # Heartbeat task
     async def send_heartbeat():
-        try:
-            while True:
-                await asyncio.sleep(15)  # Send heartbeat every 15 seconds
-                await websocket.send_text(json.dumps({"type": "heartbeat", "timestamp": datetime.now().isoformat()}))
-        except Exception as e:
-            logger.debug(f"Heartbeat stopped: {e}")
-            return
+        while True:
+            await asyncio.sleep(15)  # Send heartbeat every 15 seconds
+            await manager.send_heartbeat(websocket, target)
 
     heartbeat_task = asyncio.create_task(send_heartbeat())
+    messages = _TargetMessages(websocket)
 
     try:
         while True:
             try:
                 # Set timeout for receiving messages - reduced for faster detection
-                message = await asyncio.wait_for(websocket.receive_text(), timeout=20.0)
+                parsed = await asyncio.wait_for(_receive_client_message(websocket), timeout=20.0)
                 # Handle client messages (like heartbeat responses)
-                try:
-                    parsed = json.loads(message)
-                    if parsed.get("type") == "ping":
-                        await websocket.send_text(json.dumps({"type": "pong", "timestamp": datetime.now().isoformat()}))
-                    elif parsed.get("type") == "set_refresh_rate":
-                        interval = parsed.get("interval", DEFAULT_POLL_INTERVAL)
-                        if isinstance(interval, (int, float)):
-                            clamped = max(MIN_POLL_INTERVAL, min(MAX_POLL_INTERVAL, float(interval)))
-                            target_intervals[target] = clamped
-                except json.JSONDecodeError:
-                    pass  # Ignore invalid JSON
+                if parsed is None:
+                    continue
+                if parsed.get("type") == "ping":
+                    await manager.send_pong(websocket, target)
+                else:
+                    await messages.handle(target, parsed)
 
             except asyncio.TimeoutError:
                 # No message received in 20 seconds, continue
@@ -323,14 +831,117 @@ async def websocket_endpoint(websocket: WebSocket, target: str):
     finally:
         # Cleanup
         heartbeat_task.cancel()
+        messages.close()
         manager.disconnect(websocket, target)
 
-        # Stop background task if no active connections for this target
-        if not manager.has_connections_for_session(target):
-            if target in background_tasks:
-                background_tasks[target].cancel()
-                del background_tasks[target]
-                if target in last_outputs:
-                    del last_outputs[target]
-                if target in target_intervals:
-                    del target_intervals[target]
+        # Stop monitoring if no active connections for this target
+        _release_target(target)
+
+
+def _message_targets(parsed: dict) -> list:
+    """Targets named by a subscribe/unsubscribe message ("target" or "targets")"""
+    targets = parsed.get("targets")
+    if targets is None:
+        targets = [parsed.get("target")]
+    if not isinstance(targets, list):
+        return []
+    return [target for target in targets if isinstance(target, str)]
+
+
+@router.websocket("/ws")
+async def multiplexed_websocket_endpoint(websocket: WebSocket):
+    """WebSocket endpoint for the output of any number of targets.
+
+    Clients send ``{"type": "subscribe", "target": "main:0.1"}`` (or
+    ``"targets": [...]``; ``"exclusive": true`` also drops every other
+    subscription, so switching panes is one message) and
+    ``{"type": "unsubscribe", "target"}``. Each subscribe is answered with
+    ``{"type": "subscribed", "target", "id"}`` (a ``target`` control frame
+    in the binary format) followed by the target's current frame; from then
+    on frames and other messages about the target carry ``"id"``. Input,
+    set_refresh_rate, resize and resync messages name their target with
+    ``"target"`` or ``"id"``. Subscribing to a target that is not valid or
+    beyond MAX_SUBSCRIPTIONS gets ``{"type": "error", "target", "error"}``.
+    """
+    options = _connection_options(websocket)
+    await manager.accept(websocket, **options)
+    await manager.send_heartbeat(websocket, None)
+
+    async def send_heartbeat():
+        while True:
+            await asyncio.sleep(15)  # Send heartbeat every 15 seconds
+            await manager.send_heartbeat(websocket, None)
+
+    async def send_error(target, error: str):
+        await manager.send_personal_message(
+            dumps({"type": "error", "target": target, "error": error}), websocket, None)
+
+    async def subscribe(target: str):
+        if not validate_tmux_target(target):
+            await send_error(target, "invalid target")
+            return
+        known = target in manager.subscriptions(websocket)
+        if manager.subscribe(websocket, target) is None:
+            await send_error(target, "too many subscriptions")
+        elif not known:
+            # The first frame is always sent, whatever the client's mode
+            await _start_target(websocket, target, send_current=True)
+
+    def unsubscribe(target: str):
+        if manager.unsubscribe(websocket, target):
+            messages.drop(target)
+            _release_target(target)
+
+    heartbeat_task = asyncio.create_task(send_heartbeat())
+    messages = _TargetMessages(websocket)
+
+    try:
+        while True:
+            try:
+                parsed = await asyncio.wait_for(_receive_client_message(websocket), timeout=20.0)
+                if parsed is None:
+                    continue
+                kind = parsed.get("type")
+                if kind == "ping":
+                    await manager.send_pong(websocket, None)
+                elif kind == "subscribe":
+                    targets = _message_targets(parsed)
+                    if parsed.get("exclusive"):
+                        for target in manager.subscriptions(websocket):
+                            if target not in targets:
+                                unsubscribe(target)
+                    for target in targets:
+                        await subscribe(target)
+                elif kind == "unsubscribe":
+                    for target in _message_targets(parsed):
+                        unsubscribe(target)
+                elif kind == "overview":
+                    if parsed.get("enabled", True):
+                        snapshot = overview_stream.add(websocket)
+                        if snapshot is not None:
+                            await manager.send_personal_message(snapshot, websocket, None)
+                    else:
+                        overview_stream.remove(websocket)
+                else:
+                    target = parsed.get("target")
+                    if isinstance(parsed.get("id"), int):
+                        target = manager.target_for_id(websocket, parsed["id"])
+                    if isinstance(target, str) and target in manager.subscriptions(websocket):
+                        await messages.handle(target, parsed)
+
+            except asyncio.TimeoutError:
+                continue
+            except Exception as e:
+                logger.debug(f"Error receiving message: {e}")
+                break
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error: {e}")
+    finally:
+        heartbeat_task.cancel()
+        messages.close()
+        overview_stream.remove(websocket)
+        for target in manager.disconnect(websocket):
+            _release_target(target)
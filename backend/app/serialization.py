@@ -0,0 +1,27 @@
+"""Fast JSON encoding shared by WebSocket messages and REST responses.
+
+Everything the backend sends goes through orjson: WebSocket frames are
+encoded once per frame and the same string is handed to every subscriber,
+and REST handlers return ORJSONResponse (the app's default response class).
+"""
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> str:
+    """Encode obj as compact JSON text (pydantic models are dumped first)"""
+    return orjson.dumps(obj, default=_default).decode()
+
+
+def json_response(payload: BaseModel, **kwargs: Any) -> ORJSONResponse:
+    """Response for a pydantic model without going through jsonable_encoder"""
+    return ORJSONResponse(payload.model_dump(), **kwargs)
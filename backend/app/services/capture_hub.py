@@ -0,0 +1,326 @@
+"""Capture hub shared by the web workers of one deployment.
+
+With ``uvicorn --workers N`` every worker would run its own
+CaptureScheduler, capturing a pane once per worker that has a client for
+it. When CAPTURE_HUB_SOCKET is set, the scheduler runs in exactly one
+process instead: the hub. Workers talk to it over that Unix socket with
+newline-delimited JSON::
+
+    worker -> hub   {"op": "add", "target"}        start watching
+                    {"op": "remove", "target"}     stop watching
+                    {"op": "interval", "target", "interval"}
+                    {"op": "request", "target"}    capture now
+    hub -> worker   {"op": "output", "target", "output"}
+                    {"op": "current", "target"}    last output still current
+
+The hub captures each target once however many workers watch it and
+sends an output only when it changed; an unchanged capture or probe is
+sent as "current" so workers know how fresh their copy is. A worker that starts watching a
+target the hub already captured gets the latest output right away. Each
+worker turns outputs into frames for its own connections, so encoding
+and fan-out scale with the workers while tmux sees a single poller.
+
+Per worker, by design or for now: frame encoding and fan-out; the
+in-memory scrollback of the targets its clients read, synced lazily on
+read (ScrollbackStore.mark_stale) so only a worker whose client pages
+through history asks tmux for the new rows; and resolving target
+aliases to pane ids (PaneAliases), which re-reads the topology snapshot
+only when that worker's TmuxService reports a topology change.
+
+There is no separate service to run: the first worker that needs the hub
+takes an exclusive lock on ``<socket>.lock`` and serves it in-process.
+The lock is released when that process exits, and the other workers
+reconnect, one of them taking over.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from typing import Callable, Dict, Optional, Set
+
+from ..serialization import dumps
+from .capture_scheduler import CaptureScheduler, CurrentHandler, OutputHandler
+
+logger = logging.getLogger(__name__)
+
+# Largest message either side accepts (a captured screen plus escapes)
+HUB_READ_LIMIT = 16 * 1024 * 1024
+# A worker that lets this much output pile up unread is dropped
+HUB_WRITE_LIMIT = 64 * 1024 * 1024
+RECONNECT_DELAY = 1.0
+
+SchedulerFactory = Callable[[OutputHandler, CurrentHandler], CaptureScheduler]
+
+
+def _line(message: Dict[str, object]) -> bytes:
+    return dumps(message).encode() + b"\n"
+
+
+class CaptureHub:
+    """Owns the capture scheduler and serves workers over a Unix socket.
+
+    `make_scheduler` builds the scheduler from the hub's output and
+    current handlers.
+    """
+
+    def __init__(self, make_scheduler: SchedulerFactory):
+        self._scheduler = make_scheduler(self._on_output, self._on_current)
+        # target -> workers watching it
+        self._watchers: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self._last: Dict[str, str] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._path: Optional[str] = None
+        # Output messages written to workers ("current" notices excluded)
+        self.sent = 0
+
+    async def start(self, path: str) -> None:
+        # Only the lock holder gets here, so an existing socket is stale
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(self._serve, path, limit=HUB_READ_LIMIT)
+        os.chmod(path, 0o600)
+        self._path = path
+        logger.info(f"Capture hub listening on {path}")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        connections = list(self._connections)
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        await self._scheduler.close()
+        if self._path is not None and os.path.exists(self._path):
+            os.unlink(self._path)
+            self._path = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(message, dict) and isinstance(message.get("target"), str):
+                    self._handle(writer, message)
+        except (ConnectionError, ValueError) as e:
+            logger.debug(f"Capture hub worker connection failed: {e}")
+        finally:
+            for target in [target for target, writers in self._watchers.items() if writer in writers]:
+                self._unwatch(writer, target)
+            writer.close()
+            self._connections.discard(task)
+
+    def _handle(self, writer: asyncio.StreamWriter, message: Dict[str, object]) -> None:
+        op, target = message.get("op"), message["target"]
+        if op == "add":
+            self._watchers.setdefault(target, set()).add(writer)
+            self._scheduler.add(target)
+            if target in self._last:
+                self._send(writer, target, self._last[target])
+        elif op == "remove":
+            self._unwatch(writer, target)
+        elif op == "interval" and isinstance(message.get("interval"), (int, float)):
+            self._scheduler.set_interval(target, float(message["interval"]))
+        elif op == "request":
+            self._scheduler.request(target)
+
+    def _unwatch(self, writer: asyncio.StreamWriter, target: str) -> None:
+        writers = self._watchers.get(target)
+        if writers is None:
+            return
+        writers.discard(writer)
+        if not writers:
+            del self._watchers[target]
+            self._last.pop(target, None)
+            self._scheduler.remove(target)
+
+    def _send(self, writer: asyncio.StreamWriter, target: str, output: Optional[str]) -> None:
+        """Send an output, or a "current" notice if `output` is None"""
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > HUB_WRITE_LIMIT:
+            logger.warning("Capture hub worker is not reading, disconnecting it")
+            writer.close()
+            return
+        if output is None:
+            writer.write(_line({"op": "current", "target": target}))
+            return
+        writer.write(_line({"op": "output", "target": target, "output": output}))
+        self.sent += 1
+
+    async def _on_output(self, target: str, output: str) -> None:
+        if target not in self._watchers:
+            return
+        if self._last.get(target) == output:
+            self._on_current(target)
+            return
+        self._last[target] = output
+        for writer in list(self._watchers.get(target, ())):
+            self._send(writer, target, output)
+
+    def _on_current(self, target: str) -> None:
+        if target not in self._last:
+            return  # workers have nothing to keep
+        for writer in list(self._watchers.get(target, ())):
+            self._send(writer, target, None)
+
+    def stats(self) -> Dict[str, object]:
+        return {"targets": len(self._watchers), "sent": self.sent}
+
+
+class HubClient:
+    """A worker's stand-in for CaptureScheduler: forwards add/remove/
+    set_interval/request to the hub and awaits `on_output` for every
+    output it sends, calling `on_current` when it confirms the last one.
+
+    `make_hub` builds the hub if this worker wins the lock. Watches are
+    re-sent after a reconnect.
+    """
+
+    def __init__(self, path: str, on_output: OutputHandler,
+                 make_hub: Optional[Callable[[], CaptureHub]] = None,
+                 reconnect_delay: float = RECONNECT_DELAY,
+                 on_current: Optional[CurrentHandler] = None):
+        self._path = path
+        self._on_output = on_output
+        self._on_current = on_current
+        self._make_hub = make_hub
+        self._reconnect_delay = reconnect_delay
+        self._targets: Set[str] = set()
+        self._intervals: Dict[str, float] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock_fd: Optional[int] = None
+        self.hub: Optional[CaptureHub] = None
+        # Set while connected, for tests
+        self.connected = asyncio.Event()
+
+    def __contains__(self, target: str) -> bool:
+        return target in self._targets
+
+    def add(self, target: str, interval: Optional[float] = None) -> None:
+        if target in self._targets:
+            return
+        self._targets.add(target)
+        if interval is not None:
+            self._intervals[target] = interval
+        self._ensure_running()
+        self._send({"op": "add", "target": target})
+        if interval is not None:
+            self._send({"op": "interval", "target": target, "interval": interval})
+
+    def remove(self, target: str) -> None:
+        if target not in self._targets:
+            return
+        self._targets.discard(target)
+        self._intervals.pop(target, None)
+        self._send({"op": "remove", "target": target})
+
+    def set_interval(self, target: str, interval: float) -> None:
+        if target not in self._targets:
+            return
+        self._intervals[target] = interval
+        self._send({"op": "interval", "target": target, "interval": interval})
+
+    def request(self, target: str) -> None:
+        if target in self._targets:
+            self._send({"op": "request", "target": target})
+
+    async def close(self) -> None:
+        self._targets.clear()
+        self._intervals.clear()
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self.hub is not None:
+            await self.hub.close()
+            self.hub = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = asyncio.create_task(self._run())
+
+    def _send(self, message: Dict[str, object]) -> None:
+        # While disconnected, the state is sent on reconnect instead
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(_line(message))
+
+    def _try_own(self) -> bool:
+        """Take the hub lock if no other process holds it"""
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(f"{self._path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.hub is None and self._make_hub is not None and self._try_own():
+                    hub = self._make_hub()
+                    await hub.start(self._path)
+                    self.hub = hub
+                reader, writer = await asyncio.open_unix_connection(self._path, limit=HUB_READ_LIMIT)
+            except OSError as e:
+                logger.debug(f"Capture hub unavailable: {e}")
+                await asyncio.sleep(self._reconnect_delay)
+                continue
+
+            self._writer = writer
+            for target in self._targets:
+                writer.write(_line({"op": "add", "target": target}))
+                if target in self._intervals:
+                    writer.write(_line({"op": "interval", "target": target, "interval": self._intervals[target]}))
+            self.connected.set()
+            try:
+                await self._read(reader)
+            except (ConnectionError, ValueError) as e:
+                logger.debug(f"Capture hub connection failed: {e}")
+            finally:
+                self._writer = None
+                self.connected.clear()
+                writer.close()
+            logger.warning("Lost the capture hub connection, reconnecting")
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(message, dict) or message.get("op") not in ("output", "current"):
+                continue
+            target = message.get("target")
+            if not isinstance(target, str) or target not in self._targets:
+                continue
+            if message["op"] == "current":
+                if self._on_current is not None:
+                    self._on_current(target)
+                continue
+            try:
+                await self._on_output(target, message.get("output") or "")
+            except Exception as e:
+                logger.error(f"Error publishing output for target {target}: {e}")
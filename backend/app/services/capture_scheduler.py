@@ -0,0 +1,280 @@
+"""Central capture scheduler for monitored tmux targets.
+
+One task captures every monitored target instead of one sleeping loop per
+target. It wakes when the earliest target is due, takes every target due
+within BATCH_WINDOW and captures them with a single batched call, so 30
+watched panes cost one tmux invocation per tick instead of 30 forks.
+
+Each target keeps its own interval. Reschedules are jittered so targets
+added together (e.g. a dashboard reconnecting) drift apart instead of
+all coming due in one large burst forever. Targets with a control-mode
+output subscription are captured when tmux reports output for them, with
+their interval stretched to a safety-net re-capture.
+
+With a `probe`, due targets are first fingerprinted in one cheap batch and
+only those whose fingerprint moved are captured. A polled target that
+stays idle backs off, doubling its delay up to `max_interval`, and snaps
+back to its own interval as soon as the fingerprint changes. A probe that
+shows no change is reported to `on_current`, so whoever caches the last
+output knows it is still current without a capture.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .output_events import PaneOutputSubscription
+
+logger = logging.getLogger(__name__)
+
+# Targets due this close together share one capture
+BATCH_WINDOW = 0.05
+# Reschedules land within +/- this fraction of the target's interval
+SCHEDULE_JITTER = 0.1
+# Delay before retrying targets whose batch raised
+ERROR_BACKOFF = 5.0
+
+CaptureBatch = Callable[[List[str]], Awaitable[Dict[str, str]]]
+# target -> (fingerprint, activity epoch second) or None if unknown
+ProbeBatch = Callable[[List[str]], Awaitable[Dict[str, Optional[Tuple[str, int]]]]]
+OutputHandler = Callable[[str, str], Awaitable[None]]
+# target whose last output a probe just confirmed
+CurrentHandler = Callable[[str], None]
+Subscriber = Callable[[str], Awaitable[Optional[PaneOutputSubscription]]]
+
+
+class ScheduledTarget:
+    """Schedule state for one monitored target"""
+
+    __slots__ = ("target", "interval", "due", "evented", "watcher",
+                 "forced", "fingerprint", "captured_second", "idle")
+
+    def __init__(self, target: str, interval: float):
+        self.target = target
+        self.interval = interval
+        self.due = time.monotonic()
+        # True while a control-mode watcher reports output for the target
+        self.evented = False
+        self.watcher: Optional[asyncio.Task] = None
+        # Capture on the next batch even if the probe shows no change
+        self.forced = True
+        self.fingerprint: Optional[str] = None
+        # Wall-clock second of the last capture, compared to window_activity
+        self.captured_second = 0
+        # Consecutive probes without change, drives the backoff
+        self.idle = 0
+
+    def unchanged(self, probe: Optional[Tuple[str, int]]) -> bool:
+        """Whether a probe proves the content is the same as at the last capture"""
+        if probe is None or self.fingerprint is None:
+            return False
+        fingerprint, activity = probe
+        # Activity has one-second resolution: output later in the same second
+        # as the last capture would leave the fingerprint unchanged
+        return fingerprint == self.fingerprint and activity < self.captured_second
+
+
+class CaptureScheduler:
+    """Captures monitored targets in batches and hands each output to a callback.
+
+    `capture` takes a list of targets and returns their outputs (see
+    TmuxService.capture_targets); `on_output` is awaited once per captured
+    target. `subscribe`, when given, returns an output subscription for a
+    target or None to keep polling it. `probe` (see
+    TmuxService.probe_targets) enables activity-gated capture;
+    `on_current` is then called for each target a probe found unchanged.
+    """
+
+    def __init__(self, capture: CaptureBatch, on_output: OutputHandler,
+                 subscribe: Optional[Subscriber] = None, probe: Optional[ProbeBatch] = None,
+                 interval: float = 2.0, event_interval: float = 10.0,
+                 max_interval: Optional[float] = None, settle: float = 0.0,
+                 batch_window: float = BATCH_WINDOW, jitter: float = SCHEDULE_JITTER,
+                 on_current: Optional[CurrentHandler] = None):
+        self._capture = capture
+        self._on_output = on_output
+        self._on_current = on_current
+        self._subscribe = subscribe
+        self._probe = probe
+        self._interval = interval
+        self._event_interval = event_interval
+        self._max_interval = max_interval if max_interval is not None else event_interval
+        self._settle = settle
+        self._batch_window = batch_window
+        self._jitter = jitter
+        self._targets: Dict[str, ScheduledTarget] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __contains__(self, target: str) -> bool:
+        return target in self._targets
+
+    def add(self, target: str, interval: Optional[float] = None) -> None:
+        """Start monitoring a target; its first capture is due immediately"""
+        if target in self._targets:
+            return
+        entry = ScheduledTarget(target, interval or self._interval)
+        self._targets[target] = entry
+        self._ensure_running()
+        if self._subscribe is not None:
+            entry.watcher = asyncio.create_task(self._watch(entry))
+        self._wake()
+
+    def remove(self, target: str) -> None:
+        entry = self._targets.pop(target, None)
+        if entry is None:
+            return
+        if entry.watcher is not None:
+            entry.watcher.cancel()
+        if not self._targets and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def set_interval(self, target: str, interval: float) -> None:
+        entry = self._targets.get(target)
+        if entry is None:
+            return
+        entry.interval = interval
+        entry.idle = 0
+        entry.due = min(entry.due, time.monotonic() + interval)
+        self._wake()
+
+    def request(self, target: str) -> None:
+        """Capture a target in the next batch, whatever its probe says, and
+        drop its idle backoff (e.g. after input)"""
+        entry = self._targets.get(target)
+        if entry is not None:
+            entry.due = time.monotonic()
+            entry.forced = True
+            entry.idle = 0
+            self._wake()
+
+    async def close(self) -> None:
+        tasks = [entry.watcher for entry in self._targets.values() if entry.watcher is not None]
+        if self._task is not None:
+            tasks.append(self._task)
+        for target in list(self._targets):
+            self.remove(target)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _next_delay(self, entry: ScheduledTarget) -> float:
+        if entry.evented:
+            interval = self._event_interval
+        else:
+            interval = min(self._max_interval, entry.interval * 2 ** min(entry.idle, 16))
+            interval = max(interval, entry.interval)
+        return interval * random.uniform(1 - self._jitter, 1 + self._jitter)
+
+    async def _gate(self, batch: List[ScheduledTarget], forced: List[bool]) -> List[ScheduledTarget]:
+        """Probe the batch and keep the targets that need a full capture"""
+        if self._probe is None:
+            return batch
+        try:
+            probes = await self._probe([entry.target for entry in batch])
+        except Exception as e:
+            logger.debug(f"Activity probe failed, capturing everything: {e}")
+            probes = {}
+
+        changed = []
+        for entry, force in zip(batch, forced):
+            probe = probes.get(entry.target)
+            if not force and entry.unchanged(probe):
+                entry.idle += 1
+                if self._on_current is not None:
+                    self._on_current(entry.target)
+                continue
+            entry.idle = 0
+            entry.fingerprint = probe[0] if probe is not None else None
+            changed.append(entry)
+        return changed
+
+    async def _run(self) -> None:
+        wakeup = self._wakeup
+        while self._targets:
+            wakeup.clear()
+            now = time.monotonic()
+            earliest = min(entry.due for entry in self._targets.values())
+            if earliest > now:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=earliest - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            horizon = now + self._batch_window
+            batch = [entry for entry in self._targets.values() if entry.due <= horizon]
+            forced = [entry.forced for entry in batch]
+            for entry in batch:
+                # In flight; request() during the capture sets a real due time
+                entry.due = float("inf")
+                entry.forced = False
+
+            outputs: Optional[Dict[str, str]] = {}
+            to_capture = await self._gate(batch, forced)
+            if to_capture:
+                captured_second = int(time.time())
+                for entry in to_capture:
+                    entry.captured_second = captured_second
+                try:
+                    outputs = await self._capture([entry.target for entry in to_capture])
+                except Exception as e:
+                    logger.error(f"Error capturing {len(to_capture)} monitored targets: {e}")
+                    outputs = None
+                    for entry in to_capture:
+                        entry.fingerprint = None
+
+            finished = time.monotonic()
+            for entry in batch:
+                if self._targets.get(entry.target) is not entry:
+                    continue
+                if entry.due == float("inf"):
+                    entry.due = finished + (ERROR_BACKOFF if outputs is None else self._next_delay(entry))
+                output = outputs.get(entry.target) if outputs is not None else None
+                if output is None:
+                    continue
+                try:
+                    await self._on_output(entry.target, output)
+                except Exception as e:
+                    logger.error(f"Error publishing output for target {entry.target}: {e}")
+
+    async def _watch(self, entry: ScheduledTarget) -> None:
+        """Request a capture whenever tmux reports output for the target"""
+        try:
+            subscription = await self._subscribe(entry.target)
+        except Exception as e:
+            logger.warning(f"Falling back to polling for target {entry.target}: {e}")
+            return
+        if subscription is None:
+            return
+
+        try:
+            while True:
+                evented = await subscription.available()
+                if evented != entry.evented:
+                    entry.evented = evented
+                    if evented:
+                        # Catch output from before the watcher attached; the
+                        # reschedule after it uses the safety-net interval
+                        self.request(entry.target)
+                    else:
+                        entry.due = min(entry.due, time.monotonic() + entry.interval)
+                        self._wake()
+                if not evented:
+                    # Polled at the target interval until the watcher reattaches
+                    await asyncio.sleep(entry.interval)
+                elif await subscription.wait(self._event_interval, settle=self._settle):
+                    self.request(entry.target)
+        finally:
+            entry.evented = False
+            subscription.close()
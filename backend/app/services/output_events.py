@@ -0,0 +1,159 @@
+"""Event-driven pane output notifications.
+
+tmux only sends ``%output`` notifications to a control client for panes in
+the session it is attached to, so one read-only control client is kept per
+watched session. Subscribers are woken when tmux reports bytes for their
+pane and otherwise cost nothing.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from .tmux_control import TmuxControlClient, TmuxControlUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Watchers never type into panes and must not affect window sizes
+WATCH_CLIENT_FLAGS = "ignore-size,read-only"
+OUTPUT_NOTIFICATIONS = ("%output", "%extended-output")
+# Notifications after which a session/window target may point at another pane
+FOCUS_NOTIFICATIONS = ("%window-pane-changed", "%session-window-changed", "%layout-change")
+
+PaneResolver = Callable[[str], Awaitable[Optional[str]]]
+
+
+class PaneOutputSubscription:
+    """Wakes its owner whenever tmux reports output for one pane."""
+
+    def __init__(self, events: "TmuxOutputEvents", session_id: str, target: str,
+                 pane_id: str, resolve: PaneResolver):
+        self.session_id = session_id
+        self.target = target
+        self.pane_id = pane_id
+        self._events = events
+        self._resolve = resolve
+        self._event = asyncio.Event()
+        self._stale = False
+
+    def notify(self, stale: bool = False) -> None:
+        if stale:
+            self._stale = True
+        self._event.set()
+
+    async def available(self) -> bool:
+        """Whether the session's watcher is attached (reconnecting if needed)."""
+        return await self._events.ensure_session(self.session_id)
+
+    async def wait(self, timeout: float, settle: float = 0.0) -> bool:
+        """Wait for output on the pane; returns False on timeout.
+
+        `settle` keeps collecting the rest of a burst before returning so a
+        fast-printing pane yields one capture instead of dozens.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        if settle > 0:
+            await asyncio.sleep(settle)
+        self._event.clear()
+        if self._stale:
+            self._stale = False
+            pane_id = await self._resolve(self.target)
+            if pane_id and pane_id != self.pane_id:
+                self._events._move(self, pane_id)
+        return True
+
+    def close(self) -> None:
+        self._events._unsubscribe(self)
+
+
+class TmuxOutputEvents:
+    """Per-session output watchers shared by every subscriber on a socket."""
+
+    def __init__(self, socket_path: Optional[str] = None):
+        self._socket_path = socket_path
+        self._clients: Dict[str, TmuxControlClient] = {}
+        self._by_pane: Dict[str, Set[PaneOutputSubscription]] = {}
+        self._by_session: Dict[str, Set[PaneOutputSubscription]] = {}
+
+    def subscribe(self, session_id: str, target: str, pane_id: str,
+                  resolve: PaneResolver) -> PaneOutputSubscription:
+        subscription = PaneOutputSubscription(self, session_id, target, pane_id, resolve)
+        self._by_pane.setdefault(pane_id, set()).add(subscription)
+        self._by_session.setdefault(session_id, set()).add(subscription)
+        return subscription
+
+    async def ensure_session(self, session_id: str) -> bool:
+        client = self._clients.get(session_id)
+        if client is None:
+            client = TmuxControlClient(self._socket_path, flags=WATCH_CLIENT_FLAGS, session=session_id)
+            client.add_notification_handler(
+                lambda line, session_id=session_id: self._on_notification(session_id, line)
+            )
+            self._clients[session_id] = client
+        try:
+            await client.connect()
+            return True
+        except TmuxControlUnavailable as e:
+            logger.debug(f"Output watcher for session {session_id} unavailable: {e}")
+            return False
+
+    def _on_notification(self, session_id: str, line: str) -> None:
+        kind, _, rest = line.partition(" ")
+        if kind in OUTPUT_NOTIFICATIONS:
+            for subscription in self._by_pane.get(rest.split(" ", 1)[0], ()):
+                subscription.notify()
+        elif kind in FOCUS_NOTIFICATIONS:
+            for subscription in self._by_session.get(session_id, ()):
+                subscription.notify(stale=True)
+        elif kind == "%exit":
+            # Wake everyone so the monitor notices a killed session promptly
+            for subscription in self._by_session.get(session_id, ()):
+                subscription.notify()
+
+    def _move(self, subscription: PaneOutputSubscription, pane_id: str) -> None:
+        self._discard(self._by_pane, subscription.pane_id, subscription)
+        subscription.pane_id = pane_id
+        self._by_pane.setdefault(pane_id, set()).add(subscription)
+
+    def _unsubscribe(self, subscription: PaneOutputSubscription) -> None:
+        self._discard(self._by_pane, subscription.pane_id, subscription)
+        self._discard(self._by_session, subscription.session_id, subscription)
+        if subscription.session_id not in self._by_session:
+            client = self._clients.pop(subscription.session_id, None)
+            if client is not None:
+                asyncio.ensure_future(client.close())
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[PaneOutputSubscription]], key: str,
+                 subscription: PaneOutputSubscription) -> None:
+        subscriptions = index.get(key)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del index[key]
+
+    async def close(self) -> None:
+        for client in list(self._clients.values()):
+            await client.close()
+        self._clients.clear()
+
+
+_output_events: Dict[Optional[str], TmuxOutputEvents] = {}
+
+
+def get_output_events(socket_path: Optional[str] = None) -> TmuxOutputEvents:
+    """Return the shared output watcher registry for a tmux socket."""
+    events = _output_events.get(socket_path)
+    if events is None:
+        events = TmuxOutputEvents(socket_path)
+        _output_events[socket_path] = events
+    return events
+
+
+async def close_output_events() -> None:
+    """Detach every output watcher (application shutdown)."""
+    for events in list(_output_events.values()):
+        await events.close()
+    _output_events.clear()
@@ -0,0 +1,121 @@
+"""Low-resolution overview of every pane on the server.
+
+A dashboard showing what each session is doing needs only the last few
+lines of every pane, and not often. OverviewStream captures those tails
+for all panes with one batched call per tick (see
+TmuxService.capture_pane_tails) every `interval` seconds while at least
+one client wants them, and publishes only the panes whose tail changed
+and the ones that went away::
+
+    {"type": "overview", "timestamp", "full": false,
+     "panes": {"main:0.1": ["line", ...], ...}, "removed": ["old:1.0"]}
+
+A client that starts watching gets every known tail at once with
+``"full": true``. Lines are stripped of escape sequences and trailing
+blank rows are skipped.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from ..serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OVERVIEW_INTERVAL = 2.0
+DEFAULT_OVERVIEW_LINES = 5
+MAX_OVERVIEW_LINES = 20
+
+# lines -> {target: last lines}, None if the capture failed
+TailBatch = Callable[[int], Awaitable[Optional[Dict[str, List[str]]]]]
+Publisher = Callable[[str], Awaitable[None]]
+
+
+def overview_message(panes: Dict[str, List[str]], removed: List[str], full: bool = False) -> str:
+    return dumps({
+        "type": "overview",
+        "timestamp": datetime.now().isoformat(),
+        "full": full,
+        "panes": panes,
+        "removed": removed,
+    })
+
+
+class OverviewStream:
+    """Captures the tail of every pane while clients watch and publishes changes.
+
+    `capture` returns the last `lines` lines of every pane (see
+    TmuxService.capture_pane_tails); `publish` is awaited with each
+    overview message for the current clients.
+    """
+
+    def __init__(self, capture: TailBatch, publish: Publisher,
+                 interval: float = DEFAULT_OVERVIEW_INTERVAL, lines: int = DEFAULT_OVERVIEW_LINES):
+        self._capture = capture
+        self._publish = publish
+        self.interval = interval
+        self.lines = max(1, min(MAX_OVERVIEW_LINES, lines))
+        self.clients: Set[Hashable] = set()
+        self.tails: Dict[str, List[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Captures run, and the ones that changed something and were published
+        self.ticks = 0
+        self.published = 0
+
+    def add(self, client: Hashable) -> Optional[str]:
+        """Start sending the overview to a client; returns the full message
+        for it, or None if nothing has been captured yet"""
+        self.clients.add(client)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self.tails = {}
+            self._task = asyncio.create_task(self._run())
+            return None
+        return overview_message(self.tails, [], full=True) if self.tails else None
+
+    def remove(self, client: Hashable) -> None:
+        self.clients.discard(client)
+        if not self.clients and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        self.clients.clear()
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def tick(self) -> None:
+        """Capture every tail once and publish what changed"""
+        self.ticks += 1
+        try:
+            tails = await self._capture(self.lines)
+        except Exception as e:
+            logger.error(f"Error capturing the pane overview: {e}")
+            return
+        if tails is None:
+            return
+        changed = {target: lines for target, lines in tails.items() if self.tails.get(target) != lines}
+        removed = [target for target in self.tails if target not in tails]
+        first = not self.tails
+        self.tails = tails
+        if changed or removed:
+            self.published += 1
+            await self._publish(overview_message(changed, removed, full=first))
+
+    async def _run(self) -> None:
+        while self.clients:
+            await self.tick()
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "clients": len(self.clients),
+            "panes": len(self.tails),
+            "interval": self.interval,
+            "lines": self.lines,
+            "ticks": self.ticks,
+            "published": self.published,
+        }
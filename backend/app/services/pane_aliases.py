@@ -0,0 +1,148 @@
+"""Canonical pane ids for the targets clients subscribe to.
+
+``main``, ``main:0``, ``main:0.0`` and ``main:editor.0`` can all name the
+same pane. Monitoring them separately would capture that pane once per
+spelling and keep a frame cache for each, so the router keys monitors,
+frame streams and scrollback by tmux's stable pane id (``%3``) instead
+and keeps the spelling only to address messages to the clients that used
+it. A pane id survives session and window renames; ``%3`` itself is also
+accepted as a target.
+
+What a spelling names can change: ``main`` follows the active pane,
+``main:editor`` stops resolving once the window is renamed, and a target
+that named nothing may start to once its session is created. Nothing is
+polled for that: the router calls topology_changed() from
+TmuxService.add_topology_listener, and while any alias other than a pane
+id is attached PaneAliases then re-resolves them (cheap:
+TmuxService.resolve_pane_ids answers from the shared topology snapshot)
+and awaits `on_move(alias, old, new)` for every alias that now names
+another pane. A burst of notifications is one refresh, plus one more if
+some arrived during it. An alias that resolves to nothing is its own key,
+so it is monitored as before and tmux reports the error.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# targets -> {target: pane id, or None if it names no pane}
+PaneResolver = Callable[[List[str]], Awaitable[Dict[str, Optional[str]]]]
+# (alias, old key, new key)
+MoveHandler = Callable[[str, str, str], Awaitable[None]]
+
+
+class PaneAliases:
+    """Maps the targets clients use to the pane ids their monitors run under"""
+
+    def __init__(self, resolve: PaneResolver, on_move: MoveHandler):
+        self._resolve = resolve
+        self._on_move = on_move
+        self._keys: Dict[str, str] = {}
+        self._aliases: Dict[str, Set[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # The topology changed since the running refresh started
+        self._changed = False
+        # Re-resolution passes, and aliases found naming another pane
+        self.refreshes = 0
+        self.moves = 0
+
+    def __contains__(self, alias: str) -> bool:
+        return alias in self._keys
+
+    def key(self, alias: str) -> str:
+        """The key an alias is monitored under (itself if not attached)"""
+        return self._keys.get(alias, alias)
+
+    def in_use(self, key: str) -> bool:
+        """Whether any attached alias resolves to a key"""
+        return key in self._aliases
+
+    def aliases(self, key: str) -> List[str]:
+        """Attached aliases of a key (just the key if none are)"""
+        aliases = self._aliases.get(key)
+        return list(aliases) if aliases else [key]
+
+    async def attach(self, alias: str) -> str:
+        """Resolve and remember an alias; returns its key"""
+        if alias in self._keys:
+            return self._keys[alias]
+        try:
+            resolved = (await self._resolve([alias])).get(alias)
+        except Exception as e:
+            logger.error(f"Error resolving pane for {alias}: {e}")
+            resolved = None
+        if alias in self._keys:  # attached while this one was resolving
+            return self._keys[alias]
+        self._link(alias, resolved or alias)
+        return self._keys[alias]
+
+    def detach(self, alias: str) -> Optional[str]:
+        """Forget an alias; returns its key if no other alias uses it"""
+        key = self._keys.pop(alias, None)
+        if key is None:
+            return alias
+        aliases = self._aliases[key]
+        aliases.discard(alias)
+        if aliases:
+            return None
+        del self._aliases[key]
+        return key
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._keys.clear()
+        self._aliases.clear()
+
+    def _link(self, alias: str, key: str) -> None:
+        self._keys[alias] = key
+        self._aliases.setdefault(key, set()).add(alias)
+
+    def topology_changed(self) -> None:
+        """Sessions, windows or panes changed: re-resolve the attached aliases"""
+        if all(alias.startswith('%') for alias in self._keys):
+            return
+        self._changed = True
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def refresh(self) -> None:
+        """Re-resolve every alias and move the ones that changed pane"""
+        self.refreshes += 1
+        aliases = [alias for alias in self._keys if not alias.startswith('%')]
+        try:
+            resolved = await self._resolve(aliases)
+        except Exception as e:
+            logger.error(f"Error re-resolving {len(aliases)} pane aliases: {e}")
+            return
+        for alias in aliases:
+            old = self._keys.get(alias)
+            new = resolved.get(alias) or alias
+            if old is None or old == new:
+                continue  # detached meanwhile, or unchanged
+            self._aliases[old].discard(alias)
+            if not self._aliases[old]:
+                del self._aliases[old]
+            self._link(alias, new)
+            self.moves += 1
+            try:
+                await self._on_move(alias, old, new)
+            except Exception as e:
+                logger.error(f"Error moving {alias} from {old} to {new}: {e}")
+
+    async def _run(self) -> None:
+        while self._changed:
+            self._changed = False
+            await self.refresh()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "aliases": len(self._keys),
+            "panes": len(self._aliases),
+            "refreshes": self.refreshes,
+            "moves": self.moves,
+        }
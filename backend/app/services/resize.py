@@ -0,0 +1,192 @@
+"""Coalesced window resizes for clients sharing a window.
+
+Every phone or tablet viewing a window asks for its own size on rotation
+and keyboard toggles. ResizeCoordinator remembers the latest size of each
+client per window (keyed by tmux's window id, so "main", "main:0" and
+"main:0.1" share one while window 0 is active), waits `debounce` seconds
+after the first request so a burst of them collapses into one, and then
+applies a single size chosen by the policy:
+
+- ``smallest``: the smallest columns and rows of all clients, so the
+  window fits every screen (like tmux's ``window-size smallest``)
+- ``largest``: the largest columns and rows
+- ``latest``: the size of the client that asked most recently
+
+Each target's window id and each window's last observed or applied size
+are remembered for `query_ttl` seconds, so a repeated request costs no
+tmux call at all and resize-window is skipped when the window already
+has the merged size. Clients that have not asked again within
+`client_ttl` no longer count, and a window left without clients is
+dropped on the next request; WebSocket clients are forgotten when they
+disconnect.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESIZE_POLICIES = ("smallest", "largest", "latest")
+DEFAULT_RESIZE_DEBOUNCE = 0.15
+# Clients that have not sent a size for this long stop counting
+CLIENT_TTL = 600.0
+# Window ids and sizes read from or applied to tmux are trusted this long
+QUERY_TTL = 5.0
+
+Size = Tuple[int, int]
+# target -> (window id, columns, rows), None if the target does not exist
+SizeQuery = Callable[[str], Awaitable[Optional[Tuple[str, int, int]]]]
+Resizer = Callable[[str, int, int], Awaitable[bool]]
+
+
+class ResizeResult:
+    """Size a resize request ended with"""
+
+    __slots__ = ("cols", "rows", "resized")
+
+    def __init__(self, cols: int, rows: int, resized: bool):
+        self.cols = cols
+        self.rows = rows
+        # False when the window already had this size
+        self.resized = resized
+
+
+class _WindowState:
+    __slots__ = ("target", "clients", "pending", "size", "size_expires")
+
+    def __init__(self, target: str):
+        # Latest target used to address the window
+        self.target = target
+        # client -> (cols, rows, monotonic time of its last request)
+        self.clients: Dict[str, Tuple[int, int, float]] = {}
+        self.pending: Optional[asyncio.Future] = None
+        # Last size read from or applied to tmux, trusted until size_expires
+        self.size: Optional[Size] = None
+        self.size_expires = 0.0
+
+    def known_size(self, now: float) -> Optional[Size]:
+        return self.size if now < self.size_expires else None
+
+    def idle(self) -> bool:
+        return not self.clients and (self.pending is None or self.pending.done())
+
+
+class ResizeCoordinator:
+    """Debounces and merges resize requests per window.
+
+    `query` returns a target's window id and current size (None if the
+    target does not exist) and `resize` applies a size.
+    """
+
+    def __init__(self, query: SizeQuery, resize: Resizer, policy: str = "latest",
+                 debounce: float = DEFAULT_RESIZE_DEBOUNCE, client_ttl: float = CLIENT_TTL,
+                 query_ttl: float = QUERY_TTL):
+        if policy not in RESIZE_POLICIES:
+            raise ValueError(f"Unknown resize policy: {policy}")
+        self._query = query
+        self._resize = resize
+        self.policy = policy
+        self._debounce = debounce
+        self._client_ttl = client_ttl
+        self._query_ttl = query_ttl
+        self._windows: Dict[str, _WindowState] = {}
+        # target -> (window id, monotonic expiry)
+        self._window_ids: Dict[str, Tuple[str, float]] = {}
+        # resize-window calls made, and merged sizes the window already had
+        self.resizes = 0
+        self.skipped = 0
+
+    async def request(self, target: str, client: str, cols: int, rows: int) -> Optional[ResizeResult]:
+        """Record a client's size and wait for the merged resize; None if it failed"""
+        now = time.monotonic()
+        self._evict(now)
+        key, expires = self._window_ids.get(target, (None, 0.0))
+        found = None
+        if now >= expires:
+            found = await self._query(target)
+            if found is None:
+                self._window_ids.pop(target, None)
+                return None
+            key = found[0]
+            self._window_ids[target] = (key, now + self._query_ttl)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _WindowState(target)
+        if found is not None:
+            self._remember_size(window, found[1:])
+        window.target = target
+        window.clients[client] = (cols, rows, time.monotonic())
+        if window.pending is None or window.pending.done():
+            window.pending = asyncio.ensure_future(self._flush_later(window))
+        return await asyncio.shield(window.pending)
+
+    def forget(self, client: str) -> None:
+        """Stop counting a client's size (e.g. its WebSocket closed)"""
+        for key, window in list(self._windows.items()):
+            window.clients.pop(client, None)
+            if window.idle():
+                del self._windows[key]
+
+    def _expire_clients(self, window: _WindowState, now: float) -> None:
+        for client, (_, _, seen) in list(window.clients.items()):
+            if now - seen > self._client_ttl:
+                del window.clients[client]
+
+    def _evict(self, now: float) -> None:
+        """Drop windows whose clients all expired and stale window ids"""
+        for key, window in list(self._windows.items()):
+            self._expire_clients(window, now)
+            if window.idle():
+                del self._windows[key]
+        for target, (_, expires) in list(self._window_ids.items()):
+            if now >= expires:
+                del self._window_ids[target]
+
+    def _remember_size(self, window: _WindowState, size: Optional[Size]) -> None:
+        window.size = size
+        window.size_expires = time.monotonic() + self._query_ttl
+
+    def effective_size(self, window: _WindowState) -> Optional[Size]:
+        self._expire_clients(window, time.monotonic())
+        sizes = list(window.clients.values())
+        if not sizes:
+            return None
+        if self.policy == "smallest":
+            return min(s[0] for s in sizes), min(s[1] for s in sizes)
+        if self.policy == "largest":
+            return max(s[0] for s in sizes), max(s[1] for s in sizes)
+        latest = max(sizes, key=lambda s: s[2])
+        return latest[0], latest[1]
+
+    async def _flush_later(self, window: _WindowState) -> Optional[ResizeResult]:
+        await asyncio.sleep(self._debounce)
+        size = self.effective_size(window)
+        if size is None:
+            return None
+        target = window.target
+        current = window.known_size(time.monotonic())
+        if current is None:
+            found = await self._query(target)
+            if found is None:
+                self._window_ids.pop(target, None)
+                return None
+            current = found[1:]
+            self._remember_size(window, current)
+        if current == size:
+            self.skipped += 1
+            return ResizeResult(size[0], size[1], resized=False)
+        self.resizes += 1
+        if not await self._resize(target, *size):
+            self._remember_size(window, None)
+            return None
+        self._remember_size(window, size)
+        return ResizeResult(size[0], size[1], resized=True)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "policy": self.policy,
+            "resizes": self.resizes,
+            "skipped": self.skipped,
+            "windows": {key: len(window.clients) for key, window in self._windows.items()},
+        }
@@ -0,0 +1,385 @@
+"""Cursor tokens for paging through a pane's scrollback.
+
+Lines are addressed by their absolute index counted from the oldest
+history line (0); tmux's own row numbers (``capture-pane -S/-E``, 0 = top
+of the screen) are ``index - history_size``. New output pushes lines into
+history without moving those indices, but only until the history reaches
+history-limit: from then on tmux trims the oldest rows and every index
+shifts down. So the cursor also carries a checksum of the first rows of
+the page it continues from (its anchor). The next page is captured
+together with those rows; if they are no longer where the index says,
+they are looked for higher up and the cursor is moved by the rows
+trimmed meanwhile. If they cannot be found (the history was cleared, or
+trimmed past the page) the cursor has expired.
+
+ScrollbackStore keeps the history of monitored targets in memory so
+their history and paging requests do not need a capture at all.
+"""
+import asyncio
+import base64
+import itertools
+import logging
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_LINES = 200
+MAX_PAGE_LINES = 2000
+_CURSOR_VERSION = "2"
+# Rows at the top of a page whose checksum the next page's cursor carries
+ANCHOR_ROWS = 4
+
+# Memory for all scrollback buffers together
+DEFAULT_BUFFER_BUDGET = 64 * 1024 * 1024
+# Bytes charged per buffered line on top of its length (str object overhead)
+LINE_OVERHEAD = 64
+# History rows captured to seed a buffer
+SEED_LINES = 50000
+# Buffered lines matched against a tail capture to find where new rows start
+SYNC_OVERLAP = 8
+# Extra rows captured in case more scrolled in after the size was read
+SYNC_SLACK = 32
+# Rows captured to catch up once the history is at history-limit and its
+# size no longer tells how many rows scrolled in
+SYNC_WINDOW = 256
+
+
+class CursorExpired(Exception):
+    """The pane's history was cleared or trimmed past the cursor since it was issued."""
+
+
+def rows_checksum(rows: List[str]) -> str:
+    return format(zlib.crc32('\n'.join(rows).encode()), "08x")
+
+
+def near_history_limit(history_size: int, limit: int) -> bool:
+    """Whether tmux may be trimming the history (it drops a tenth of
+    history-limit whenever the history reaches it)"""
+    return limit > 0 and history_size >= limit - max(1, limit // 10)
+
+
+class ScrollbackCursor:
+    """Position of the next (older) page: lines before `end`, whose first
+    `anchor_rows` rows (the top of the previous page) have checksum `anchor`"""
+
+    __slots__ = ("end", "history_size", "anchor_rows", "anchor")
+
+    def __init__(self, end: int, history_size: int, anchor_rows: int = 0, anchor: str = ""):
+        self.end = end
+        self.history_size = history_size
+        self.anchor_rows = anchor_rows
+        self.anchor = anchor
+
+    @classmethod
+    def for_page(cls, start: int, history_size: int, rows: List[str]) -> "ScrollbackCursor":
+        """Cursor for the page above one starting at `start` with these rows"""
+        anchored = rows[:ANCHOR_ROWS]
+        return cls(start, history_size, len(anchored), rows_checksum(anchored) if anchored else "")
+
+    def matches(self, rows: List[str]) -> bool:
+        """Whether `rows` (anchor_rows of them) are the rows this cursor is anchored to"""
+        return len(rows) == self.anchor_rows and rows_checksum(rows) == self.anchor
+
+    def encode(self) -> str:
+        raw = f"{_CURSOR_VERSION}:{self.history_size}:{self.end}:{self.anchor_rows}:{self.anchor}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "ScrollbackCursor":
+        """Parse a token from encode(); raises ValueError if it is malformed"""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+            version, history_size, end, anchor_rows, anchor = raw.split(":")
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Invalid cursor") from None
+        if (version != _CURSOR_VERSION or not history_size.isdigit() or not end.isdigit()
+                or not anchor_rows.isdigit() or int(anchor_rows) > ANCHOR_ROWS):
+            raise ValueError("Invalid cursor")
+        return cls(int(end), int(history_size), int(anchor_rows), anchor)
+
+
+def cursor_for_page(start: int, history_size: int, rows: List[str]) -> Optional[str]:
+    """Cursor for the page above one starting at `start`, None at the top"""
+    return ScrollbackCursor.for_page(start, history_size, rows).encode() if start > 0 else None
+
+
+def page_dict(rows: List[str], start: int, end: int, history_size: int) -> Dict[str, Any]:
+    return {
+        "content": '\n'.join(rows),
+        "start": start,
+        "end": end,
+        "history_size": history_size,
+        "cursor": cursor_for_page(start, history_size, rows),
+    }
+
+
+def _line_cost(line: str) -> int:
+    return len(line) + LINE_OVERHEAD
+
+
+class ScrollbackBuffer:
+    """Scrollback lines of one target, oldest first.
+
+    Indices match scrollback cursors: `end` is the index after the newest
+    line and grows by one for every row that scrolls into history, so it
+    equals #{history_size} until tmux starts trimming at history-limit.
+    """
+
+    __slots__ = ("lines", "end", "history_size", "complete", "bytes", "activity", "synced_second")
+
+    def __init__(self, lines: List[str], end: int, history_size: int):
+        self.lines: Deque[str] = deque(lines)
+        self.end = end
+        # #{history_size} at the last sync
+        self.history_size = history_size
+        # True while the buffer still holds the oldest history line
+        self.complete = end == len(self.lines)
+        self.bytes = sum(_line_cost(line) for line in self.lines)
+        # #{window_activity} at the last sync and the second its size was
+        # read in; output later in that same second leaves activity unchanged
+        self.activity: Optional[int] = None
+        self.synced_second = 0
+
+    @property
+    def start(self) -> int:
+        return self.end - len(self.lines)
+
+    def extend(self, lines: List[str], history_size: int) -> int:
+        """Append rows that scrolled into history; returns the bytes added"""
+        added = sum(_line_cost(line) for line in lines)
+        self.lines.extend(lines)
+        self.end += len(lines)
+        self.history_size = history_size
+        self.bytes += added
+        return added
+
+    def trim(self, nbytes: int) -> int:
+        """Drop the oldest lines until at least `nbytes` are freed"""
+        freed = 0
+        while self.lines and freed < nbytes:
+            freed += _line_cost(self.lines.popleft())
+        self.bytes -= freed
+        self.complete = False
+        return freed
+
+    def tail(self, count: Optional[int] = None) -> Optional[List[str]]:
+        """The newest `count` lines (all with None), or None if not all buffered"""
+        if count is None:
+            return list(self.lines) if self.complete else None
+        if count > len(self.lines) and not self.complete:
+            return None
+        return self._slice(max(self.start, self.end - count), self.end)
+
+    def page(self, lines: int, cursor: Optional[ScrollbackCursor]) -> Optional[Dict[str, Any]]:
+        """Serve a scrollback page like TmuxService.get_scrollback_page, or
+        None if part of it is no longer buffered. Raises CursorExpired."""
+        end = self.end
+        if cursor is not None:
+            if cursor.history_size > self.end:
+                raise CursorExpired("History was cleared since the cursor was issued")
+            end = cursor.end
+            # Indices issued by tmux drift from the buffer's once tmux trims;
+            # let tmux relocate a cursor whose anchor is not here
+            if end + cursor.anchor_rows > self.end or not cursor.matches(
+                    self._slice(max(self.start, end), end + cursor.anchor_rows)):
+                return None
+        start = max(0, end - lines)
+        if start < self.start:
+            return None
+        return page_dict(self._slice(start, end), start, end, self.end)
+
+    def _slice(self, start: int, end: int) -> List[str]:
+        # Walk the deque from whichever end is closer to the page
+        if start - self.start <= self.end - end:
+            return list(itertools.islice(self.lines, start - self.start, end - self.start))
+        rows = list(itertools.islice(reversed(self.lines), self.end - end, self.end - start))
+        rows.reverse()
+        return rows
+
+    def plan_sync(self, history_size: int, limit: int, activity: Optional[int] = None) -> Optional[int]:
+        """Rows to capture from the bottom of the history to catch up (0 =
+        up to date), or None if the history was cleared"""
+        near_limit = near_history_limit(max(history_size, self.history_size), limit)
+        if history_size < self.history_size and not near_limit:
+            return None
+        if near_limit:
+            # The size stops moving while tmux trims; only an unchanged
+            # activity time says nothing scrolled in since the last sync
+            if (history_size == self.history_size and activity is not None
+                    and activity == self.activity and activity < self.synced_second):
+                return 0
+            return min(history_size, SYNC_WINDOW)
+        grown = history_size - self.history_size
+        if not grown:
+            return 0
+        return min(history_size, grown + min(SYNC_OVERLAP, len(self.lines)) + SYNC_SLACK)
+
+    def new_rows(self, captured: List[str]) -> Optional[List[str]]:
+        """Rows of a tail capture that are not buffered yet, found by
+        matching the buffer's newest lines; None if they do not line up, or
+        line up at more than one offset (repeated or blank output)"""
+        if not self.lines:
+            return captured
+        # Everything above the new rows must be the buffer's tail, not just
+        # the SYNC_OVERLAP rows right above them
+        tail = self._slice(max(self.start, self.end - len(captured)), self.end)
+        overlap = tail[-SYNC_OVERLAP:]
+        found = None
+        for i in range(len(overlap), len(captured) + 1):
+            if captured[i - len(overlap):i] != overlap:
+                continue
+            size = min(i, len(tail))
+            if captured[i - size:i] == tail[len(tail) - size:]:
+                if found is not None:
+                    return None
+                found = i
+        return captured[found:] if found is not None else None
+
+
+SizeBatch = Callable[[List[str]], Awaitable[Dict[str, Optional[Tuple[int, int, int]]]]]
+TailBatch = Callable[[Dict[str, int]], Awaitable[Dict[str, Optional[List[str]]]]]
+Seeder = Callable[[str], Awaitable[Optional[ScrollbackBuffer]]]
+
+
+class ScrollbackStore:
+    """Per-target scrollback buffers under one global byte budget.
+
+    A buffer is seeded the first time a target's history is read and kept
+    current by sync(), which the monitor calls after every capture batch:
+    one batched read of #{history_size}, #{history_limit} and
+    #{window_activity}, then one batched capture of only the rows that
+    scrolled in. When the budget is
+    exceeded the least recently used buffers are dropped; a buffer that
+    cannot be lined up with tmux any more is dropped and re-seeded on the
+    next read. A process that only hears about captures made elsewhere (a
+    capture hub worker) calls mark_stale() instead of sync(), and the buffer
+    catches up on its next read.
+
+    `seed` returns a new buffer for a target (or None); `sizes` maps targets
+    to (history_size, history_limit, window_activity) or None; `tails` maps {target: rows}
+    to the last `rows` history lines of each target or None.
+    """
+
+    def __init__(self, seed: Seeder, sizes: SizeBatch, tails: TailBatch,
+                 budget: int = DEFAULT_BUFFER_BUDGET):
+        self._seed = seed
+        self._sizes = sizes
+        self._tails = tails
+        self._budget = budget
+        self._buffers: "OrderedDict[str, ScrollbackBuffer]" = OrderedDict()
+        self._seeding: Dict[str, asyncio.Future] = {}
+        # Buffered targets with new output since their last sync
+        self._stale: Set[str] = set()
+        self.bytes = 0
+
+    def __contains__(self, target: str) -> bool:
+        return target in self._buffers
+
+    async def get(self, target: str) -> Optional[ScrollbackBuffer]:
+        """The target's buffer, seeding it if needed (single-flight)"""
+        if target in self._stale:
+            self._stale.discard(target)
+            try:
+                await self.sync([target])
+            except Exception as e:
+                logger.error(f"Error syncing scrollback for {target}: {e}")
+                self.discard(target)
+        buffer = self._buffers.get(target)
+        if buffer is not None:
+            self._buffers.move_to_end(target)
+            return buffer
+
+        inflight = self._seeding.get(target)
+        if inflight is None or inflight.get_loop() is not asyncio.get_running_loop():
+            inflight = self._seeding[target] = asyncio.ensure_future(self._seed_buffer(target))
+        return await asyncio.shield(inflight)
+
+    async def _seed_buffer(self, target: str) -> Optional[ScrollbackBuffer]:
+        try:
+            buffer = await self._seed(target)
+            if buffer is not None:
+                self._store(target, buffer)
+            return buffer
+        finally:
+            self._seeding.pop(target, None)
+
+    def mark_stale(self, target: str) -> None:
+        """New output was captured elsewhere: sync the buffer before its next read"""
+        if target in self._buffers:
+            self._stale.add(target)
+
+    def discard(self, target: str) -> None:
+        self._stale.discard(target)
+        buffer = self._buffers.pop(target, None)
+        if buffer is not None:
+            self.bytes -= buffer.bytes
+
+    def _store(self, target: str, buffer: ScrollbackBuffer) -> None:
+        self.discard(target)
+        self._buffers[target] = buffer
+        self.bytes += buffer.bytes
+        self._enforce_budget(target)
+
+    def _enforce_budget(self, keep: str) -> None:
+        """Drop least recently used buffers, then trim `keep` itself"""
+        while self.bytes > self._budget and len(self._buffers) > 1:
+            target = next(iter(self._buffers))
+            if target == keep:
+                self._buffers.move_to_end(keep)
+                continue
+            self.discard(target)
+        buffer = self._buffers.get(keep)
+        if buffer is not None and self.bytes > self._budget:
+            self.bytes -= buffer.trim(self.bytes - self._budget)
+
+    async def sync(self, targets: List[str]) -> None:
+        """Append the rows that scrolled into history for buffered targets"""
+        buffered = [target for target in targets if target in self._buffers]
+        if not buffered:
+            return
+        self._stale.difference_update(buffered)
+        second = int(time.time())
+        sizes = await self._sizes(buffered)
+
+        plans: Dict[str, int] = {}
+        for target in buffered:
+            buffer = self._buffers.get(target)
+            size = sizes.get(target)
+            if buffer is None:
+                continue
+            rows = buffer.plan_sync(*size) if size is not None else None
+            if rows is None:
+                self.discard(target)
+            elif rows:
+                plans[target] = rows
+            else:
+                buffer.history_size = size[0]
+                buffer.activity, buffer.synced_second = size[2], second
+        if not plans:
+            return
+
+        tails = await self._tails(plans)
+        for target in plans:
+            buffer = self._buffers.get(target)
+            captured = tails.get(target)
+            if buffer is None:
+                continue
+            new = buffer.new_rows(captured) if captured is not None else None
+            if new is None:
+                logger.debug(f"Scrollback buffer for {target} lost track of tmux, dropping it")
+                self.discard(target)
+                continue
+            self.bytes += buffer.extend(new, sizes[target][0])
+            buffer.activity, buffer.synced_second = sizes[target][2], second
+            self._enforce_budget(target)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bytes": self.bytes,
+            "budget": self._budget,
+            "targets": {target: {"lines": len(buffer.lines), "bytes": buffer.bytes}
+                        for target, buffer in self._buffers.items()},
+        }
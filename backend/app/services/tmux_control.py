@@ -0,0 +1,315 @@
+"""Persistent tmux control-mode client.
+
+Instead of forking a ``tmux`` process per operation, a single long-lived
+``tmux -C attach-session`` client is kept per tmux socket. Commands are
+written to its stdin one per line and replies are matched in order using
+the ``%begin``/``%end``/``%error`` framing of the control-mode protocol.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMMAND_TIMEOUT = 10.0
+CONNECT_TIMEOUT = 5.0
+RECONNECT_DELAY = 1.0
+# Control clients must never shrink windows, and the command channel has no
+# use for pane output notifications.
+CONTROL_CLIENT_FLAGS = "ignore-size,no-output"
+# Upper bound for a single protocol line (capture-pane rows, %output lines)
+STREAM_LIMIT = 4 * 1024 * 1024
+# Notifications meaning sessions, windows or panes were added, removed,
+# renamed or focused
+TOPOLOGY_NOTIFICATIONS = frozenset({
+    "%sessions-changed", "%session-renamed", "%session-window-changed",
+    "%window-add", "%window-close", "%window-renamed",
+    "%unlinked-window-add", "%unlinked-window-close", "%unlinked-window-renamed",
+    "%layout-change", "%window-pane-changed",
+})
+
+
+class TmuxControlUnavailable(Exception):
+    """The control connection could not be used; the command was not sent."""
+
+
+class TmuxControlError(Exception):
+    """The control connection failed after the command was sent."""
+
+
+def quote_tmux_arg(arg: str) -> str:
+    """Quote a single argument for the tmux command parser.
+
+    Uses double quotes, escaping the characters tmux treats specially inside
+    them and encoding control characters as octal escapes so a command always
+    fits on one protocol line.
+    """
+    parts = ['"']
+    for ch in arg:
+        if ch in '\\"$':
+            parts.append('\\' + ch)
+        elif ord(ch) < 0x20 or ord(ch) == 0x7f:
+            parts.append('\\%03o' % ord(ch))
+        else:
+            parts.append(ch)
+    parts.append('"')
+    return ''.join(parts)
+
+
+class TmuxControlClient:
+    """One ``tmux -C`` connection shared by every caller on a socket."""
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        flags: str = CONTROL_CLIENT_FLAGS,
+        session: Optional[str] = None,
+    ):
+        self._socket_path = socket_path
+        self._flags = flags
+        # Session to attach to; tmux picks the most recent one when unset
+        self._session = session
+        self._notification_handlers: List[Callable[[str], None]] = []
+        # Bumped on every topology notification and on (re)connect, when
+        # notifications may have been missed; caches compare against it.
+        self.topology_version = 0
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._handshake: Optional[asyncio.Future] = None
+        self._pending: Deque[asyncio.Future] = deque()
+        # Whether tmux has started the oldest pending command (%begin seen)
+        self._head_started = False
+        self._retry_at = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return (
+            self._process is not None
+            and self._process.returncode is None
+            and self._reader_task is not None
+            and not self._reader_task.done()
+        )
+
+    def add_notification_handler(self, handler: Callable[[str], None]) -> None:
+        """Receive every asynchronous notification line (%output, ...).
+
+        Handlers also see a final "%exit" line whenever the connection closes.
+        """
+        self._notification_handlers.append(handler)
+
+    def remove_notification_handler(self, handler: Callable[[str], None]) -> None:
+        if handler in self._notification_handlers:
+            self._notification_handlers.remove(handler)
+
+    async def connect(self) -> None:
+        """Attach now if not already connected (raises TmuxControlUnavailable)."""
+        await self._ensure_connected()
+
+    def _base_command(self) -> List[str]:
+        cmd = ["tmux"]
+        if self._socket_path:
+            cmd.extend(["-S", self._socket_path])
+        return cmd
+
+    async def execute(self, args: List[str]) -> Tuple[Optional[str], Optional[str], int]:
+        """Run one tmux command (without the leading ``tmux``).
+
+        Returns (stdout, stderr, returncode) with the same shape as the
+        subprocess path. Raises TmuxControlUnavailable when the command could
+        not be delivered and TmuxControlError when the reply was lost.
+        """
+        if not args:
+            # An empty line detaches a control client
+            raise TmuxControlUnavailable("empty command")
+
+        await self._ensure_connected()
+
+        line = " ".join(quote_tmux_arg(a) for a in args) + "\n"
+        future = self._loop.create_future()
+        self._pending.append(future)
+        try:
+            self._process.stdin.write(line.encode())
+            await self._process.stdin.drain()
+        except Exception as e:
+            self._teardown(TmuxControlError(f"control connection lost: {e}"))
+            raise TmuxControlUnavailable(f"write failed: {e}")
+
+        try:
+            # Commands tmux never started fail with TmuxControlUnavailable
+            # (e.g. the client was detached by kill-session), so they are
+            # safe to retry through a subprocess.
+            return await asyncio.wait_for(asyncio.shield(future), timeout=COMMAND_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Replies are matched by order, so a lost reply desynchronizes
+            # the stream; drop the connection and start over.
+            self._teardown(TmuxControlError("timed out waiting for reply"))
+            raise TmuxControlError(f"timed out waiting for reply to {args[0]}")
+
+    async def _ensure_connected(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # The event loop changed (e.g. a new test client); the old
+            # pipes and reader task belong to a dead loop.
+            self._teardown(TmuxControlError("event loop changed"))
+            self._loop = loop
+            self._connect_lock = asyncio.Lock()
+
+        if self.connected:
+            return
+
+        async with self._connect_lock:
+            if self.connected:
+                return
+            if loop.time() < self._retry_at:
+                raise TmuxControlUnavailable("waiting to reconnect")
+            try:
+                await self._connect()
+            except Exception as e:
+                self._teardown(TmuxControlError(str(e)))
+                self._retry_at = loop.time() + RECONNECT_DELAY
+                raise TmuxControlUnavailable(f"cannot attach control client: {e}")
+
+    async def _connect(self) -> None:
+        cmd = self._base_command() + ["-C", "attach-session", "-f", self._flags]
+        if self._session:
+            cmd.extend(["-t", self._session])
+        self._process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=STREAM_LIMIT,
+        )
+        self._handshake = self._loop.create_future()
+        self._reader_task = asyncio.create_task(self._read_loop(self._process))
+        # The attach-session command itself replies with a block that is not
+        # flagged as ours; it tells us whether the client actually attached.
+        await asyncio.wait_for(asyncio.shield(self._handshake), timeout=CONNECT_TIMEOUT)
+        self.topology_version += 1
+        logger.info("tmux control-mode client attached")
+
+    async def _read_loop(self, process: asyncio.subprocess.Process) -> None:
+        guard: Optional[str] = None
+        ours = False
+        lines: List[str] = []
+        error: Exception = TmuxControlError("control connection closed")
+        try:
+            while True:
+                raw = await process.stdout.readline()
+                if not raw:
+                    break
+                line = raw[:-1].decode(errors="replace") if raw.endswith(b"\n") else raw.decode(errors="replace")
+
+                if guard is not None:
+                    kind, _, rest = line.partition(" ")
+                    if kind in ("%end", "%error") and rest == guard:
+                        self._finish_block(ours, kind == "%end", lines)
+                        guard = None
+                        lines = []
+                    else:
+                        lines.append(line)
+                    continue
+
+                if line.startswith("%begin "):
+                    guard = line[len("%begin "):]
+                    flags = guard.rsplit(" ", 1)[-1]
+                    ours = flags.isdigit() and int(flags) & 1 == 1
+                    if ours:
+                        self._head_started = True
+                elif line.startswith("%exit"):
+                    break
+                else:
+                    self._handle_notification(line)
+        except Exception as e:
+            error = TmuxControlError(f"control connection failed: {e}")
+        finally:
+            if self._process is process:
+                self._teardown(error)
+
+    def _finish_block(self, ours: bool, ok: bool, lines: List[str]) -> None:
+        text = "\n".join(lines) + "\n" if lines else None
+        if not ours:
+            if self._handshake is not None and not self._handshake.done():
+                if ok:
+                    self._handshake.set_result(None)
+                else:
+                    self._handshake.set_exception(TmuxControlError(text or "attach failed"))
+            return
+        if not self._pending:
+            logger.warning("tmux control-mode reply without a pending command")
+            return
+        future = self._pending.popleft()
+        self._head_started = False
+        if not future.done():
+            future.set_result((text, None, 0) if ok else (None, text, 1))
+
+    def _handle_notification(self, line: str) -> None:
+        """Dispatch asynchronous notifications (%output, %session-changed, ...)."""
+        if line.split(" ", 1)[0] in TOPOLOGY_NOTIFICATIONS:
+            self.topology_version += 1
+        for handler in list(self._notification_handlers):
+            try:
+                handler(line)
+            except Exception as e:
+                logger.error(f"Error in tmux notification handler: {e}")
+
+    def _teardown(self, error: Exception) -> None:
+        process, self._process = self._process, None
+        reader, self._reader_task = self._reader_task, None
+        if self._handshake is not None and not self._handshake.done():
+            self._handshake.set_exception(error)
+        started = self._head_started
+        self._head_started = False
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error if started else TmuxControlUnavailable(str(error)))
+            started = False
+        if reader is not None and reader is not _current_task():
+            reader.cancel()
+        if process is not None and process.returncode is None:
+            try:
+                process.kill()
+            except (ProcessLookupError, RuntimeError):
+                pass
+        if process is not None:
+            self._handle_notification("%exit")
+
+    async def close(self) -> None:
+        """Detach the control client."""
+        process = self._process
+        self._teardown(TmuxControlError("control client closed"))
+        if process is not None:
+            try:
+                await process.wait()
+            except Exception:
+                pass
+
+
+def _current_task() -> Optional[asyncio.Task]:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+_clients: Dict[Optional[str], TmuxControlClient] = {}
+
+
+def get_control_client(socket_path: Optional[str] = None) -> TmuxControlClient:
+    """Return the shared control client for a tmux socket."""
+    client = _clients.get(socket_path)
+    if client is None:
+        client = TmuxControlClient(socket_path)
+        _clients[socket_path] = client
+    return client
+
+
+async def close_control_clients() -> None:
+    """Detach every shared control client (application shutdown)."""
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
@@ -2,20 +2,76 @@ import asyncio
 import logging
 import os
 import re
-from typing import List, Dict, Any, Optional, Tuple
+import secrets
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, Tuple
+
+from .output_events import PaneOutputSubscription, get_output_events
+from .scrollback import (
+    DEFAULT_PAGE_LINES, MAX_PAGE_LINES, SEED_LINES,
+    CursorExpired, ScrollbackBuffer, ScrollbackCursor, near_history_limit, page_dict,
+)
+from .tmux_control import (
+    TOPOLOGY_NOTIFICATIONS,
+    TmuxControlError,
+    TmuxControlUnavailable,
+    get_control_client,
+)
+from .tmux_topology import (
+    PANE_FORMAT, PaneRecord, TopologyCache, TopologySnapshot, parse_pane_records, window_summaries,
+)
 
 logger = logging.getLogger(__name__)
 
 # Regex pattern for valid tmux target names
-# Allows: alphanumeric, dash, underscore, dot, colon (for target separators)
-TMUX_TARGET_PATTERN = re.compile(r'^[a-zA-Z0-9_\-\.]+(?::[a-zA-Z0-9_\-\.]+)?(?:\.[a-zA-Z0-9_\-\.]+)?$')
+# Allows: alphanumeric, dash, underscore, dot, colon (for target separators),
+# or a pane id such as %3
+TMUX_TARGET_PATTERN = re.compile(
+    r'^(?:%[0-9]+|[a-zA-Z0-9_\-\.]+(?::[a-zA-Z0-9_\-\.]+)?(?:\.[a-zA-Z0-9_\-\.]+)?)$'
+)
 TMUX_NAME_PATTERN = re.compile(r'^[a-zA-Z0-9_\-\.]+$')
 MAX_TARGET_LENGTH = 128
 MAX_COMMAND_LENGTH = 4096
+# Window sizes accepted by resize_pane
+MIN_WINDOW_COLS, MAX_WINDOW_COLS = 20, 500
+MIN_WINDOW_ROWS, MAX_WINDOW_ROWS = 24, 200
+# Items in one send_input batch, and the longest key name accepted
+MAX_INPUT_ITEMS = 256
+MAX_KEY_NAME_LENGTH = 32
+# capture-pane stderr meaning the session (or the whole server) is gone
+MISSING_SESSION_ERRORS = ("can't find session", "no server running", "error connecting to")
+MISSING_SERVER_ERRORS = ("no server running", "error connecting to")
+# Cheap per-pane activity fingerprint; window_activity (epoch seconds) first
+PROBE_FORMAT = " ".join([
+    "#{window_activity}",
+    "#{history_size}",
+    "#{cursor_x},#{cursor_y}",
+    "#{pane_id}",
+    "#{pane_width}x#{pane_height}",
+    "#{alternate_on}",
+])
+# Bytes read from capture-pane at a time when streaming full history
+STREAM_CHUNK_SIZE = 64 * 1024
+# Re-captures of a scrollback page before giving up while output keeps
+# scrolling (two more for finding a cursor the history was trimmed under)
+SCROLLBACK_ATTEMPTS = 5
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _is_missing_session(target: str, stderr: Optional[str]) -> bool:
+    """Whether a failed capture-pane means the target's session does not exist"""
+    if not stderr:
+        return False
+    if any(marker in stderr for marker in MISSING_SESSION_ERRORS):
+        return True
+    # A bare session name is looked up as a pane last, so that is what tmux reports
+    return ':' not in target and f"can't find pane: {target}" in stderr
 
 
 def validate_tmux_target(target: str) -> bool:
-    """Validate tmux target format (session, session:window, session:window.pane)"""
+    """Validate tmux target format (session, session:window, session:window.pane, %pane_id)"""
     if not target or len(target) > MAX_TARGET_LENGTH:
         return False
     return bool(TMUX_TARGET_PATTERN.match(target))
@@ -28,6 +84,36 @@ def validate_tmux_name(name: str) -> bool:
     return bool(TMUX_NAME_PATTERN.match(name))
 
 
+def clamp_window_size(cols: int, rows: int) -> Tuple[int, int]:
+    """Clamp a requested window size to reasonable bounds"""
+    return (max(MIN_WINDOW_COLS, min(cols, MAX_WINDOW_COLS)),
+            max(MIN_WINDOW_ROWS, min(rows, MAX_WINDOW_ROWS)))
+
+
+def validate_input_items(items: List[Tuple[str, str]]) -> bool:
+    """Validate a send_input batch: 1..MAX_INPUT_ITEMS ("text" | "key", value)
+    items, at most MAX_COMMAND_LENGTH characters, key names without spaces"""
+    if not items or len(items) > MAX_INPUT_ITEMS:
+        return False
+    total = 0
+    for kind, value in items:
+        if not isinstance(value, str):
+            return False
+        if kind == "key":
+            if not value or len(value) > MAX_KEY_NAME_LENGTH or any(ch.isspace() for ch in value):
+                return False
+        elif kind != "text":
+            return False
+        total += len(value)
+    return total <= MAX_COMMAND_LENGTH
+
+
+def _escape_separator(arg: str) -> str:
+    """Keep tmux from reading an argument that ends in ";" as a command
+    separator (it turns a trailing "\\;" back into ";")"""
+    return arg[:-1] + "\\;" if arg.endswith(";") else arg
+
+
 class TmuxService:
     def __init__(self):
         socket_path = os.environ.get("TMUX_SOCKET_PATH")
@@ -35,18 +121,50 @@ class TmuxService:
             logger.warning(f"TMUX_SOCKET_PATH must be absolute, ignoring: {socket_path}")
             socket_path = None
         self._socket_path = socket_path
+        # TMUX_CONTROL_MODE=1 routes commands through one persistent
+        # `tmux -C` connection instead of forking a process per call.
+        control_mode = _env_flag("TMUX_CONTROL_MODE")
+        self._control = get_control_client(socket_path) if control_mode else None
+        # Control mode also enables %output-driven monitoring
+        self._output_events = get_output_events(socket_path) if control_mode else None
+        # Sessions/hierarchy snapshot; control-mode notifications invalidate it
+        self._topology = TopologyCache(
+            self._load_topology,
+            version=(lambda: self._control.topology_version) if self._control else None,
+            on_change=self._topology_changed,
+        )
+        self._topology_listeners: List[Callable[[], None]] = []
+        # get_output captures in flight, by (target, include_history, lines)
+        self._output_captures: Dict[Tuple[str, bool, Optional[int]], asyncio.Future] = {}
+        # Pane ids tmux resolved, valid for as long as this topology snapshot
+        self._pane_ids: Tuple[Optional[TopologySnapshot], Dict[str, Optional[str]]] = (None, {})
 
     async def _execute_tmux_command(self, cmd: List[str]) -> Tuple[Optional[str], Optional[str], int]:
         """Execute a tmux command and return (stdout, stderr, returncode).
 
         Returns decoded stdout/stderr strings and the process return code.
-        If TMUX_SOCKET_PATH is set, injects -S <path> into the command.
+        When control mode is enabled the command is sent over the shared
+        control connection, falling back to a subprocess if it is unavailable.
         """
-        if self._socket_path and cmd and cmd[0] == "tmux":
-            cmd = [cmd[0], "-S", self._socket_path, *cmd[1:]]
+        if self._control is not None and cmd and cmd[0] == "tmux":
+            try:
+                return await self._control.execute(cmd[1:])
+            except TmuxControlUnavailable as e:
+                logger.debug(f"tmux control mode unavailable, forking instead: {e}")
+            except TmuxControlError as e:
+                # The command may already have run; don't repeat it.
+                logger.warning(f"tmux control-mode command failed: {e}")
+                return None, str(e), 1
+
+        return await self._execute_subprocess(cmd)
 
+    async def _execute_subprocess(self, cmd: List[str]) -> Tuple[Optional[str], Optional[str], int]:
+        """Fork a tmux process for one command.
+
+        If TMUX_SOCKET_PATH is set, injects -S <path> into the command.
+        """
         process = await asyncio.create_subprocess_exec(
-            *cmd,
+            *self._subprocess_argv(cmd),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
@@ -57,6 +175,11 @@ class TmuxService:
             process.returncode
         )
 
+    def _subprocess_argv(self, cmd: List[str]) -> List[str]:
+        if self._socket_path and cmd and cmd[0] == "tmux":
+            return [cmd[0], "-S", self._socket_path, *cmd[1:]]
+        return cmd
+
     async def send_command(self, command: str, target: str = None, literal: bool = True) -> bool:
         """Send a command to tmux target (session, window, or pane).
 
@@ -100,20 +223,59 @@ class TmuxService:
             logger.error(f"Error sending enter: {e}")
             return False
 
+    async def send_input(self, target: str, items: List[Tuple[str, str]]) -> bool:
+        """Send an ordered list of ("text", value) and ("key", name) items
+        to a target in one tmux call.
+
+        Runs of text are sent literally and runs of keys as key names, one
+        send-keys per run, chained into a single batch (see _execute_chain).
+        """
+        if not validate_tmux_target(target):
+            logger.warning(f"Invalid tmux target format: {target}")
+            return False
+
+        if not validate_input_items(items):
+            logger.warning(f"Invalid input batch for {target}")
+            return False
+
+        commands: List[List[str]] = []
+        last_kind = None
+        for kind, value in items:
+            if kind == "text" and not value:
+                continue
+            if kind == last_kind == "key":
+                commands[-1].append(value)
+            elif kind == last_kind == "text":
+                commands[-1][-1] += value
+            elif kind == "key":
+                commands.append(["send-keys", "-t", target, value])
+            else:
+                # "--" so text starting with "-" is not read as a flag
+                commands.append(["send-keys", "-t", target, "-l", "--", value])
+            last_kind = kind
+
+        if not commands:
+            return True
+        try:
+            _, _, returncode = await self._execute_chain(commands)
+            return returncode == 0
+        except Exception as e:
+            logger.error(f"Error sending input: {e}")
+            return False
+
     async def resize_pane(self, target: str, cols: int, rows: int) -> bool:
         """Resize tmux pane to match frontend terminal dimensions"""
         if not validate_tmux_target(target):
             logger.warning(f"Invalid tmux target format: {target}")
             return False
 
-        # Clamp to reasonable bounds
-        cols = max(20, min(cols, 500))
-        rows = max(24, min(rows, 200))
+        cols, rows = clamp_window_size(cols, rows)
 
         try:
             _, stderr, returncode = await self._execute_tmux_command(
                 ["tmux", "resize-window", "-t", target, "-x", str(cols), "-y", str(rows)]
             )
+            self.invalidate_topology()
 
             if returncode != 0:
                 logger.error(f"Failed to resize pane: {stderr}")
@@ -124,6 +286,23 @@ class TmuxService:
             logger.error(f"Error resizing pane: {e}")
             return False
 
+    async def get_window_size(self, target: str) -> Optional[Tuple[str, int, int]]:
+        """(window id, columns, rows) of the target's window, or None if it does not exist"""
+        if not validate_tmux_target(target):
+            return None
+        try:
+            stdout, _, returncode = await self._execute_tmux_command(
+                ["tmux", "display-message", "-p", "-t", target,
+                 "#{window_id} #{window_width} #{window_height}"]
+            )
+        except Exception as e:
+            logger.error(f"Error reading window size: {e}")
+            return None
+        parts = (stdout or "").split()
+        if returncode != 0 or len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            return None
+        return parts[0], int(parts[1]), int(parts[2])
+
     async def get_output(self, target: str = None, include_history: bool = False, lines: int = None) -> str:
         """Get current tmux target output, optionally including scrollback history"""
 
@@ -131,41 +310,493 @@ class TmuxService:
             logger.warning(f"Invalid tmux target format: {target}")
             return "Error: Invalid target format"
 
+        # Identical concurrent reads (auto-refresh, a history reload) share
+        # one capture-pane call
+        key = (target, include_history, lines)
+        capture = self._output_captures.get(key)
+        if capture is None or capture.get_loop() is not asyncio.get_running_loop():
+            capture = self._output_captures[key] = asyncio.ensure_future(
+                self._capture_output(target, include_history, lines))
+            capture.add_done_callback(lambda done: self._forget_capture(key, done))
+        return await asyncio.shield(capture)
+
+    def _forget_capture(self, key: Tuple[str, bool, Optional[int]], capture: asyncio.Future) -> None:
+        if self._output_captures.get(key) is capture:
+            del self._output_captures[key]
+
+    async def _capture_output(self, target: str, include_history: bool, lines: Optional[int]) -> str:
         try:
-            session_name = target.split(':')[0] if ':' in target else target
-            if not await self.session_exists(session_name):
-                return "Session not found"
+            # No has-session pre-check: a missing session shows up in
+            # capture-pane's own error, so each poll costs one command.
+            cmd = ["tmux", *self._capture_args(target, include_history, lines)]
+            stdout, stderr, returncode = await self._execute_tmux_command(cmd)
+            return self._capture_result(target, stdout, stderr, returncode)
 
-            if include_history:
-                if lines:
-                    cmd = ["tmux", "capture-pane", "-t", target, "-e", "-p", "-S", f"-{lines}"]
-                else:
-                    cmd = ["tmux", "capture-pane", "-t", target, "-e", "-p", "-S", "-"]
+        except Exception as e:
+            return f"Error getting output: {e}"
+
+    @staticmethod
+    def _capture_args(target: str, include_history: bool = False, lines: int = None) -> List[str]:
+        args = ["capture-pane", "-t", target, "-e", "-p"]
+        if include_history:
+            args += ["-S", f"-{lines}" if lines else "-"]
+        return args
+
+    def _capture_result(self, target: str, stdout: Optional[str], stderr: Optional[str],
+                        returncode: int) -> str:
+        """Turn a capture-pane result into get_output's return value"""
+        if returncode == 0:
+            return (stdout or "").rstrip('\n')
+
+        if _is_missing_session(target, stderr):
+            return "Session not found"
+        return f"Error: {stderr or 'unknown error'}"
+
+    async def capture_targets(self, targets: List[str]) -> Dict[str, str]:
+        """Capture the visible content of several targets in one batch.
+
+        Values have the same form as get_output.
+        """
+        results: Dict[str, str] = {}
+        pending = []
+        for target in dict.fromkeys(targets):
+            if validate_tmux_target(target):
+                pending.append(target)
             else:
-                cmd = ["tmux", "capture-pane", "-t", target, "-e", "-p"]
+                results[target] = "Error: Invalid target format"
 
-            stdout, stderr, returncode = await self._execute_tmux_command(cmd)
+        raw = await self._execute_per_target(pending, self._capture_args)
+        for target in pending:
+            results[target] = self._capture_result(target, *raw[target])
+        return results
+
+    async def stream_history(self, target: str, escapes: bool = True,
+                             chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Full history and screen of a target as raw capture-pane stdout chunks.
 
-            if returncode == 0:
-                return (stdout or "").rstrip('\n')
+        Reads the output incrementally so memory stays constant however long
+        the history is. Always forks, since control-mode replies arrive in
+        one piece. Raises ValueError, LookupError (missing session) or
+        RuntimeError before the first chunk.
+        """
+        if not validate_tmux_target(target):
+            raise ValueError("Invalid target format")
+        args = ["tmux", "capture-pane", "-t", target, "-p", "-S", "-"]
+        if escapes:
+            args.append("-e")
+        process = await asyncio.create_subprocess_exec(
+            *self._subprocess_argv(args),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            chunk = await process.stdout.read(chunk_size)
+            if not chunk:
+                stderr = (await process.stderr.read()).decode()
+                if await process.wait() != 0:
+                    if _is_missing_session(target, stderr):
+                        raise LookupError("Session not found")
+                    raise RuntimeError(stderr or "unknown error")
+            while chunk:
+                yield chunk
+                chunk = await process.stdout.read(chunk_size)
+            await process.wait()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    async def get_scrollback_page(self, target: str, lines: int = DEFAULT_PAGE_LINES,
+                                  cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Capture one page of a target's scrollback with `capture-pane -S a -E b`.
+
+        Without a cursor the page is the `lines` history rows right above
+        the visible screen; with one it is the rows above the previous
+        page. Every page is one capture of at most `lines` rows, however
+        deep it is. Returns content, start/end (absolute line indices, 0 =
+        oldest history line), history_size and the cursor for the next
+        older page (None at the top).
+
+        Raises ValueError for an invalid target or cursor, CursorExpired if
+        the history was cleared or trimmed past the cursor since it was
+        issued and LookupError if the session does not exist.
+        """
+        if not validate_tmux_target(target):
+            raise ValueError("Invalid target format")
+        position = ScrollbackCursor.decode(cursor) if cursor else None
+        rows, start, end, history_size = await self._capture_scrollback(
+            target, max(1, min(MAX_PAGE_LINES, lines)), position)
+        return page_dict(rows, start, end, history_size)
+
+    async def seed_scrollback(self, target: str, lines: int = SEED_LINES) -> Optional[ScrollbackBuffer]:
+        """Capture up to `lines` history rows into a new ScrollbackBuffer, or None on failure"""
+        if not validate_tmux_target(target):
+            return None
+        try:
+            rows, _, end, history_size = await self._capture_scrollback(target, lines, None)
+        except Exception as e:
+            logger.debug(f"Could not seed scrollback for {target}: {e}")
+            return None
+        return ScrollbackBuffer(rows, end, history_size)
+
+    async def _capture_scrollback(
+        self, target: str, lines: int, position: Optional[ScrollbackCursor]
+    ) -> Tuple[List[str], int, int, int]:
+        """The `lines` history rows ending at the cursor (or the screen) as (rows, start, end, history_size)"""
+        history_size = position.history_size if position is not None else 0
+        end = position.end if position is not None else 0
+        anchor_rows = position.anchor_rows if position is not None else 0
+        # Rows above the page also captured while looking for a moved anchor
+        reach = 0
+
+        for _ in range(SCROLLBACK_ATTEMPTS):
+            # Row numbers depend on the history size, so the capture is
+            # bracketed by two reads of it and retried if output scrolled
+            # in between (or since the cursor was issued). A cursor's page
+            # is captured together with its anchor rows right below it.
+            if position is None:
+                first, last = -lines, -1
             else:
-                return f"Error: {stderr or 'unknown error'}"
+                first = max(0, end - lines - reach) - history_size
+                last = end - 1 + anchor_rows - history_size
+            size_args = ["display-message", "-p", "-t", target, "#{history_size} #{history_limit}"]
+            before, captured, after = await self._execute_sequence([
+                size_args,
+                ["capture-pane", "-t", target, "-e", "-p", "-S", str(first), "-E", str(last)],
+                size_args,
+            ])
+            for _, stderr, returncode in (before, captured, after):
+                if returncode != 0:
+                    if _is_missing_session(target, stderr):
+                        raise LookupError("Session not found")
+                    raise RuntimeError(stderr or "unknown error")
+
+            size_before = int(before[0].split()[0])
+            size_after, limit = (int(part) for part in after[0].split())
+            if size_before != size_after or (position is not None and size_after != history_size):
+                history_size = size_after
+                continue
+            if position is None:
+                break
+            near_limit = near_history_limit(size_after, limit)
+            if size_after < position.history_size and not near_limit:
+                raise CursorExpired("History was cleared since the cursor was issued")
+
+            # tmux clamps rows outside the history instead of failing
+            rows = (captured[0] or "").split('\n')[:-1]
+            bottom = len(rows) - anchor_rows
+            if position.matches(rows[bottom:]):
+                rows = rows[:bottom]
+                break
+            # Trimmed at history-limit: the anchor moved up by the rows
+            # dropped, a tenth of the limit at a time
+            shift = next((k for k in range(1, bottom + 1)
+                          if position.matches(rows[bottom - k:bottom - k + anchor_rows])), None)
+            if shift is None:
+                if reach or not near_limit:
+                    raise CursorExpired("History was trimmed past the cursor since it was issued")
+                reach = min(size_after, 2 * max(1, limit // 10))
+                continue
+            captured_from = max(0, end - lines - reach)
+            end -= shift
+            if captured_from <= max(0, end - lines):
+                rows = rows[:bottom - shift]
+                break
+        else:
+            raise RuntimeError("Output kept scrolling while capturing scrollback")
+
+        history_size = size_after
+        if position is None:
+            end = history_size
+            rows = (captured[0] or "").split('\n')[:-1]
+        end = min(end, history_size)
+        start = max(0, end - lines)
+        rows = rows[-(end - start):] if end > start else []
+        return rows, start, end, history_size
+
+    async def history_sizes(self, targets: List[str]) -> Dict[str, Optional[Tuple[int, int, int]]]:
+        """(#{history_size}, #{history_limit}, #{window_activity}) for several targets in one batch"""
+        pending = [target for target in dict.fromkeys(targets) if validate_tmux_target(target)]
+        raw = await self._execute_per_target(
+            pending, lambda target: ["display-message", "-p", "-t", target,
+                                     "#{history_size} #{history_limit} #{window_activity}"]
+        )
+        results: Dict[str, Optional[Tuple[int, int, int]]] = {}
+        for target in targets:
+            stdout, _, returncode = raw.get(target, (None, None, 1))
+            parts = (stdout or "").split()
+            ok = returncode == 0 and len(parts) == 3 and all(part.isdigit() for part in parts)
+            results[target] = (int(parts[0]), int(parts[1]), int(parts[2])) if ok else None
+        return results
+
+    async def capture_history_tails(self, rows: Dict[str, int]) -> Dict[str, Optional[List[str]]]:
+        """The last `rows[target]` history lines of several targets in one batch"""
+        pending = [target for target in rows if validate_tmux_target(target) and rows[target] > 0]
+        raw = await self._execute_per_target(
+            pending,
+            lambda target: ["capture-pane", "-t", target, "-e", "-p", "-S", f"-{rows[target]}", "-E", "-1"],
+        )
+        results: Dict[str, Optional[List[str]]] = {}
+        for target in rows:
+            stdout, _, returncode = raw.get(target, (None, None, 1))
+            results[target] = (stdout or "").split('\n')[:-1] if returncode == 0 else None
+        return results
+
+    async def capture_pane_tails(self, lines: int) -> Optional[Dict[str, List[str]]]:
+        """The last `lines` non-blank rows of every pane's screen, without
+        escape sequences, keyed by "session:window.pane".
+
+        Panes come from the shared topology snapshot and are captured by
+        pane id in one batch. None if tmux could not be listed.
+        """
+        try:
+            snapshot = await self._topology.get()
+            panes = {f"{r.session_name}:{r.window_index}.{r.pane_index}": r.pane_id for r in snapshot.records}
+            raw = await self._execute_per_target(
+                list(dict.fromkeys(panes.values())), lambda pane_id: ["capture-pane", "-p", "-t", pane_id]
+            )
+        except Exception as e:
+            logger.error(f"Error capturing pane tails: {e}")
+            return None
 
+        results: Dict[str, List[str]] = {}
+        for target, pane_id in panes.items():
+            stdout, _, returncode = raw.get(pane_id, (None, None, 1))
+            if returncode != 0:
+                continue  # Closed since the snapshot was taken
+            rows = [row.rstrip() for row in (stdout or "").split('\n')]
+            while rows and not rows[-1]:
+                rows.pop()
+            results[target] = rows[-lines:]
+        return results
+
+    async def probe_targets(self, targets: List[str]) -> Dict[str, Optional[Tuple[str, int]]]:
+        """Read a cheap activity fingerprint for several targets in one batch.
+
+        Maps each target to (fingerprint, window_activity) where the
+        fingerprint changes whenever the pane's content may have, or None if
+        the target could not be probed.
+        """
+        pending = [target for target in dict.fromkeys(targets) if validate_tmux_target(target)]
+        raw = await self._execute_per_target(
+            pending, lambda target: ["display-message", "-p", "-t", target, PROBE_FORMAT]
+        )
+
+        results: Dict[str, Optional[Tuple[str, int]]] = {}
+        for target in targets:
+            stdout, _, returncode = raw.get(target, (None, None, 1))
+            fingerprint = (stdout or "").strip()
+            fields = fingerprint.split(' ')
+            # display-message on a missing target can succeed with empty
+            # formats, so only a real pane id counts as probed
+            if returncode != 0 or len(fields) < 4 or not fields[3].startswith('%'):
+                results[target] = None
+                continue
+            activity = fields[0]
+            results[target] = (fingerprint, int(activity) if activity.isdigit() else 0)
+        return results
+
+    async def resolve_pane_ids(self, targets: List[str]) -> Dict[str, Optional[str]]:
+        """Map targets to tmux's stable pane ids ("%3"), None if a target
+        names no pane.
+
+        Answered from the shared topology snapshot where it is unambiguous;
+        the rest are asked of tmux in one batch and remembered until the
+        snapshot changes, so renames and focus changes are picked up.
+        """
+        try:
+            snapshot = await self._topology.get()
         except Exception as e:
-            return f"Error getting output: {e}"
+            logger.error(f"Error loading topology to resolve panes: {e}")
+            snapshot = None
+        if self._pane_ids[0] is not snapshot or snapshot is None:
+            self._pane_ids = (snapshot, {})
+        memo = self._pane_ids[1]
+
+        results: Dict[str, Optional[str]] = {}
+        pending = []
+        for target in dict.fromkeys(targets):
+            if not validate_tmux_target(target):
+                results[target] = None
+            elif target in memo:
+                results[target] = memo[target]
+            else:
+                pane_id = snapshot.resolve(target) if snapshot is not None else None
+                if pane_id is None:
+                    pending.append(target)
+                else:
+                    results[target] = pane_id
 
-    async def get_sessions(self) -> List[str]:
-        """Get list of tmux sessions"""
+        if not pending:
+            return results
+        raw = await self._execute_per_target(
+            pending, lambda target: ["display-message", "-p", "-t", target, "#{pane_id}"]
+        )
+        for target in pending:
+            stdout, _, returncode = raw.get(target, (None, None, 1))
+            pane_id = (stdout or "").strip()
+            results[target] = memo[target] = pane_id if returncode == 0 and pane_id.startswith('%') else None
+        return results
+
+    async def _execute_per_target(
+        self, targets: List[str], make_args: Callable[[str], List[str]]
+    ) -> Dict[str, Tuple[Optional[str], Optional[str], int]]:
+        """Run one tmux command per target as a single batch.
+
+        In control mode every command is sent on the shared connection.
+        Otherwise the commands are chained with `;` into one tmux
+        invocation, each followed by a `display-message` marker line so the
+        combined stdout can be split per target. tmux stops a chain at the
+        first failing command, so that target gets the error and the rest
+        are retried in another chain.
+        """
+        if self._control is not None:
+            async def run(target):
+                try:
+                    return await self._execute_tmux_command(["tmux", *make_args(target)])
+                except Exception as e:
+                    return None, str(e), 1
+
+            return dict(zip(targets, await asyncio.gather(*(run(target) for target in targets))))
+
+        results: Dict[str, Tuple[Optional[str], Optional[str], int]] = {}
+        pending = list(targets)
+        while pending:
+            token = secrets.token_hex(8)
+            cmd = ["tmux"]
+            for i, target in enumerate(pending):
+                if i:
+                    cmd.append(";")
+                cmd += [*make_args(target), ";", "display-message", "-p", f"{token}:{i}"]
+
+            try:
+                stdout, stderr, returncode = await self._execute_tmux_command(cmd)
+            except Exception as e:
+                results.update((target, (None, str(e), 1)) for target in pending)
+                break
+            stdout = stdout or ""
+
+            done = 0
+            start = 0
+            for match in re.finditer(rf"^{token}:(\d+)$\n?", stdout, re.M):
+                results[pending[int(match.group(1))]] = (stdout[start:match.start()], None, 0)
+                start = match.end()
+                done += 1
+
+            if done == len(pending):
+                break
+            failure = (None, stderr, returncode or 1)
+            if stderr and any(marker in stderr for marker in MISSING_SERVER_ERRORS):
+                results.update((target, failure) for target in pending[done:])
+                break
+            results[pending[done]] = failure
+            pending = pending[done + 1:]
+        return results
+
+    async def _execute_chain(self, commands: List[List[str]]) -> Tuple[Optional[str], Optional[str], int]:
+        """Run tmux commands in order as one batch; returns the first failure
+        or the last command's result.
+
+        Without control mode they are chained with `;` into a single tmux
+        invocation, which stops at the first failing command. In control
+        mode they are written to the connection back to back and tmux runs
+        them in that order; if none could be delivered the chain falls back
+        to a subprocess, but a partly delivered chain is never repeated.
+        """
+        if self._control is not None:
+            results = await asyncio.gather(
+                *(self._control.execute(args) for args in commands), return_exceptions=True)
+            if not all(isinstance(result, TmuxControlUnavailable) for result in results):
+                for result in results:
+                    if isinstance(result, BaseException):
+                        logger.warning(f"tmux control-mode command failed: {result}")
+                        return None, str(result), 1
+                    if result[2] != 0:
+                        return result
+                return results[-1]
+            logger.debug(f"tmux control mode unavailable, forking instead: {results[0]}")
+
+        cmd = ["tmux"]
+        for i, args in enumerate(commands):
+            if i:
+                cmd.append(";")
+            cmd += [_escape_separator(arg) for arg in args]
+        return await self._execute_subprocess(cmd)
+
+    async def _execute_sequence(
+        self, commands: List[List[str]]
+    ) -> List[Tuple[Optional[str], Optional[str], int]]:
+        """Run several tmux commands back to back in one batch, in order"""
+        raw = await self._execute_per_target(list(range(len(commands))), lambda i: commands[i])
+        return [raw[i] for i in range(len(commands))]
+
+    async def _resolve_pane(self, target: str) -> Optional[Tuple[str, str]]:
+        """Resolve a target to tmux's (session_id, pane_id), e.g. ("$1", "%3")"""
         try:
             stdout, _, returncode = await self._execute_tmux_command(
-                ["tmux", "list-sessions", "-F", "#{session_name}"]
+                ["tmux", "display-message", "-p", "-t", target, "#{session_id} #{pane_id}"]
             )
+            if returncode != 0 or not stdout:
+                return None
+            parts = stdout.strip().split(' ')
+            return (parts[0], parts[1]) if len(parts) == 2 else None
+        except Exception as e:
+            logger.error(f"Error resolving pane for {target}: {e}")
+            return None
 
-            if returncode == 0 and stdout:
-                sessions = stdout.strip().split('\n')
-                return [s for s in sessions if s]
-            else:
-                return []
+    async def _resolve_pane_id(self, target: str) -> Optional[str]:
+        resolved = await self._resolve_pane(target)
+        return resolved[1] if resolved else None
+
+    async def subscribe_output(self, target: str) -> Optional[PaneOutputSubscription]:
+        """Subscribe to tmux %output notifications for the pane behind target.
+
+        Returns None when control mode is disabled or the target cannot be
+        resolved; callers then fall back to polling.
+        """
+        if self._output_events is None or not validate_tmux_target(target):
+            return None
+
+        resolved = await self._resolve_pane(target)
+        if resolved is None:
+            return None
+        session_id, pane_id = resolved
+        return self._output_events.subscribe(session_id, target, pane_id, self._resolve_pane_id)
+
+    def invalidate_topology(self) -> None:
+        """Drop the cached sessions/hierarchy snapshot"""
+        self._topology.invalidate()
+        self._topology_changed()
+
+    def add_topology_listener(self, listener: Callable[[], None]) -> None:
+        """Call `listener` whenever sessions, windows or panes may have
+        changed: on control-mode topology notifications, after changes made
+        through this service, and when a reloaded snapshot differs from the
+        last one (the only sign of outside changes without control mode)"""
+        if not self._topology_listeners and self._control is not None:
+            self._control.add_notification_handler(self._on_control_notification)
+        self._topology_listeners.append(listener)
+
+    def _on_control_notification(self, line: str) -> None:
+        # %exit: notifications may be missed until the client reconnects
+        if line.split(" ", 1)[0] in TOPOLOGY_NOTIFICATIONS or line.startswith("%exit"):
+            self._topology_changed()
+
+    def _topology_changed(self) -> None:
+        for listener in list(self._topology_listeners):
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Error in topology listener: {e}")
+
+    async def _load_topology(self) -> Optional[List[PaneRecord]]:
+        return await self._list_pane_records(["-a"])
+
+    async def get_sessions(self) -> List[str]:
+        """Get list of tmux sessions (from the shared topology snapshot)"""
+        try:
+            snapshot = await self._topology.get()
+            return list(snapshot.sessions)
 
         except Exception as e:
             logger.error(f"Error getting sessions: {e}")
@@ -182,6 +813,7 @@ class TmuxService:
             _, stderr, returncode = await self._execute_tmux_command(
                 ["tmux", "new-session", "-d", "-s", session, "-c", start_dir]
             )
+            self.invalidate_topology()
 
             if returncode != 0:
                 logger.warning(f"tmux new-session failed: {stderr}")
@@ -205,6 +837,19 @@ class TmuxService:
         except Exception as e:
             return False
 
+    async def _list_pane_records(self, scope: List[str]) -> Optional[List[PaneRecord]]:
+        """Run one `list-panes` over scope (e.g. ["-a"]) and parse the rows.
+
+        Returns None if tmux reported an error.
+        """
+        stdout, stderr, returncode = await self._execute_tmux_command(
+            ["tmux", "list-panes", *scope, "-F", PANE_FORMAT]
+        )
+        if returncode != 0:
+            logger.warning(f"Error listing panes: {stderr}")
+            return None
+        return parse_pane_records(stdout)
+
     async def get_windows(self, session: str) -> List[Dict[str, Any]]:
         """Get list of windows in a tmux session"""
         if not validate_tmux_name(session):
@@ -212,27 +857,8 @@ class TmuxService:
             return []
 
         try:
-            stdout, stderr, returncode = await self._execute_tmux_command(
-                ["tmux", "list-windows", "-t", session, "-F",
-                 "#{window_index}|#{window_name}|#{window_active}|#{window_panes}"]
-            )
-
-            if returncode == 0 and stdout:
-                windows = []
-                for line in stdout.strip().split('\n'):
-                    if line.strip():
-                        parts = line.split('|')
-                        if len(parts) >= 4:
-                            windows.append({
-                                'index': parts[0],
-                                'name': parts[1],
-                                'active': parts[2] == '1',
-                                'pane_count': int(parts[3]) if parts[3].isdigit() else 1
-                            })
-                return windows
-            else:
-                logger.warning(f"Error listing windows: {stderr}")
-                return []
+            records = await self._list_pane_records(["-s", "-t", session])
+            return window_summaries(records) if records else []
 
         except Exception as e:
             logger.error(f"Error getting windows: {e}")
@@ -249,27 +875,8 @@ class TmuxService:
 
         try:
             target = f"{session}:{window}" if window else session
-            stdout, stderr, returncode = await self._execute_tmux_command(
-                ["tmux", "list-panes", "-t", target, "-F",
-                 "#{pane_index}|#{pane_active}|#{pane_current_command}|#{pane_width}x#{pane_height}"]
-            )
-
-            if returncode == 0 and stdout:
-                panes = []
-                for line in stdout.strip().split('\n'):
-                    if line.strip():
-                        parts = line.split('|')
-                        if len(parts) >= 4:
-                            panes.append({
-                                'index': parts[0],
-                                'active': parts[1] == '1',
-                                'command': parts[2],
-                                'size': parts[3] if len(parts) > 3 else 'unknown'
-                            })
-                return panes
-            else:
-                logger.warning(f"Error listing panes: {stderr}")
-                return []
+            records = await self._list_pane_records(["-t", target])
+            return [record.pane_dict() for record in records] if records else []
 
         except Exception as e:
             logger.error(f"Error getting panes: {e}")
@@ -285,6 +892,7 @@ class TmuxService:
             _, _, returncode = await self._execute_tmux_command(
                 ["tmux", "kill-session", "-t", session]
             )
+            self.invalidate_topology()
             return returncode == 0
         except Exception as e:
             logger.error(f"Error killing session: {e}")
@@ -305,6 +913,7 @@ class TmuxService:
                 cmd.extend(["-n", window_name])
 
             _, stderr, returncode = await self._execute_tmux_command(cmd)
+            self.invalidate_topology()
 
             if returncode != 0:
                 logger.warning(f"tmux new-window failed: {stderr}")
@@ -329,6 +938,7 @@ class TmuxService:
             _, _, returncode = await self._execute_tmux_command(
                 ["tmux", "kill-window", "-t", target]
             )
+            self.invalidate_topology()
             return returncode == 0
         except Exception as e:
             logger.error(f"Error killing window: {e}")
@@ -347,6 +957,7 @@ class TmuxService:
             _, _, returncode = await self._execute_tmux_command(
                 ["tmux", "rename-session", "-t", old_name, new_name]
             )
+            self.invalidate_topology()
             return returncode == 0
         except Exception as e:
             logger.error(f"Error renaming session: {e}")
@@ -369,53 +980,23 @@ class TmuxService:
             _, _, returncode = await self._execute_tmux_command(
                 ["tmux", "rename-window", "-t", target, new_name]
             )
+            self.invalidate_topology()
             return returncode == 0
         except Exception as e:
             logger.error(f"Error renaming window: {e}")
             return False
 
     async def get_hierarchy(self) -> Dict[str, Any]:
-        """Get complete tmux hierarchy (sessions -> windows -> panes)"""
-        try:
-            sessions = await self.get_sessions()
-            hierarchy = {}
-
-            logger.debug(f"Found {len(sessions)} sessions: {sessions}")
-
-            for session in sessions:
-                logger.debug(f"Processing session: {session}")
-
-                windows = await self.get_windows(session)
-                logger.debug(f"Found {len(windows)} windows in session {session}")
+        """Get complete tmux hierarchy (sessions -> windows -> panes).
 
-                session_data = {
-                    'name': session,
-                    'windows': {}
-                }
-
-                for window in windows:
-                    logger.debug(f"Processing window {window['index']}: {window['name']}")
-
-                    panes = await self.get_panes(session, window['index'])
-                    logger.debug(f"Found {len(panes)} panes in window {window['index']}")
-
-                    session_data['windows'][window['index']] = {
-                        'name': window['name'],
-                        'index': window['index'],
-                        'active': window['active'],
-                        'pane_count': window.get('pane_count', len(panes)),
-                        'panes': {pane['index']: {
-                            'index': pane['index'],
-                            'active': pane['active'],
-                            'command': pane['command'],
-                            'size': pane.get('size', 'unknown')
-                        } for pane in panes}
-                    }
-
-                hierarchy[session] = session_data
-
-            logger.debug(f"Final hierarchy structure: {list(hierarchy.keys())}")
-            return hierarchy
+        Built from a single `list-panes -a` call instead of one
+        list-windows/list-panes call per session and window, and shared with
+        get_sessions through the topology cache. The returned dict is shared;
+        do not mutate it.
+        """
+        try:
+            snapshot = await self._topology.get()
+            return snapshot.hierarchy
 
         except Exception as e:
             logger.error(f"Error getting hierarchy: {e}")
@@ -0,0 +1,251 @@
+"""Typed records for tmux session/window/pane topology.
+
+Every field needed for sessions, windows and panes comes from one
+``list-panes -F PANE_FORMAT`` row, so a single ``list-panes -a`` call
+describes the whole server. TopologyCache shares that snapshot between
+requests.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Safety net for changes tmux sends no notification for (pane commands,
+# sessions outside the control client's view, or control mode disabled)
+TOPOLOGY_TTL = 2.0
+
+# Tab-separated; pane_current_command is last so it may contain anything
+PANE_FORMAT = "\t".join([
+    "#{session_id}",
+    "#{session_name}",
+    "#{window_index}",
+    "#{window_name}",
+    "#{window_active}",
+    "#{window_panes}",
+    "#{pane_id}",
+    "#{pane_index}",
+    "#{pane_active}",
+    "#{pane_width}",
+    "#{pane_height}",
+    "#{pane_current_command}",
+])
+_FIELD_COUNT = 12
+
+
+def _to_int(value: str, default: int = 0) -> int:
+    return int(value) if value.isdigit() else default
+
+
+class PaneRecord:
+    """One pane together with its window and session"""
+
+    __slots__ = (
+        "session_id", "session_name",
+        "window_index", "window_name", "window_active", "window_panes",
+        "pane_id", "pane_index", "pane_active", "width", "height", "command",
+    )
+
+    def __init__(self, session_id: str, session_name: str, window_index: str, window_name: str,
+                 window_active: bool, window_panes: int, pane_id: str, pane_index: str,
+                 pane_active: bool, width: int, height: int, command: str):
+        self.session_id = session_id
+        self.session_name = session_name
+        self.window_index = window_index
+        self.window_name = window_name
+        self.window_active = window_active
+        self.window_panes = window_panes
+        self.pane_id = pane_id
+        self.pane_index = pane_index
+        self.pane_active = pane_active
+        self.width = width
+        self.height = height
+        self.command = command
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["PaneRecord"]:
+        parts = line.split('\t', _FIELD_COUNT - 1)
+        if len(parts) < _FIELD_COUNT:
+            return None
+        return cls(
+            session_id=parts[0],
+            session_name=parts[1],
+            window_index=parts[2],
+            window_name=parts[3],
+            window_active=parts[4] == '1',
+            window_panes=_to_int(parts[5], 1),
+            pane_id=parts[6],
+            pane_index=parts[7],
+            pane_active=parts[8] == '1',
+            width=_to_int(parts[9]),
+            height=_to_int(parts[10]),
+            command=parts[11],
+        )
+
+    @property
+    def size(self) -> str:
+        return f"{self.width}x{self.height}"
+
+    def window_dict(self) -> Dict[str, Any]:
+        return {
+            'index': self.window_index,
+            'name': self.window_name,
+            'active': self.window_active,
+            'pane_count': self.window_panes,
+        }
+
+    def pane_dict(self) -> Dict[str, Any]:
+        return {
+            'index': self.pane_index,
+            'active': self.pane_active,
+            'command': self.command,
+            'size': self.size,
+        }
+
+
+def parse_pane_records(stdout: Optional[str]) -> List[PaneRecord]:
+    """Parse `list-panes -F PANE_FORMAT` output, skipping malformed rows"""
+    if not stdout:
+        return []
+    records = []
+    for line in stdout.split('\n'):
+        if line.strip():
+            record = PaneRecord.parse(line)
+            if record is not None:
+                records.append(record)
+    return records
+
+
+def window_summaries(records: List[PaneRecord]) -> List[Dict[str, Any]]:
+    """One entry per window, in listing order"""
+    windows: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        if record.window_index not in windows:
+            windows[record.window_index] = record.window_dict()
+    return list(windows.values())
+
+
+def build_hierarchy(records: List[PaneRecord]) -> Dict[str, Any]:
+    """Nest records as sessions -> windows -> panes"""
+    hierarchy: Dict[str, Any] = {}
+    for record in records:
+        session = hierarchy.get(record.session_name)
+        if session is None:
+            session = hierarchy[record.session_name] = {'name': record.session_name, 'windows': {}}
+        window = session['windows'].get(record.window_index)
+        if window is None:
+            window = session['windows'][record.window_index] = {
+                **record.window_dict(),
+                'panes': {},
+            }
+        window['panes'][record.pane_index] = record.pane_dict()
+    return hierarchy
+
+
+class TopologySnapshot:
+    """Immutable view of one `list-panes -a` result; treat fields as read-only"""
+
+    __slots__ = ("records", "sessions", "hierarchy", "pane_ids", "layout")
+
+    def __init__(self, records: List[PaneRecord]):
+        self.records = records
+        self.sessions = list(dict.fromkeys(r.session_name for r in records))
+        self.hierarchy = build_hierarchy(records)
+        self.pane_ids = {r.pane_id for r in records}
+        # What targets resolve against: names, indexes and focus, not sizes
+        self.layout = [(r.session_name, r.window_index, r.window_name, r.window_active,
+                        r.pane_id, r.pane_index, r.pane_active) for r in records]
+
+    def resolve(self, target: str) -> Optional[str]:
+        """The pane id ("%3") a target names, or None when this snapshot
+        cannot tell for sure.
+
+        Only exact session names, window indexes or unique window names and
+        pane indexes are resolved here; tmux's own lookup also tries name
+        prefixes and patterns and the current session, so anything else is
+        left to it.
+        """
+        if target.startswith('%'):
+            return target if target in self.pane_ids else None
+        session, colon, rest = target.partition(':')
+        if not colon:
+            # A bare name is tried as a window of the current session first
+            if '.' in session or session.isdigit() or any(
+                    r.window_name.startswith(session) for r in self.records):
+                return None
+        window, dot, pane = rest.rpartition('.')
+        if not dot or not pane.isdigit():
+            window, pane = rest, ''
+        if '.' in window:
+            return None
+
+        records = [r for r in self.records if r.session_name == session]
+        if not window:
+            records = [r for r in records if r.window_active]
+        elif window.isdigit():
+            records = [r for r in records if r.window_index == window]
+        else:
+            records = [r for r in records if r.window_name == window]
+            if len({r.window_index for r in records}) > 1:
+                return None
+        if pane:
+            records = [r for r in records if r.pane_index == pane]
+        else:
+            records = [r for r in records if r.pane_active]
+        return records[0].pane_id if len(records) == 1 else None
+
+
+class TopologyCache:
+    """Shared topology snapshot with single-flight refresh.
+
+    A snapshot is reused until it is older than `ttl`, `invalidate()` is
+    called, or `version()` (e.g. a control client's topology notification
+    counter) changes. Concurrent callers share one in-flight refresh, and a
+    refresh started before an invalidation never satisfies later callers.
+    `on_change` is called when a reloaded snapshot's layout differs from
+    the previous one, which also catches changes nothing notified about.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Optional[List[PaneRecord]]]],
+                 ttl: float = TOPOLOGY_TTL, version: Optional[Callable[[], int]] = None,
+                 on_change: Optional[Callable[[], None]] = None):
+        self._loader = loader
+        self._ttl = ttl
+        self._version = version or (lambda: 0)
+        self._on_change = on_change
+        self._generation = 0
+        self._snapshot: Optional[TopologySnapshot] = None
+        self._snapshot_key = None
+        self._expires = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._inflight_key = None
+
+    def invalidate(self) -> None:
+        self._generation += 1
+
+    def _key(self):
+        return (self._generation, self._version())
+
+    async def get(self) -> TopologySnapshot:
+        key = self._key()
+        if self._snapshot is not None and self._snapshot_key == key and time.monotonic() < self._expires:
+            return self._snapshot
+
+        if (self._inflight is None or self._inflight_key != key
+                or self._inflight.get_loop() is not asyncio.get_running_loop()):
+            self._inflight_key = key
+            self._inflight = asyncio.ensure_future(self._refresh(key))
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh(self, key) -> TopologySnapshot:
+        try:
+            snapshot = TopologySnapshot(await self._loader() or [])
+            if self._key() == key:
+                previous, self._snapshot = self._snapshot, snapshot
+                self._snapshot_key = key
+                self._expires = time.monotonic() + self._ttl
+                if previous is not None and previous.layout != snapshot.layout and self._on_change:
+                    self._on_change()
+            return snapshot
+        finally:
+            if self._inflight_key == key:
+                self._inflight = None
+                self._inflight_key = None
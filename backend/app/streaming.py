@@ -0,0 +1,91 @@
+"""Constant-memory response bodies for full-history capture.
+
+TmuxService.stream_history yields raw capture-pane stdout chunks; these
+helpers turn them into NDJSON records or a gzip stream without ever
+holding more than one chunk (plus a partial line) in memory.
+
+NDJSON records, one per line:
+
+- ``{"type": "start", "target", "timestamp"}``
+- ``{"type": "lines", "lines": [...]}``, repeated, at most
+  NDJSON_BATCH_LINES lines each
+- ``{"type": "end", "line_count"}``, or ``{"type": "error", "message"}``
+  if the capture failed part-way
+
+Trailing blank lines are dropped, like get_output does.
+"""
+import codecs
+import logging
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+NDJSON_BATCH_LINES = 500
+GZIP_LEVEL = 6
+
+
+async def prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Put back a chunk read ahead of time (to surface errors before responding)"""
+    try:
+        yield first
+        async for chunk in rest:
+            yield chunk
+    finally:
+        await rest.aclose()
+
+
+def _record(obj) -> bytes:
+    return orjson.dumps(obj) + b"\n"
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes], target: str) -> AsyncIterator[bytes]:
+    """Split capture output into NDJSON line batches"""
+    yield _record({"type": "start", "target": target, "timestamp": datetime.now().isoformat()})
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    partial = ""
+    batch: List[str] = []
+    # Blank lines are held back as a count until a non-blank line follows
+    blank = 0
+    count = 0
+    try:
+        async for chunk in chunks:
+            lines = (partial + decoder.decode(chunk)).split("\n")
+            partial = lines.pop()
+            for line in lines:
+                if not line:
+                    blank += 1
+                    continue
+                batch.extend([""] * blank)
+                batch.append(line)
+                count += blank + 1
+                blank = 0
+                if len(batch) >= NDJSON_BATCH_LINES:
+                    yield _record({"type": "lines", "lines": batch})
+                    batch = []
+    except Exception as e:
+        logger.error(f"Error streaming history for {target}: {e}")
+        yield _record({"type": "error", "message": str(e)})
+        return
+
+    partial += decoder.decode(b"", final=True)
+    if partial:
+        batch.extend([""] * blank)
+        batch.append(partial)
+        count += blank + 1
+    if batch:
+        yield _record({"type": "lines", "lines": batch})
+    yield _record({"type": "end", "line_count": count})
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = GZIP_LEVEL) -> AsyncIterator[bytes]:
+    """gzip-compress a byte stream chunk by chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
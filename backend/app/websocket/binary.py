@@ -0,0 +1,193 @@
+"""Binary frame format for the tmux WebSocket, version 1.
+
+Clients opt in by offering the ``tmux-frames.v1`` WebSocket subprotocol;
+the server then sends every message as a binary frame::
+
+    offset  size  field
+    0       1     version     (1)
+    1       1     type        (see below)
+    2       2     flags       (bit 0: payload is a zstd frame,
+                                 bit 1: payload is JSON)
+    4       4     seq         frame seq for output, 0 otherwise
+    8       4     target id   announced by a "target" control message
+    12      4     base        seq a delta applies to, 0 otherwise
+    16      8     timestamp   milliseconds since the Unix epoch
+
+All integers are unsigned big-endian. The payload follows the header and
+runs to the end of the message:
+
+- OUTPUT (1): the pane content as raw UTF-8. Sent on subscribe, for
+  keyframes and, for clients without ``?delta=1``, for every change.
+- DELTA (2): u32 line_count, u32 change count, then per change u32 start,
+  u32 number of lines, u32 byte length and that many bytes of the lines
+  joined with ``\\n``. Applied like the JSON delta (see frames.py).
+- HEARTBEAT (3), PONG (4): empty.
+- CONTROL (5): any other message as the UTF-8 JSON of the text protocol.
+  The first one on a connection is ``{"type": "target", "id", "target"}``.
+- DICTIONARY (6): a zstd dictionary (``?compression=zstd``), sent before
+  the first frame that needs it; seq carries the dictionary id.
+
+With FLAG_ZSTD the payload is a zstd frame of the bytes described above;
+its header names the dictionary it needs (0 = none).
+
+Connections with ``?render=plain`` get the stripped text in OUTPUT and
+DELTA payloads. With ``?render=spans`` those payloads are UTF-8 JSON
+instead, marked by FLAG_JSON: ``{"styles", "lines"}`` for OUTPUT and
+``{"line_count", "styles", "changes"}`` for DELTA (see frames.py).
+
+Clients may keep sending JSON text, or send PING (7) with an empty
+payload and CONTROL frames; header fields other than type are ignored.
+A decoder must reject versions it does not know. decode() is the
+reference implementation.
+"""
+import json
+import struct
+import time
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional
+
+import zstandard
+
+SUBPROTOCOL = "tmux-frames.v1"
+VERSION = 1
+
+HEADER = struct.Struct("!BBHIIIQ")
+
+OUTPUT = 1
+DELTA = 2
+HEARTBEAT = 3
+PONG = 4
+CONTROL = 5
+DICTIONARY = 6
+PING = 7
+
+FLAG_ZSTD = 0x1
+FLAG_JSON = 0x2
+
+_U32 = struct.Struct("!I")
+_DELTA_HEAD = struct.Struct("!II")
+_CHANGE_HEAD = struct.Struct("!III")
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def encode(frame_type: int, payload: bytes = b"", seq: int = 0, target_id: int = 0,
+           base: int = 0, flags: int = 0, timestamp_ms: Optional[int] = None) -> bytes:
+    """Header followed by the payload"""
+    if timestamp_ms is None:
+        timestamp_ms = _now_ms()
+    return HEADER.pack(VERSION, frame_type, flags, seq, target_id, base, timestamp_ms) + payload
+
+
+def encode_delta_payload(line_count: int, changes: List[Dict[str, Any]]) -> bytes:
+    parts = [_DELTA_HEAD.pack(line_count, len(changes))]
+    for change in changes:
+        data = "\n".join(change["lines"]).encode()
+        parts.append(_CHANGE_HEAD.pack(change["start"], len(change["lines"]), len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_delta_payload(payload: bytes) -> Dict[str, Any]:
+    line_count, count = _DELTA_HEAD.unpack_from(payload)
+    offset = _DELTA_HEAD.size
+    changes = []
+    for _ in range(count):
+        start, lines, size = _CHANGE_HEAD.unpack_from(payload, offset)
+        offset += _CHANGE_HEAD.size
+        text = payload[offset:offset + size].decode()
+        offset += size
+        changes.append({"start": start, "lines": text.split("\n") if lines else []})
+    return {"line_count": line_count, "changes": changes}
+
+
+def heartbeat_frame(target_id: int) -> bytes:
+    return encode(HEARTBEAT, target_id=target_id)
+
+
+def pong_frame(target_id: int) -> bytes:
+    return encode(PONG, target_id=target_id)
+
+
+def control_frame(message: str, target_id: int = 0) -> bytes:
+    return encode(CONTROL, message.encode(), target_id=target_id)
+
+
+def target_announcement(target: str, target_id: int) -> bytes:
+    message = json.dumps({"type": "target", "id": target_id, "target": target})
+    return control_frame(message, target_id)
+
+
+def dictionary_frame(dict_id: int, data: bytes, target_id: int) -> bytes:
+    return encode(DICTIONARY, data, seq=dict_id, target_id=target_id)
+
+
+class BinaryFrame(NamedTuple):
+    """A decoded binary frame"""
+    type: int
+    flags: int
+    seq: int
+    target_id: int
+    base: int
+    timestamp_ms: int
+    payload: bytes
+
+    @property
+    def text(self) -> str:
+        """OUTPUT content or CONTROL JSON"""
+        return self.payload.decode()
+
+    def message(self) -> Any:
+        """CONTROL and FLAG_JSON payloads as JSON, DELTA payload as line_count and changes"""
+        if self.type == CONTROL or self.flags & FLAG_JSON:
+            return json.loads(self.payload)
+        if self.type == DELTA:
+            return decode_delta_payload(self.payload)
+        return None
+
+
+def decode(data: bytes, dictionaries: Optional[Mapping[int, bytes]] = None) -> BinaryFrame:
+    """Parse one binary frame, decompressing zstd payloads.
+
+    `dictionaries` maps dictionary id to the bytes of every DICTIONARY
+    frame received so far. Raises ValueError for malformed frames and
+    versions other than VERSION.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError(f"Frame shorter than the {HEADER.size}-byte header")
+    version, frame_type, flags, seq, target_id, base, timestamp_ms = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    payload = data[HEADER.size:]
+    if flags & FLAG_ZSTD:
+        dict_id = zstandard.get_frame_parameters(payload).dict_id
+        if dict_id:
+            if dictionaries is None or dict_id not in dictionaries:
+                raise ValueError(f"Missing zstd dictionary {dict_id}")
+            dictionary = zstandard.ZstdCompressionDict(dictionaries[dict_id])
+            payload = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload)
+        else:
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+    return BinaryFrame(frame_type, flags, seq, target_id, base, timestamp_ms, payload)
+
+
+def encode_client_message(message: Dict[str, Any]) -> bytes:
+    """Client-side helper: ping as PING, anything else as CONTROL"""
+    if message.get("type") == "ping":
+        return encode(PING)
+    return encode(CONTROL, json.dumps(message).encode())
+
+
+def parse_client_message(data: bytes) -> Optional[Dict[str, Any]]:
+    """Client frame as the equivalent JSON message, or None if not understood"""
+    try:
+        frame = decode(data)
+        if frame.type == PING:
+            return {"type": "ping"}
+        if frame.type == CONTROL:
+            message = frame.message()
+            return message if isinstance(message, dict) else None
+    except (ValueError, zstandard.ZstdError):
+        pass
+    return None
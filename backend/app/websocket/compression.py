@@ -0,0 +1,181 @@
+"""Negotiated compression for output frames.
+
+Clients can opt into either mechanism:
+
+- permessage-deflate (RFC 7692) is negotiated by the WebSocket server
+  during the handshake. ``python -m backend.app`` runs uvicorn with
+  DeflateWebSocketProtocol (see websocket/deflate.py), which uses the
+  settings from deflate_factory() and records per-target statistics
+  (multiplexed connections are counted together under
+  MULTIPLEXED_STATS_KEY, as one message can carry any target).
+- ``?compression=zstd`` sends output frames as binary messages, each a
+  single zstd frame holding the UTF-8 JSON of the text protocol's message.
+  Once a target has produced DICT_TRAIN_SAMPLES compressed frames, a
+  dictionary is trained on them and used from then on. The ratio of the
+  next DICT_TRAIN_SAMPLES frames is the bar: whenever a later window of
+  as many frames compresses below DICT_RETRAIN_RATIO of it (the screen
+  moved on to other content), a new dictionary is trained on that window.
+  Before the first frame that needs a dictionary, the client receives
+  ``{"type": "zstd_dictionary", "id": n, "data": "<base64>"}``. Every zstd
+  frame header carries its dictionary id (0 = no dictionary). Control
+  messages stay text. Binary-format clients (see binary.py) get the
+  dictionary as a DICTIONARY frame and compressed payloads flagged
+  FLAG_ZSTD instead.
+
+Each compressed encoding is computed once per frame and shared by every
+subscriber, like the text encodings.
+"""
+import base64
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import zstandard
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MODES = ("none", "zstd")
+
+# A full 32 KiB window lets each frame reference the previous one, which is
+# where most of the gain on terminal output comes from; clients only send
+# keystrokes, so their window is kept small to save server memory
+DEFLATE_SERVER_WINDOW_BITS = 15
+DEFLATE_CLIENT_WINDOW_BITS = 10
+DEFLATE_MEM_LEVEL = 8
+
+ZSTD_LEVEL = 3
+DICT_SIZE = 16 * 1024
+DICT_TRAIN_SAMPLES = 64
+# Retrain once a window's ratio falls below this fraction of the bar
+DICT_RETRAIN_RATIO = 0.7
+# Dictionaries kept for frames compressed before a retrain
+KEPT_DICTIONARIES = 2
+
+
+def deflate_factory() -> ServerPerMessageDeflateFactory:
+    """permessage-deflate settings tuned for terminal frames"""
+    return ServerPerMessageDeflateFactory(
+        server_max_window_bits=DEFLATE_SERVER_WINDOW_BITS,
+        client_max_window_bits=DEFLATE_CLIENT_WINDOW_BITS,
+        compress_settings={"memLevel": DEFLATE_MEM_LEVEL},
+    )
+
+
+class CompressionStats:
+    """Bytes in/out and CPU time spent compressing for one target"""
+
+    __slots__ = ("messages", "raw_bytes", "compressed_bytes", "cpu_seconds")
+
+    def __init__(self):
+        self.messages = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, raw_bytes: int, compressed_bytes: int, cpu_seconds: float) -> None:
+        self.messages += 1
+        self.raw_bytes += raw_bytes
+        self.compressed_bytes += compressed_bytes
+        self.cpu_seconds += cpu_seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+            "cpu_ms": round(self.cpu_seconds * 1000, 3),
+            "cpu_us_per_message": round(self.cpu_seconds * 1e6 / self.messages, 1) if self.messages else None,
+        }
+
+
+class ZstdFrameCodec:
+    """zstd compressor for one target, with a dictionary trained on its
+    frames and retrained when it stops fitting them"""
+
+    def __init__(self, level: int = ZSTD_LEVEL, dict_size: int = DICT_SIZE,
+                 train_samples: int = DICT_TRAIN_SAMPLES, retrain_ratio: float = DICT_RETRAIN_RATIO):
+        self.level = level
+        self.dict_size = dict_size
+        self.train_samples = train_samples
+        self.retrain_ratio = retrain_ratio
+        self.stats = CompressionStats()
+        self.dict_id = 0
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        # dict id -> (raw dictionary bytes, zstd_dictionary message), newest last
+        self._dictionaries: "OrderedDict[int, Tuple[bytes, str]]" = OrderedDict()
+        # Current window of frames and its sizes
+        self._samples: List[bytes] = []
+        self._window_bytes = [0, 0]
+        # Ratio of the first window after the last training attempt
+        self.baseline: Optional[float] = None
+        self.trainings = 0
+
+    @property
+    def dictionary(self) -> Optional[bytes]:
+        """Raw bytes of the current dictionary, once trained"""
+        return self.dictionary_for(self.dict_id)
+
+    def dictionary_for(self, dict_id: int) -> Optional[bytes]:
+        entry = self._dictionaries.get(dict_id)
+        return entry[0] if entry is not None else None
+
+    def knows(self, dict_id: int) -> bool:
+        """Whether frames compressed with dict_id can still be sent"""
+        return dict_id == 0 or dict_id in self._dictionaries
+
+    def compress(self, message: Union[str, bytes]) -> Tuple[int, bytes]:
+        """Compress one message; returns (dictionary id, zstd frame)"""
+        raw = message.encode() if isinstance(message, str) else message
+        start = time.process_time()
+        dict_id = self.dict_id
+        payload = self._compressor.compress(raw)
+        self._samples.append(raw)
+        self._window_bytes[0] += len(raw)
+        self._window_bytes[1] += len(payload)
+        if len(self._samples) >= self.train_samples:
+            self._end_window()
+        self.stats.record(len(raw), len(payload), time.process_time() - start)
+        return dict_id, payload
+
+    def dictionary_message(self, dict_id: Optional[int] = None) -> Optional[str]:
+        entry = self._dictionaries.get(self.dict_id if dict_id is None else dict_id)
+        return entry[1] if entry is not None else None
+
+    def _end_window(self) -> None:
+        samples, self._samples = self._samples, []
+        raw_bytes, compressed_bytes = self._window_bytes
+        self._window_bytes = [0, 0]
+        ratio = raw_bytes / compressed_bytes if compressed_bytes else 0.0
+        if self.trainings and self.baseline is None:
+            self.baseline = ratio
+        elif not self.trainings or ratio < self.baseline * self.retrain_ratio:
+            self._train(samples)
+
+    def _train(self, samples: List[bytes]) -> None:
+        self.trainings += 1
+        self.baseline = None
+        try:
+            dictionary = zstandard.train_dictionary(self.dict_size, samples, level=self.level)
+        except zstandard.ZstdError as e:
+            # Too little or too uniform data; keep the current compressor
+            logger.debug(f"zstd dictionary training failed: {e}")
+            return
+        dictionary.precompute_compress(level=self.level)
+        self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        self.dict_id = dictionary.dict_id()
+        data = dictionary.as_bytes()
+        self._dictionaries[self.dict_id] = (data, (
+            '{"type":"zstd_dictionary","id":%d,"data":"%s"}'
+            % (self.dict_id, base64.b64encode(data).decode())
+        ))
+        while len(self._dictionaries) > KEPT_DICTIONARIES:
+            self._dictionaries.popitem(last=False)
+
+
+# permessage-deflate statistics per target, filled by DeflateWebSocketProtocol
+deflate_stats: Dict[str, CompressionStats] = {}
+# deflate_stats key for all multiplexed (/api/tmux/ws) connections
+MULTIPLEXED_STATS_KEY = "(multiplexed)"
@@ -0,0 +1,66 @@
+"""uvicorn WebSocket protocol with tuned, measured permessage-deflate.
+
+Used by ``python -m backend.app``. Plain ``uvicorn backend.app.main:app``
+still negotiates permessage-deflate, with uvicorn's default settings and
+without statistics.
+"""
+import time
+from typing import Any, Optional
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from websockets.extensions.base import Extension
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import CTRL_OPCODES, Frame
+
+from .compression import MULTIPLEXED_STATS_KEY, CompressionStats, deflate_factory, deflate_stats
+
+WS_PATH = "/api/tmux/ws"
+
+
+def stats_key(path: str) -> Optional[str]:
+    """deflate_stats key for a WebSocket path, None if it is not measured"""
+    path = path.rstrip("/")
+    if path == WS_PATH:
+        return MULTIPLEXED_STATS_KEY
+    _, prefix, target = path.partition(WS_PATH + "/")
+    return target if prefix and target else None
+
+
+class MeasuredDeflate(Extension):
+    """Wraps a negotiated PerMessageDeflate to record bytes and CPU per target"""
+
+    def __init__(self, extension: PerMessageDeflate, target: str):
+        self.name = extension.name
+        self._extension = extension
+        self._target = target
+
+    def decode(self, frame: Frame, *, max_size: Any = None) -> Frame:
+        return self._extension.decode(frame, max_size=max_size)
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        start = time.process_time()
+        encoded = self._extension.encode(frame)
+        stats = deflate_stats.get(self._target)
+        if stats is None:
+            stats = deflate_stats[self._target] = CompressionStats()
+        stats.record(len(frame.data), len(encoded.data), time.process_time() - start)
+        return encoded
+
+
+class DeflateWebSocketProtocol(WebSocketProtocol):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        if self.config.ws_per_message_deflate:
+            self.available_extensions = [deflate_factory()]
+
+    async def handshake(self, *args: Any, **kwargs: Any) -> str:
+        path = await super().handshake(*args, **kwargs)
+        target = stats_key(self.scope["path"])
+        if target is not None:
+            self.extensions = [
+                MeasuredDeflate(extension, target) if isinstance(extension, PerMessageDeflate) else extension
+                for extension in self.extensions
+            ]
+        return path
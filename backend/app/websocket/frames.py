@@ -0,0 +1,387 @@
+"""Versioned output frames for the tmux WebSocket.
+
+Clients that connect with ``?delta=1`` receive:
+
+- ``{"type": "keyframe", "target", "seq", "timestamp", "content"}`` on
+  subscribe, periodically, and whenever a delta would not be smaller.
+- ``{"type": "delta", "target", "seq", "base", "timestamp", "line_count",
+  "changes": [{"start": i, "lines": [...]}, ...]}`` otherwise. To apply:
+  truncate/pad the previous lines to ``line_count`` and replace the lines
+  starting at each ``start``. ``base`` is the seq the delta applies to; a
+  client seeing a gap sends ``{"type": "resync"}`` to get a keyframe.
+
+Other clients keep receiving the full ``TmuxOutput`` JSON for every change.
+Any of these can be zstd-compressed, see compression.py, or sent in the
+binary format, see binary.py.
+
+``?render=`` picks what the content looks like (see ansi.py):
+
+- ``raw`` (default): lines as captured, with SGR escape sequences.
+- ``plain``: escape sequences stripped; messages keep the same shape.
+- ``spans``: ``content`` is replaced by ``"styles"`` (the style table)
+  and ``"lines"`` (runs of ``[text, style index]`` per line), and delta
+  changes carry run lines. A delta also re-sends unchanged lines whose
+  inherited style changed. Messages carry ``"profile": "spans"``.
+
+Every profile of a frame is rendered and encoded at most once, however
+many connections use it.
+
+On a multiplexed connection (the ``/ws`` endpoint, see routers/tmux.py)
+every message about a target starts with ``"id"``, the compact id the
+connection was given for the target when it subscribed.
+
+Frames are produced per pane (keyed by its ``%N`` id, see
+pane_aliases.py) and encoded per alias: every message can be rendered
+with the target name the client subscribed with.
+
+A frame that makes a Yes/No menu appear or disappear also carries a
+``choices`` event for every client (see choices.py).
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .. import ansi
+from ..choices import ChoiceTracker
+from ..serialization import dumps
+from . import binary
+from .compression import ZstdFrameCodec
+
+# Force a keyframe after this many frames or seconds so clients self-heal
+KEYFRAME_INTERVAL = 50
+KEYFRAME_MAX_AGE = 30.0
+# Send a keyframe instead when changed text exceeds this share of the pane
+DELTA_MAX_RATIO = 0.5
+
+# Envelopes for the per-connection control messages; only the timestamp
+# (isoformat, never needs escaping) is filled in per message
+_HEARTBEAT_PREFIX = '{"type":"heartbeat","timestamp":"'
+_PONG_PREFIX = '{"type":"pong","timestamp":"'
+
+
+def heartbeat_message() -> str:
+    return f'{_HEARTBEAT_PREFIX}{datetime.now().isoformat()}"}}'
+
+
+def pong_message() -> str:
+    return f'{_PONG_PREFIX}{datetime.now().isoformat()}"}}'
+
+
+def tag_message(message: str, target_id: int) -> str:
+    """JSON object message with a leading "id" (multiplexed connections)"""
+    return f'{{"id":{target_id},{message[1:]}'
+
+
+def diff_lines(old: List[str], new: List[str]) -> List[Dict[str, Any]]:
+    """Changed line ranges turning `old` into `new` (compared by position)"""
+    changes: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    for i, line in enumerate(new):
+        if i < len(old) and old[i] == line:
+            current = None
+            continue
+        if current is None:
+            current = {"start": i, "lines": []}
+            changes.append(current)
+        current["lines"].append(line)
+    return changes
+
+
+def apply_delta(lines: List[str], line_count: int, changes: List[Dict[str, Any]]) -> List[str]:
+    """Reference implementation of the client-side delta application"""
+    result = (lines + [""] * line_count)[:line_count]
+    for change in changes:
+        start = change["start"]
+        result[start:start + len(change["lines"])] = change["lines"]
+    return result
+
+
+def _group_changes(lines: Iterable[Tuple[int, Any]]) -> List[Dict[str, Any]]:
+    """Changed line ranges from (index, line) pairs in index order"""
+    changes: List[Dict[str, Any]] = []
+    for i, line in lines:
+        if changes and changes[-1]["start"] + len(changes[-1]["lines"]) == i:
+            changes[-1]["lines"].append(line)
+        else:
+            changes.append({"start": i, "lines": [line]})
+    return changes
+
+
+class OutputFrame:
+    """One captured state of a target, with lazily encoded messages"""
+
+    def __init__(self, target: str, seq: int, content: str, lines: List[str],
+                 base: Optional[int], changes: Optional[List[Dict[str, Any]]],
+                 stream: Optional["FrameStream"] = None,
+                 previous_lines: Optional[List[str]] = None):
+        self.target = target
+        self.seq = seq
+        self.content = content
+        self.lines = lines
+        # None when this frame must be delivered as a keyframe
+        self.base = base
+        self.changes = changes
+        self.stream = stream
+        # Lines of the base frame, for the spans delta
+        self.previous_lines = previous_lines
+        # New choices if this frame changed them (see choices.py), else None
+        self.choices: Optional[List[Dict[str, Any]]] = None
+        created = datetime.now()
+        self.timestamp = created.isoformat()
+        self.timestamp_ms = int(created.timestamp() * 1000)
+        self._encoded: Dict[Tuple[Any, ...], str] = {}
+        self._views: Dict[str, Dict[str, Any]] = {}
+        self._compressed: Dict[Tuple[Any, ...], Tuple[int, bytes]] = {}
+        self._binary: Dict[Tuple[str, int, bool, str], Tuple[int, bytes]] = {}
+
+    def view(self, profile: str) -> Dict[str, Any]:
+        """Content and delta changes rendered for a profile (computed once)"""
+        if profile not in self._views:
+            if profile == "plain":
+                plain = [ansi.strip_ansi(line) for line in self.lines]
+                changes = None
+                if self.changes is not None:
+                    changes = [{"start": change["start"],
+                                "lines": [ansi.strip_ansi(line) for line in change["lines"]]}
+                               for change in self.changes]
+                self._views[profile] = {"content": '\n'.join(plain), "changes": changes}
+            elif profile == "spans":
+                self._views[profile] = self._spans_view()
+            else:
+                self._views[profile] = {"content": self.content, "changes": self.changes}
+        return self._views[profile]
+
+    def _spans_view(self) -> Dict[str, Any]:
+        starts = ansi.line_start_styles(self.lines)
+        view: Dict[str, Any] = {"full": ansi.spans_view(self.lines, starts), "changes": None}
+        if self.changes is not None:
+            # Lines can change style without changing text when an earlier
+            # line leaves a different style open
+            previous = ansi.line_start_styles(self.previous_lines or [])
+            changed = {i for change in self.changes
+                       for i in range(change["start"], change["start"] + len(change["lines"]))}
+            changed.update(i for i in range(min(len(previous), len(starts)))
+                           if previous[i] != starts[i])
+            indices = sorted(changed)
+            encoded = ansi.spans_view(self.lines, starts, indices)
+            view["styles"] = encoded["styles"]
+            view["changes"] = _group_changes(zip(indices, encoded["lines"]))
+        return view
+
+    def _content_fields(self, profile: str) -> Dict[str, Any]:
+        if profile == "spans":
+            full = self.view(profile)["full"]
+            return {"profile": "spans", "styles": full["styles"], "lines": full["lines"]}
+        return {"content": self.view(profile)["content"]}
+
+    def full_message(self, profile: str = "raw", target: Optional[str] = None) -> str:
+        """Legacy full-content frame (the TmuxOutput model's fields)"""
+        target = target or self.target
+        key = ("full", profile, target)
+        if key not in self._encoded:
+            self._encoded[key] = dumps({
+                **self._content_fields(profile),
+                "timestamp": self.timestamp,
+                "target": target,
+            })
+        return self._encoded[key]
+
+    def keyframe_message(self, profile: str = "raw", target: Optional[str] = None) -> str:
+        target = target or self.target
+        key = ("keyframe", profile, target)
+        if key not in self._encoded:
+            self._encoded[key] = dumps({
+                "type": "keyframe",
+                "target": target,
+                "seq": self.seq,
+                "timestamp": self.timestamp,
+                **self._content_fields(profile),
+            })
+        return self._encoded[key]
+
+    def delta_message(self, profile: str = "raw", target: Optional[str] = None) -> Optional[str]:
+        if self.changes is None:
+            return None
+        target = target or self.target
+        key = ("delta", profile, target)
+        if key not in self._encoded:
+            message = {
+                "type": "delta",
+                "target": target,
+                "seq": self.seq,
+                "base": self.base,
+                "timestamp": self.timestamp,
+                "line_count": len(self.lines),
+            }
+            view = self.view(profile)
+            if profile == "spans":
+                message["profile"] = "spans"
+                message["styles"] = view["styles"]
+            message["changes"] = view["changes"]
+            self._encoded[key] = dumps(message)
+        return self._encoded[key]
+
+    def choices_message(self, target: Optional[str] = None) -> Optional[str]:
+        if self.choices is None:
+            return None
+        return choices_message(target or self.target, self.seq, self.timestamp, self.choices)
+
+    def kind_for(self, delta: bool, client_seq: Optional[int]) -> str:
+        """Pick "full", "keyframe" or "delta" given a client's mode and last seen seq"""
+        if not delta:
+            return "full"
+        if self.base is not None and client_seq == self.base:
+            return "delta"
+        return "keyframe"
+
+    def message(self, kind: str, profile: str = "raw", target_id: Optional[int] = None,
+                target: Optional[str] = None) -> str:
+        """Message of a kind; target_id tags it for multiplexed connections
+        and target names the alias the client subscribed with"""
+        if target_id is not None:
+            key = (kind, profile, target_id, target or self.target)
+            if key not in self._encoded:
+                self._encoded[key] = tag_message(self.message(kind, profile, target=target), target_id)
+            return self._encoded[key]
+        if kind == "delta":
+            return self.delta_message(profile, target)
+        if kind == "keyframe":
+            return self.keyframe_message(profile, target)
+        return self.full_message(profile, target)
+
+    def message_for(self, delta: bool, client_seq: Optional[int], profile: str = "raw",
+                    target: Optional[str] = None) -> str:
+        """Pick the message for a client given its mode and last seen seq"""
+        return self.message(self.kind_for(delta, client_seq), profile, target=target)
+
+    def compressed(self, kind: str, binary_payload: bool = False, profile: str = "raw",
+                   target_id: Optional[int] = None, target: Optional[str] = None) -> Tuple[int, bytes]:
+        """zstd-compressed message (or binary payload) as (dictionary id, zstd frame)"""
+        target = None if binary_payload else target or self.target
+        key = (kind, binary_payload, profile, target_id, target)
+        if key not in self._compressed or self._dictionary_dropped(self._compressed[key][0]):
+            if binary_payload:
+                data = self.binary_payload(kind, profile)
+            else:
+                data = self.message(kind, profile, target_id, target)
+            self._compressed[key] = self.stream.codec.compress(data)
+        return self._compressed[key]
+
+    def _dictionary_dropped(self, dict_id: int) -> bool:
+        """Whether a cached encoding used a dictionary the codec retrained away"""
+        return dict_id != 0 and not self.stream.codec.knows(dict_id)
+
+    def binary_payload(self, kind: str, profile: str = "raw") -> bytes:
+        view = self.view(profile)
+        if profile == "spans":
+            if kind == "delta":
+                return dumps({"line_count": len(self.lines), "styles": view["styles"],
+                              "changes": view["changes"]}).encode()
+            return dumps(view["full"]).encode()
+        if kind == "delta":
+            return binary.encode_delta_payload(len(self.lines), view["changes"])
+        return view["content"].encode()
+
+    def binary_message(self, kind: str, target_id: int, compressed: bool = False,
+                       profile: str = "raw") -> Tuple[int, bytes]:
+        """Binary-format frame as (zstd dictionary id or 0, message)"""
+        key = (kind, target_id, compressed, profile)
+        if key not in self._binary or self._dictionary_dropped(self._binary[key][0]):
+            dict_id = 0
+            flags = binary.FLAG_JSON if profile == "spans" else 0
+            if compressed:
+                dict_id, payload = self.compressed(kind, binary_payload=True, profile=profile)
+                flags |= binary.FLAG_ZSTD
+            else:
+                payload = self.binary_payload(kind, profile)
+            self._binary[key] = (dict_id, binary.encode(
+                binary.DELTA if kind == "delta" else binary.OUTPUT,
+                payload,
+                seq=self.seq,
+                target_id=target_id,
+                base=self.base if kind == "delta" else 0,
+                flags=flags,
+                timestamp_ms=self.timestamp_ms,
+            ))
+        return self._binary[key]
+
+
+def choices_message(target: str, seq: int, timestamp: str, choices: List[Dict[str, Any]]) -> str:
+    return dumps({
+        "type": "choices",
+        "target": target,
+        "seq": seq,
+        "timestamp": timestamp,
+        "choices": choices,
+    })
+
+
+class FrameStream:
+    """Sequence of frames for one monitored target"""
+
+    def __init__(self, target: str):
+        self.target = target
+        self.last: Optional[OutputFrame] = None
+        # Monotonic time of the last capture, whether or not it changed anything
+        self.captured_at = 0.0
+        self._keyframe_seq = 0
+        self._keyframe_at = 0.0
+        self._codec: Optional[ZstdFrameCodec] = None
+        self.choice_tracker = ChoiceTracker()
+
+    @property
+    def codec(self) -> ZstdFrameCodec:
+        """zstd codec, created when the first zstd client needs a frame"""
+        if self._codec is None:
+            self._codec = ZstdFrameCodec()
+        return self._codec
+
+    def compression_stats(self) -> Optional[Dict[str, Any]]:
+        return self._codec.stats.as_dict() if self._codec is not None else None
+
+    @property
+    def content(self) -> Optional[str]:
+        return self.last.content if self.last is not None else None
+
+    def touch(self) -> None:
+        """The capture scheduler confirmed the latest content is still current"""
+        self.captured_at = time.monotonic()
+
+    def fresh_content(self, max_age: float) -> Optional[str]:
+        """The latest content if it was captured at most `max_age` seconds ago"""
+        if self.last is None or time.monotonic() - self.captured_at > max_age:
+            return None
+        return self.last.content
+
+    def current_choices_message(self, target: Optional[str] = None) -> Optional[str]:
+        """The pending menu for a client that just subscribed, if any"""
+        if self.last is None or not self.choice_tracker.choices:
+            return None
+        return choices_message(target or self.target, self.last.seq, self.last.timestamp,
+                               self.choice_tracker.choices)
+
+    def update(self, content: str) -> Optional[OutputFrame]:
+        """Record new content; returns the new frame, or None if unchanged"""
+        now = self.captured_at = time.monotonic()
+        previous = self.last
+        if previous is not None and previous.content == content:
+            return None
+
+        seq = previous.seq + 1 if previous is not None else 1
+        lines = content.split('\n')
+        base = changes = None
+        if (previous is not None
+                and seq - self._keyframe_seq < KEYFRAME_INTERVAL
+                and now - self._keyframe_at < KEYFRAME_MAX_AGE):
+            diff = diff_lines(previous.lines, lines)
+            changed = sum(len(line) + 1 for change in diff for line in change["lines"])
+            if changed <= len(content) * DELTA_MAX_RATIO:
+                base, changes = previous.seq, diff
+
+        if changes is None:
+            self._keyframe_seq = seq
+            self._keyframe_at = now
+        self.last = OutputFrame(self.target, seq, content, lines, base, changes, stream=self,
+                                previous_lines=previous.lines if changes is not None else None)
+        self.last.choices = self.choice_tracker.update(lines, changes)
+        return self.last
@@ -0,0 +1,144 @@
+"""Keystroke input over the tmux WebSocket.
+
+Clients send::
+
+    {"type": "input", "seq": 12, "items": [{"text": "ls"}, {"key": "Enter"}]}
+
+or the shorthands ``{"type": "input", "seq": 13, "key": "C-c"}`` and
+``{"type": "input", "seq": 14, "text": "y"}``. ``seq`` must increase with
+every message of a connection; a message whose seq is not newer than the
+last one is a retransmit and is dropped.
+
+Messages are applied to the target strictly in seq order. While one
+send-keys call is in flight, later messages queue up and are merged into
+the next call (up to MAX_INPUT_ITEMS items and MAX_COMMAND_LENGTH
+characters), so fast typing costs one tmux call per round trip rather
+than one per key. Each call is acknowledged with::
+
+    {"type": "input_ack", "seq": 14, "count": 3, "ok": true, "timestamp"}
+
+which covers every message up to and including ``seq``; ``count`` is the
+number of messages merged into the call. Invalid messages get
+``"ok": false`` with an ``"error"`` in their place in the order.
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from ..serialization import dumps
+from ..services.tmux_service import MAX_COMMAND_LENGTH, MAX_INPUT_ITEMS, validate_input_items
+
+logger = logging.getLogger(__name__)
+
+InputItems = List[Tuple[str, str]]
+InputSender = Callable[[InputItems], Awaitable[bool]]
+AckSender = Callable[[str], Awaitable[None]]
+
+
+def input_ack_message(seq: Optional[int], ok: bool, count: int = 1, error: Optional[str] = None) -> str:
+    message: Dict[str, Any] = {
+        "type": "input_ack",
+        "seq": seq,
+        "count": count,
+        "ok": ok,
+        "timestamp": datetime.now().isoformat(),
+    }
+    if error is not None:
+        message["error"] = error
+    return dumps(message)
+
+
+def parse_input_message(message: Dict[str, Any]) -> Tuple[Optional[int], Optional[InputItems]]:
+    """(seq, items) of an input message; seq is None without a usable seq,
+    items is None if they are invalid"""
+    seq = message.get("seq")
+    if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+        return None, None
+
+    raw = message.get("items")
+    if raw is None:
+        raw = [{key: message[key] for key in ("text", "key") if key in message}]
+    if not isinstance(raw, list):
+        return seq, None
+    items: InputItems = []
+    for item in raw:
+        if not isinstance(item, dict) or len(item.keys() & {"text", "key"}) != 1:
+            return seq, None
+        kind = "key" if "key" in item else "text"
+        items.append((kind, item[kind]))
+    return seq, items if validate_input_items(items) else None
+
+
+class InputQueue:
+    """Ordered input of one connection, applied by a single worker"""
+
+    __slots__ = ("_send", "_ack", "_pending", "_wakeup", "_task", "last_seq", "calls", "messages")
+
+    def __init__(self, send: InputSender, ack: AckSender):
+        self._send = send
+        self._ack = ack
+        # (seq, items or None if invalid)
+        self._pending: Deque[Tuple[int, Optional[InputItems]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.last_seq: Optional[int] = None
+        # send-keys calls made and messages they carried
+        self.calls = 0
+        self.messages = 0
+
+    def submit(self, seq: int, items: Optional[InputItems]) -> bool:
+        """Queue a message; returns False for a retransmit (seq not newer)"""
+        if self.last_seq is not None and seq <= self.last_seq:
+            return False
+        self.last_seq = seq
+        self._pending.append((seq, items))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return True
+
+    def _take_batch(self) -> Tuple[int, int, InputItems]:
+        """Pop the next message plus the valid ones after it that still fit"""
+        seq, items = self._pending.popleft()
+        batch = list(items)
+        count = 1
+        length = sum(len(value) for _, value in batch)
+        while self._pending:
+            next_seq, next_items = self._pending[0]
+            if next_items is None:
+                break
+            next_length = sum(len(value) for _, value in next_items)
+            if len(batch) + len(next_items) > MAX_INPUT_ITEMS or length + next_length > MAX_COMMAND_LENGTH:
+                break
+            self._pending.popleft()
+            batch.extend(next_items)
+            length += next_length
+            seq = next_seq
+            count += 1
+        return seq, count, batch
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                if self._pending[0][1] is None:
+                    seq, _ = self._pending.popleft()
+                    await self._ack(input_ack_message(seq, False, error="invalid input"))
+                    continue
+                seq, count, batch = self._take_batch()
+                try:
+                    ok = await self._send(batch)
+                except Exception as e:
+                    logger.error(f"Error sending input: {e}")
+                    ok = False
+                self.calls += 1
+                self.messages += count
+                await self._ack(input_ack_message(seq, ok, count))
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,44 +1,408 @@
-from typing import Dict, List
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Union
 from fastapi import WebSocket
+import asyncio
 import logging
 
+from ..serialization import dumps
+from . import binary
+from .frames import OutputFrame, heartbeat_message, pong_message, tag_message
+
 logger = logging.getLogger(__name__)
 
+# Control messages (pong, heartbeat, ...) are never dropped; a client that
+# lets this many pile up is disconnected instead
+CONTROL_QUEUE_LIMIT = 256
+# Targets one multiplexed connection may subscribe to at once
+MAX_SUBSCRIPTIONS = 64
+
+
+def subscribed_message(target: str, target_id: int) -> str:
+    return dumps({"type": "subscribed", "target": target, "id": target_id})
+
+
+class Subscription:
+    """Frame delivery state of one target on one connection.
+
+    Output frames use a single slot: a new frame replaces one that has not
+    been sent yet, so a slow client only ever receives the newest output.
+    """
+
+    __slots__ = ("target", "target_id", "seq", "frame", "keyframe", "dict_id",
+                 "after_frame", "frames_sent", "frames_dropped")
+
+    def __init__(self, target: str, target_id: int):
+        self.target = target
+        self.target_id = target_id
+        # Last frame seq delivered (delta mode)
+        self.seq: Optional[int] = None
+        self.frame: Optional[OutputFrame] = None
+        # Send the pending frame as a keyframe (resync)
+        self.keyframe = False
+        # zstd dictionary the client has been sent for this target
+        self.dict_id = 0
+        # Event that refers to the pending frame, sent right after it
+        self.after_frame: Optional[str] = None
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+
+class ConnectionState:
+    """Per-connection protocol options, send queue and subscriptions.
+
+    Control messages queue in order and go first. Subscriptions with a
+    pending frame wait in `ready` and are served in turn, so one busy
+    target cannot starve the others on a multiplexed connection.
+    """
+
+    __slots__ = ("delta", "compression", "binary", "profile", "target_id", "multiplexed",
+                 "events", "subscriptions", "ready", "control", "wakeup", "writer")
+
+    def __init__(self, delta: bool = False, compression: str = "none", binary: bool = False,
+                 target_id: int = 0, profile: str = "raw", multiplexed: bool = False,
+                 events: bool = False):
+        self.delta = delta
+        # "zstd" sends frames as binary zstd messages (see compression.py)
+        self.compression = compression
+        # Binary frame format negotiated via subprotocol (see binary.py)
+        self.binary = binary
+        # Render profile: "raw", "plain" or "spans" (see frames.py)
+        self.profile = profile
+        # Id of the target of a single-target connection (0 if multiplexed)
+        self.target_id = target_id
+        # Frames of multiplexed connections are tagged with the target id
+        self.multiplexed = multiplexed
+        # Events such as `choices` go only to clients that opted into them
+        # (?events=1) or into any newer protocol; the legacy stream of
+        # {content, timestamp, target} messages stays as it was
+        self.events = events or delta or binary or multiplexed
+        self.subscriptions: Dict[str, Subscription] = {}
+        self.ready: Deque[Subscription] = deque()
+        self.control: Deque[Union[str, bytes]] = deque()
+        self.wakeup = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.control) + len(self.ready)
+
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.connection_states: Dict[WebSocket, ConnectionState] = {}
+        # Compact ids for targets with connections, used by the binary
+        # format and by multiplexed connections
+        self.target_ids: Dict[str, int] = {}
+        self._next_target_id = 1
     
-    async def connect(self, websocket: WebSocket, session_name: str):
-        await websocket.accept()
-        if session_name not in self.active_connections:
-            self.active_connections[session_name] = []
-        self.active_connections[session_name].append(websocket)
-    
-    def disconnect(self, websocket: WebSocket, session_name: str):
-        if session_name in self.active_connections:
-            if websocket in self.active_connections[session_name]:
-                self.active_connections[session_name].remove(websocket)
+    async def connect(self, websocket: WebSocket, session_name: str, delta: bool = False,
+                      compression: str = "none", binary_frames: bool = False, profile: str = "raw",
+                      events: bool = False):
+        """Accept a connection bound to a single target"""
+        state = await self.accept(websocket, delta=delta, compression=compression,
+                                  binary_frames=binary_frames, profile=profile, multiplexed=False,
+                                  events=events)
+        state.target_id = self._add_subscription(websocket, state, session_name).target_id
+
+    async def accept(self, websocket: WebSocket, delta: bool = False, compression: str = "none",
+                     binary_frames: bool = False, profile: str = "raw",
+                     multiplexed: bool = True, events: bool = False) -> ConnectionState:
+        """Accept a connection that subscribes to targets later"""
+        if binary_frames:
+            await websocket.accept(subprotocol=binary.SUBPROTOCOL)
+        else:
+            await websocket.accept()
+        state = ConnectionState(delta=delta, compression=compression, binary=binary_frames,
+                                profile=profile, multiplexed=multiplexed, events=events)
+        state.writer = asyncio.create_task(self._write_loop(websocket, state))
+        self.connection_states[websocket] = state
+        return state
+
+    def subscribe(self, websocket: WebSocket, target: str) -> Optional[int]:
+        """Add a target to a connection and return its id (None if the
+        connection is gone or already has MAX_SUBSCRIPTIONS targets)"""
+        state = self.connection_states.get(websocket)
+        if state is None:
+            return None
+        subscription = state.subscriptions.get(target)
+        if subscription is None:
+            if len(state.subscriptions) >= MAX_SUBSCRIPTIONS:
+                return None
+            subscription = self._add_subscription(websocket, state, target)
+        return subscription.target_id
+
+    def _add_subscription(self, websocket: WebSocket, state: ConnectionState, target: str) -> Subscription:
+        if target not in self.active_connections:
+            self.active_connections[target] = []
+            self.target_ids[target] = self._next_target_id
+            self._next_target_id += 1
+        self.active_connections[target].append(websocket)
+        subscription = state.subscriptions[target] = Subscription(target, self.target_ids[target])
+        if state.binary:
+            state.control.append(binary.target_announcement(target, subscription.target_id))
+            state.wakeup.set()
+        elif state.multiplexed:
+            state.control.append(subscribed_message(target, subscription.target_id))
+            state.wakeup.set()
+        return subscription
+
+    def unsubscribe(self, websocket: WebSocket, target: str) -> bool:
+        """Remove a target from a connection; False if it was not subscribed"""
+        state = self.connection_states.get(websocket)
+        if state is None or state.subscriptions.pop(target, None) is None:
+            return False
+        self._remove_connection(target, websocket)
+        return True
+
+    def _remove_connection(self, target: str, websocket: WebSocket) -> None:
+        if target in self.active_connections:
+            if websocket in self.active_connections[target]:
+                self.active_connections[target].remove(websocket)
             # Clean up empty session lists
-            if not self.active_connections[session_name]:
-                del self.active_connections[session_name]
+            if not self.active_connections[target]:
+                del self.active_connections[target]
+                self.target_ids.pop(target, None)
+
+    def subscriptions(self, websocket: WebSocket) -> List[str]:
+        """Targets a connection is subscribed to"""
+        state = self.connection_states.get(websocket)
+        return list(state.subscriptions) if state is not None else []
+
+    def target_for_id(self, websocket: WebSocket, target_id: int) -> Optional[str]:
+        """Target a connection subscribed to under `target_id`"""
+        state = self.connection_states.get(websocket)
+        if state is None:
+            return None
+        for target, subscription in state.subscriptions.items():
+            if subscription.target_id == target_id:
+                return target
+        return None
+
+    def resync(self, session_name: str) -> None:
+        """Drop a target's pending frames and make the next one a keyframe
+        on every connection, e.g. once the target names another pane"""
+        for connection in self.active_connections.get(session_name, ()):
+            state = self.connection_states.get(connection)
+            subscription = state.subscriptions.get(session_name) if state is not None else None
+            if subscription is not None:
+                subscription.frame = None
+                subscription.seq = None
+
+    def disconnect(self, websocket: WebSocket, session_name: Optional[str] = None) -> List[str]:
+        """Drop a connection with all its subscriptions; returns their targets"""
+        state = self.connection_states.pop(websocket, None)
+        targets = list(state.subscriptions) if state is not None else []
+        if session_name is not None and session_name not in targets:
+            targets.append(session_name)
+        for target in targets:
+            self._remove_connection(target, websocket)
+        if state is not None and state.writer is not None and state.writer is not asyncio.current_task():
+            state.writer.cancel()
+        return targets
     
     def has_connections_for_session(self, session_name: str) -> bool:
         return session_name in self.active_connections and len(self.active_connections[session_name]) > 0
+
+    def _target_id(self, state: ConnectionState, session_name: Optional[str]) -> int:
+        subscription = state.subscriptions.get(session_name) if session_name is not None else None
+        return subscription.target_id if subscription is not None else state.target_id
+
+    def _control_message(self, state: ConnectionState, session_name: Optional[str],
+                         message: str) -> Union[str, bytes]:
+        """A message about a target as this connection expects it: a binary
+        control frame, or JSON tagged with the target id when multiplexed"""
+        if state.binary:
+            return binary.control_frame(message, self._target_id(state, session_name))
+        if state.multiplexed and session_name in state.subscriptions:
+            return tag_message(message, state.subscriptions[session_name].target_id)
+        return message
     
-    async def send_personal_message(self, message: str, websocket: WebSocket, session_name: str):
+    async def send_personal_message(self, message: str, websocket: WebSocket, session_name: Optional[str]):
+        state = self.connection_states.get(websocket)
+        if state is not None:
+            self._enqueue_control(websocket, session_name, state,
+                                  self._control_message(state, session_name, message))
+            return
         try:
             await websocket.send_text(message)
         except Exception as e:
             logger.debug(f"Error sending message: {e}")
             self.disconnect(websocket, session_name)
-    
+
+    def wants_events(self, websocket: WebSocket) -> bool:
+        state = self.connection_states.get(websocket)
+        return state is not None and state.events
+
+    def send_after_frame(self, websocket: WebSocket, session_name: str, message: str) -> None:
+        """Send an event about a target right after the frame queued for it
+        (or right away if none is), e.g. a menu a late joiner must see after
+        the screen it belongs to"""
+        state = self.connection_states.get(websocket)
+        subscription = state.subscriptions.get(session_name) if state is not None else None
+        if subscription is None:
+            return
+        if subscription.frame is None:
+            self._enqueue_control(websocket, session_name, state,
+                                  self._control_message(state, session_name, message))
+        else:
+            subscription.after_frame = message
+
+    async def send_heartbeat(self, websocket: WebSocket, session_name: Optional[str]):
+        state = self.connection_states.get(websocket)
+        if state is not None and state.binary:
+            self._enqueue_control(websocket, session_name, state, binary.heartbeat_frame(state.target_id))
+            return
+        await self.send_personal_message(heartbeat_message(), websocket, session_name)
+
+    async def send_pong(self, websocket: WebSocket, session_name: Optional[str]):
+        state = self.connection_states.get(websocket)
+        if state is not None and state.binary:
+            self._enqueue_control(websocket, session_name, state, binary.pong_frame(state.target_id))
+            return
+        await self.send_personal_message(pong_message(), websocket, session_name)
+
+    def _enqueue_control(self, websocket: WebSocket, session_name: Optional[str], state: ConnectionState,
+                         message: Union[str, bytes]) -> None:
+        if len(state.control) >= CONTROL_QUEUE_LIMIT:
+            logger.warning(f"Send queue overflow for a connection in session {session_name}, disconnecting")
+            self.disconnect(websocket, session_name)
+            asyncio.ensure_future(self._close_quietly(websocket))
+            return
+        state.control.append(message)
+        state.wakeup.set()
+
+    @staticmethod
+    def _enqueue_frame(state: ConnectionState, session_name: str, frame: OutputFrame,
+                       keyframe: bool = False) -> None:
+        subscription = state.subscriptions.get(session_name)
+        if subscription is None:
+            return
+        if subscription.frame is not None:
+            subscription.frames_dropped += 1
+        else:
+            state.ready.append(subscription)
+        subscription.frame = frame
+        subscription.keyframe = subscription.keyframe or keyframe
+        state.wakeup.set()
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def _write_loop(self, websocket: WebSocket, state: ConnectionState):
+        """Drain one connection's queue so a slow socket never blocks others"""
+        try:
+            while True:
+                await state.wakeup.wait()
+                state.wakeup.clear()
+                while state.control or state.ready:
+                    if state.control:
+                        message = state.control.popleft()
+                        if isinstance(message, bytes):
+                            await websocket.send_bytes(message)
+                        else:
+                            await websocket.send_text(message)
+                        continue
+                    subscription = state.ready.popleft()
+                    frame, subscription.frame = subscription.frame, None
+                    if frame is None or state.subscriptions.get(subscription.target) is not subscription:
+                        continue  # Unsubscribed while queued
+                    if subscription.keyframe:
+                        subscription.keyframe = False
+                        subscription.seq = None
+                    await self._send_frame_now(websocket, state, subscription, frame)
+                    subscription.frames_sent += 1
+                    event, subscription.after_frame = subscription.after_frame, None
+                    if event is not None:
+                        message = self._control_message(state, subscription.target, event)
+                        if isinstance(message, bytes):
+                            await websocket.send_bytes(message)
+                        else:
+                            await websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Error sending to connection for {', '.join(state.subscriptions) or 'no target'}: {e}")
+            self.disconnect(websocket)
+
+    async def _send_frame_now(self, websocket: WebSocket, state: ConnectionState,
+                              subscription: Subscription, frame: OutputFrame):
+        # Encoded at send time: if frames were dropped, the client's seq no
+        # longer matches and it gets a keyframe
+        kind = frame.kind_for(state.delta, subscription.seq)
+        subscription.seq = frame.seq
+        if state.binary:
+            compressed = state.compression == "zstd"
+            dict_id, message = frame.binary_message(kind, subscription.target_id, compressed=compressed,
+                                                    profile=state.profile)
+            if dict_id and dict_id != subscription.dict_id:
+                await websocket.send_bytes(binary.dictionary_frame(
+                    dict_id, frame.stream.codec.dictionary_for(dict_id), subscription.target_id))
+                subscription.dict_id = dict_id
+            await websocket.send_bytes(message)
+            return
+        target_id = subscription.target_id if state.multiplexed else None
+        if state.compression != "zstd":
+            await websocket.send_text(frame.message(kind, state.profile, target_id, subscription.target))
+            return
+        dict_id, payload = frame.compressed(kind, profile=state.profile, target_id=target_id,
+                                            target=subscription.target)
+        if dict_id and dict_id != subscription.dict_id:
+            await websocket.send_text(frame.stream.codec.dictionary_message(dict_id))
+            subscription.dict_id = dict_id
+        await websocket.send_bytes(payload)
+
+    async def send_frame(self, websocket: WebSocket, session_name: str, frame: OutputFrame,
+                         keyframe: bool = False):
+        """Send a frame to one connection (keyframe=True forces a resync)"""
+        state = self.connection_states.get(websocket)
+        if state is not None:
+            self._enqueue_frame(state, session_name, frame, keyframe=keyframe)
+            return
+        await self.send_personal_message(frame.full_message(target=session_name), websocket, session_name)
+
+    async def broadcast_frame(self, session_name: str, frame: OutputFrame):
+        """Queue a frame for every connection to a target; never waits on a
+        slow socket. The frame may come from another spelling of the target
+        (see services/pane_aliases.py) and is sent under session_name."""
+        if session_name not in self.active_connections:
+            return
+
+        disconnected = []
+        for connection in list(self.active_connections[session_name]):
+            state = self.connection_states.get(connection)
+            if state is not None:
+                self._enqueue_frame(state, session_name, frame)
+                continue
+            try:
+                await connection.send_text(frame.full_message(target=session_name))
+            except Exception as e:
+                logger.debug(f"Error broadcasting to connection in session {session_name}: {e}")
+                disconnected.append(connection)
+
+        for connection in disconnected:
+            self.disconnect(connection, session_name)
+
     async def broadcast_to_session(self, session_name: str, message: str):
         if session_name not in self.active_connections:
             return
             
         disconnected = []
-        for connection in self.active_connections[session_name]:
+        # Every connection gets the same id for a target, so each variant
+        # is encoded once
+        variants: Dict[Any, Union[str, bytes]] = {}
+        for connection in list(self.active_connections[session_name]):
+            state = self.connection_states.get(connection)
+            if state is not None:
+                variant = (state.binary, state.multiplexed)
+                if variant not in variants:
+                    variants[variant] = self._control_message(state, session_name, message)
+                self._enqueue_control(connection, session_name, state, variants[variant])
+                continue
             try:
                 await connection.send_text(message)
             except Exception as e:
@@ -49,10 +413,40 @@ class ConnectionManager:
         for connection in disconnected:
             self.disconnect(connection, session_name)
     
+    async def broadcast_event(self, session_name: str, message: str):
+        """Send an event to the connections of a target that opted into events"""
+        for connection in list(self.active_connections.get(session_name, ())):
+            state = self.connection_states.get(connection)
+            if state is not None and state.events:
+                self._enqueue_control(connection, session_name, state,
+                                      self._control_message(state, session_name, message))
+
     async def broadcast(self, message: str):
         """Broadcast to all sessions"""
         for session_name in list(self.active_connections.keys()):
             await self.broadcast_to_session(session_name, message)
     
+    def get_connection_stats(self) -> List[Dict[str, Any]]:
+        """Send queue depth and drop counters for every subscription"""
+        stats = []
+        for session_name, connections in self.active_connections.items():
+            for connection in connections:
+                state = self.connection_states.get(connection)
+                subscription = state.subscriptions.get(session_name) if state is not None else None
+                if subscription is None:
+                    continue
+                stats.append({
+                    "target": session_name,
+                    "delta": state.delta,
+                    "compression": state.compression,
+                    "binary": state.binary,
+                    "profile": state.profile,
+                    "multiplexed": state.multiplexed,
+                    "queue_depth": state.queue_depth,
+                    "frames_sent": subscription.frames_sent,
+                    "frames_dropped": subscription.frames_dropped,
+                })
+        return stats
+
     def get_total_connections(self) -> int:
-        return sum(len(connections) for connections in self.active_connections.values())
\ No newline at end of file
+        return sum(len(connections) for connections in self.active_connections.values())
@@ -0,0 +1,105 @@
+"""Benchmark: compression ratio and CPU cost of output frames per mode.
+
+Runs a colourful scrolling workload (ls --color output) in a throwaway tmux
+server, captures FRAMES snapshots with capture-pane -e, turns them into
+WebSocket messages with FrameStream, and compresses that message stream
+as permessage-deflate (one context per connection, per window size) and
+as zstd with and without a trained dictionary.
+
+Usage (from backend/):
+    python -m benchmarks.bench_compression [--frames 200] [--delta]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import zlib
+
+import zstandard
+
+from app.websocket.compression import DEFLATE_MEM_LEVEL, ZstdFrameCodec
+from app.websocket.frames import FrameStream
+
+WORKLOAD = "while true; do ls --color=always -la /usr/bin /usr/lib | head -400 | while read l; do echo \"$l\"; sleep 0.002; done; done"
+
+
+def capture_frames(count: int) -> list:
+    tmpdir = tempfile.mkdtemp()
+    tmux = ["tmux", "-S", os.path.join(tmpdir, "bench.sock")]
+    # The server forked by new-session must not hold our stdout
+    quiet = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    try:
+        subprocess.run([*tmux, "new-session", "-d", "-s", "bench", "-x", "160", "-y", "48"], check=True, **quiet)
+        subprocess.run([*tmux, "send-keys", "-t", "bench", WORKLOAD, "Enter"], check=True, **quiet)
+        time.sleep(0.5)
+        frames = []
+        while len(frames) < count:
+            out = subprocess.run([*tmux, "capture-pane", "-e", "-p", "-t", "bench"],
+                                 capture_output=True, text=True, check=True).stdout
+            if not frames or out != frames[-1]:
+                frames.append(out)
+            time.sleep(0.05)
+        return frames
+    finally:
+        subprocess.run([*tmux, "kill-server"], **quiet)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def messages_for(screens: list, delta: bool) -> list:
+    stream = FrameStream("bench")
+    messages, seq = [], None
+    for screen in screens:
+        frame = stream.update(screen)
+        if frame is not None:
+            messages.append(frame.message_for(delta, seq).encode())
+            seq = frame.seq
+    return messages
+
+
+def report(label: str, raw: int, compressed: int, cpu: float, count: int) -> None:
+    print(f"{label:<24} ratio {raw / compressed:6.2f}  {compressed / count:8.0f} B/frame  "
+          f"{cpu * 1e6 / count:7.1f} us/frame")
+
+
+def bench_deflate(messages: list, wbits: int) -> None:
+    encoder = zlib.compressobj(wbits=-wbits, memLevel=DEFLATE_MEM_LEVEL)
+    raw = compressed = 0
+    start = time.process_time()
+    for message in messages:
+        raw += len(message)
+        compressed += len(encoder.compress(message) + encoder.flush(zlib.Z_SYNC_FLUSH)) - 4
+    report(f"deflate wbits={wbits}", raw, compressed, time.process_time() - start, len(messages))
+
+
+def bench_zstd(messages: list, use_dictionary: bool) -> None:
+    codec = ZstdFrameCodec(train_samples=64 if use_dictionary else len(messages) + 1)
+    for message in messages:
+        codec.compress(message.decode())
+    stats = codec.stats
+    label = "zstd + dictionary" if use_dictionary else "zstd (no dictionary)"
+    report(label, stats.raw_bytes, stats.compressed_bytes, stats.cpu_seconds, stats.messages)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--delta", action="store_true", help="use keyframe/delta messages")
+    args = parser.parse_args()
+
+    if shutil.which("tmux") is None:
+        raise SystemExit("tmux is not installed")
+
+    messages = messages_for(capture_frames(args.frames), args.delta)
+    raw = sum(len(m) for m in messages)
+    print(f"{len(messages)} {'delta' if args.delta else 'full'} messages, {raw / len(messages):.0f} B/frame raw "
+          f"(zstandard {zstandard.__version__})")
+    for wbits in (9, 11, 13, 15):
+        bench_deflate(messages, wbits)
+    bench_zstd(messages, use_dictionary=False)
+    bench_zstd(messages, use_dictionary=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark: WebSocket frame serialization throughput on one core.
+
+Compares the previous per-connection path (pydantic TmuxOutput, .dict(),
+json.dumps and a fresh timestamp for every subscriber) with FrameStream,
+which encodes each changed frame once and hands the same string to every
+subscriber. Frames are a typical 200x50 pane with a few changed lines.
+
+Usage (from backend/):
+    python -m benchmarks.bench_frames [--subscribers 10] [--frames 2000]
+"""
+import argparse
+import json
+import random
+import string
+import time
+import warnings
+from datetime import datetime
+
+from app.models import TmuxOutput
+from app.websocket.frames import FrameStream
+
+
+def make_screens(count: int, rows: int = 50, cols: int = 200) -> list:
+    rng = random.Random(0)
+    lines = ["".join(rng.choices(string.printable[:94], k=cols)) for _ in range(rows)]
+    screens = []
+    for i in range(count):
+        for _ in range(3):
+            lines[rng.randrange(rows)] = f"\x1b[32m{i}\x1b[0m " + "".join(rng.choices(string.ascii_letters, k=cols - 12))
+        screens.append("\n".join(lines))
+    return screens
+
+
+def legacy(screens: list, subscribers: int) -> None:
+    # Reproduces the old code exactly, including the deprecated .dict()
+    warnings.simplefilter("ignore", DeprecationWarning)
+    for content in screens:
+        for _ in range(subscribers):
+            json.dumps(TmuxOutput(
+                content=content,
+                timestamp=datetime.now().isoformat(),
+                target="bench",
+            ).dict())
+
+
+def encode_once(screens: list, subscribers: int, delta: bool) -> None:
+    stream = FrameStream("bench")
+    client_seq = None
+    for content in screens:
+        frame = stream.update(content)
+        for _ in range(subscribers):
+            frame.message_for(delta, client_seq)
+        client_seq = frame.seq
+
+
+def measure(label: str, fn, screens: list, *args) -> None:
+    start = time.perf_counter()
+    fn(screens, *args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(screens) / elapsed:10.0f} frames/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--subscribers", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    screens = make_screens(args.frames)
+    print(f"{args.frames} frames, {args.subscribers} subscribers per target")
+    measure("legacy per-connection", legacy, screens, args.subscribers)
+    measure("encode-once full", encode_once, screens, args.subscribers, False)
+    measure("encode-once delta", encode_once, screens, args.subscribers, True)
+
+
+if __name__ == "__main__":
+    main()
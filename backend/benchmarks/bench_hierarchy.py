@@ -0,0 +1,100 @@
+"""Benchmark: tmux hierarchy via per-session/per-window calls vs one list-panes -a.
+
+Starts a throwaway tmux server on a private socket, creates SESSIONS x WINDOWS
+windows, and compares the number of tmux invocations and latency of the old
+sequential walk against TmuxService.get_hierarchy. "before" and "after" drop
+the topology snapshot before every round so both pay for a real walk;
+"warm" shows get_hierarchy answered from the snapshot.
+
+Usage (from backend/):
+    python -m benchmarks.bench_hierarchy [--sessions 20] [--windows 5] [--rounds 5]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from app.services.tmux_service import TmuxService
+
+
+async def legacy_hierarchy(service: TmuxService) -> dict:
+    """The previous algorithm: list-sessions, then list-windows/list-panes per item"""
+    hierarchy = {}
+    stdout, _, _ = await service._execute_tmux_command(["tmux", "list-sessions", "-F", "#{session_name}"])
+    for session in stdout.split():
+        windows = {}
+        for window in await service.get_windows(session):
+            panes = await service.get_panes(session, window['index'])
+            windows[window['index']] = {**window, 'panes': {p['index']: p for p in panes}}
+        hierarchy[session] = {'name': session, 'windows': windows}
+    return hierarchy
+
+
+async def measure(label: str, service: TmuxService, fn, rounds: int, cold: bool = True) -> None:
+    calls = 0
+    execute = service._execute_tmux_command
+
+    async def counting(cmd):
+        nonlocal calls
+        calls += 1
+        return await execute(cmd)
+
+    service._execute_tmux_command = counting
+    timings = []
+    try:
+        for _ in range(rounds):
+            if cold:
+                service.invalidate_topology()
+            start = time.perf_counter()
+            result = await fn(service)
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        service._execute_tmux_command = execute
+
+    panes = sum(len(w['panes']) for s in result.values() for w in s['windows'].values())
+    print(f"{label:<10} {calls // rounds:>5} tmux calls  "
+          f"median {statistics.median(timings):8.1f} ms  "
+          f"({len(result)} sessions, {panes} panes)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--windows", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if shutil.which("tmux") is None:
+        raise SystemExit("tmux is not installed")
+
+    tmpdir = tempfile.mkdtemp()
+    socket_path = os.path.join(tmpdir, "bench.sock")
+    tmux = ["tmux", "-S", socket_path]
+    # The server forked by the first new-session must not hold our stdout
+    quiet = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    try:
+        for s in range(args.sessions):
+            subprocess.run([*tmux, "new-session", "-d", "-s", f"bench{s}"], check=True, **quiet)
+            for _ in range(args.windows - 1):
+                subprocess.run([*tmux, "new-window", "-d", "-t", f"bench{s}:"], check=True, **quiet)
+
+        os.environ["TMUX_SOCKET_PATH"] = socket_path
+        service = TmuxService()
+
+        async def run():
+            await measure("before", service, legacy_hierarchy, args.rounds)
+            await measure("after", service, TmuxService.get_hierarchy, args.rounds)
+            await measure("warm", service, TmuxService.get_hierarchy, args.rounds, cold=False)
+
+        asyncio.run(run())
+    finally:
+        subprocess.run([*tmux, "kill-server"], **quiet)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -42,7 +42,22 @@ def mock_tmux_service():
     with patch('app.routers.tmux.tmux_service') as mock_service:
         mock_service.send_command = AsyncMock(return_value=True)
         mock_service.send_enter = AsyncMock(return_value=True)
+        mock_service.send_input = AsyncMock(return_value=True)
+        mock_service.resize_pane = AsyncMock(return_value=True)
+        mock_service.get_window_size = AsyncMock(return_value=("@1", 80, 24))
         mock_service.get_output = AsyncMock(return_value="terminal output")
+        mock_service.capture_targets = AsyncMock(
+            side_effect=lambda targets: {target: "terminal output" for target in targets}
+        )
+        mock_service.probe_targets = AsyncMock(return_value={})
+        mock_service.subscribe_output = AsyncMock(return_value=None)
+        mock_service.resolve_pane_ids = AsyncMock(
+            side_effect=lambda targets: {target: None for target in targets}
+        )
+        mock_service.seed_scrollback = AsyncMock(return_value=None)
+        mock_service.history_sizes = AsyncMock(return_value={})
+        mock_service.capture_history_tails = AsyncMock(return_value={})
+        mock_service.capture_pane_tails = AsyncMock(return_value={"default:0.0": ["$ ls"]})
         mock_service.get_sessions = AsyncMock(return_value=["default", "test-session"])
         mock_service.create_session = AsyncMock(return_value=True)
         mock_service.session_exists = AsyncMock(return_value=True)
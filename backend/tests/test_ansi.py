@@ -0,0 +1,105 @@
+"""Tests for server-side SGR parsing"""
+import pytest
+
+from app import ansi
+from app.ansi import (
+    ATTR_BOLD, ATTR_DIM, ATTR_REVERSE, ATTR_UNDERLINE, DEFAULT_STYLE, apply_sgr, line_start_styles,
+    parse_line, spans_view, strip_ansi, style_dict,
+)
+
+
+class TestApplySgr:
+    """Tests for SGR parameter handling (mirrors the Flutter AnsiParser)"""
+
+    @pytest.mark.parametrize("params,expected", [
+        ("", DEFAULT_STYLE),
+        ("0", DEFAULT_STYLE),
+        ("1", (None, None, ATTR_BOLD)),
+        ("31", (1, None, 0)),
+        ("44", (None, 4, 0)),
+        ("92", (10, None, 0)),
+        ("103", (None, 11, 0)),
+        ("38;5;208", (208, None, 0)),
+        ("48;2;255;128;0", (None, "#ff8000", 0)),
+        ("1;4;7", (None, None, ATTR_BOLD | ATTR_UNDERLINE | ATTR_REVERSE)),
+        ("38:5:33", (33, None, 0)),
+    ])
+    def test_from_default(self, params, expected):
+        assert apply_sgr(DEFAULT_STYLE, params) == expected
+
+    def test_resets(self):
+        style = apply_sgr(DEFAULT_STYLE, "1;2;4;31;42")
+
+        assert apply_sgr(style, "22") == (1, 2, ATTR_UNDERLINE)
+        assert apply_sgr(style, "39;49") == (None, None, ATTR_BOLD | ATTR_DIM | ATTR_UNDERLINE)
+        assert apply_sgr(style, "0") == DEFAULT_STYLE
+
+    def test_truncated_extended_color_ignored(self):
+        assert apply_sgr(DEFAULT_STYLE, "38;5") == DEFAULT_STYLE
+
+
+class TestParseLine:
+    """Tests for splitting lines into style runs"""
+
+    def test_plain_line(self):
+        assert parse_line("hello") == ((("hello", DEFAULT_STYLE),), DEFAULT_STYLE)
+        assert parse_line("") == ((), DEFAULT_STYLE)
+
+    def test_runs(self):
+        spans, end = parse_line("a \x1b[1;31merror\x1b[0m done")
+
+        assert spans == (
+            ("a ", DEFAULT_STYLE),
+            ("error", (1, None, ATTR_BOLD)),
+            (" done", DEFAULT_STYLE),
+        )
+        assert end == DEFAULT_STYLE
+
+    def test_non_sgr_sequences_stripped(self):
+        spans, _ = parse_line("\x1b[2Ka\x1b[?25lb\x1b]8;;http://x\x1b\\c")
+
+        assert spans == (("abc", DEFAULT_STYLE),)
+
+    def test_style_carries_to_next_line(self):
+        lines = ["\x1b[32mgreen", "still green\x1b[0m", "plain"]
+
+        assert line_start_styles(lines) == [DEFAULT_STYLE, (2, None, 0), DEFAULT_STYLE]
+
+    def test_parses_are_cached(self):
+        line = "\x1b[35mcached line for the test\x1b[0m"
+        parse_line(line)
+        hits = parse_line.cache_info().hits
+
+        parse_line(line)
+
+        assert parse_line.cache_info().hits == hits + 1
+
+
+class TestViews:
+    """Tests for the plain and spans encodings"""
+
+    def test_strip_ansi(self):
+        assert strip_ansi("\x1b[1mbold\x1b[0m and \x1b[38;5;1mred\x1b[m") == "bold and red"
+        assert strip_ansi("nothing") == "nothing"
+
+    def test_style_dict_omits_defaults(self):
+        assert style_dict(DEFAULT_STYLE) == {}
+        assert style_dict(("#010203", 4, ATTR_BOLD | ATTR_REVERSE)) == {
+            "fg": "#010203", "bg": 4, "bold": True, "reverse": True,
+        }
+
+    def test_spans_view_shares_style_table(self):
+        view = spans_view(["\x1b[1mA\x1b[0m b", "\x1b[1mC"])
+
+        assert view["styles"] == [{"bold": True}, {}]
+        assert view["lines"] == [[["A", 0], [" b", 1]], [["C", 0]]]
+
+    def test_spans_view_selected_lines(self):
+        lines = ["\x1b[31mred", "inherits", "x"]
+
+        view = spans_view(lines, indices=[1])
+
+        assert view == {"styles": [{"fg": 1}], "lines": [[["inherits", 0]]]}
+
+    def test_profiles(self):
+        assert ansi.RENDER_PROFILES == ("raw", "plain", "spans")
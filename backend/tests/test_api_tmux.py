@@ -1,8 +1,14 @@
+import gzip
+import json
 import pytest
+import zstandard
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
 
 from app.main import app
+from app.services.scrollback import CursorExpired, ScrollbackBuffer
+from app.websocket import binary
+from app.websocket.binary import SUBPROTOCOL
 
 
 class TestTmuxRouterSendCommand:
@@ -64,6 +70,69 @@ class TestTmuxRouterSendEnter:
         assert "Failed to send enter" in response.json()["detail"]
 
 
+class TestTmuxRouterSendInput:
+    """Tests for /api/tmux/send-input endpoint"""
+
+    def test_send_input_success(self, test_client, mock_tmux_service):
+        response = test_client.post(
+            "/api/tmux/send-input",
+            json={"target": "default", "items": [{"text": "ls -la"}, {"key": "Enter"}]}
+        )
+
+        assert response.status_code == 200
+        assert "Input sent" in response.json()["message"]
+        mock_tmux_service.send_input.assert_awaited_once_with(
+            "default", [("text", "ls -la"), ("key", "Enter")])
+
+    def test_send_input_requests_capture(self, test_client, mock_tmux_service):
+        with patch("app.routers.tmux.capture_scheduler") as scheduler:
+            response = test_client.post(
+                "/api/tmux/send-input", json={"target": "default", "items": [{"key": "Enter"}]})
+
+        assert response.status_code == 200
+        scheduler.request.assert_called_once_with("default")
+
+    @pytest.mark.parametrize("item", [{}, {"text": "a", "key": "Enter"}])
+    def test_send_input_item_needs_text_or_key(self, test_client, item):
+        response = test_client.post(
+            "/api/tmux/send-input", json={"target": "default", "items": [item]})
+
+        assert response.status_code == 422
+
+    def test_send_input_failure(self, test_client, mock_tmux_service):
+        mock_tmux_service.send_input.return_value = False
+
+        response = test_client.post(
+            "/api/tmux/send-input", json={"target": "default", "items": [{"key": "C-c"}]})
+
+        assert response.status_code == 500
+        assert "Failed to send input" in response.json()["detail"]
+
+
+class TestTmuxRouterResize:
+    """Tests for /api/tmux/resize endpoint"""
+
+    def test_resize(self, test_client, mock_tmux_service):
+        response = test_client.post("/api/tmux/resize?target=default:0.1&cols=100&rows=40&client_id=phone")
+
+        assert response.status_code == 200
+        assert response.json()["data"] == {"cols": 100, "rows": 40, "resized": True}
+        mock_tmux_service.resize_pane.assert_awaited_once_with("default:0.1", 100, 40)
+
+    def test_resize_skipped_when_unchanged(self, test_client, mock_tmux_service):
+        response = test_client.post("/api/tmux/resize?target=default&cols=80&rows=24")
+
+        assert response.json()["data"]["resized"] is False
+        mock_tmux_service.resize_pane.assert_not_awaited()
+
+    def test_resize_missing_target(self, test_client, mock_tmux_service):
+        mock_tmux_service.get_window_size.return_value = None
+
+        response = test_client.post("/api/tmux/resize?target=gone&cols=100&rows=40")
+
+        assert response.status_code == 500
+
+
 class TestTmuxRouterGetOutput:
     """Tests for /api/tmux/output endpoint"""
 
@@ -94,6 +163,162 @@ class TestTmuxRouterGetOutput:
         mock_tmux_service.get_output.assert_called_with("default", include_history=True, lines=500)
 
 
+class TestTmuxRouterStreamOutput:
+    """Tests for /api/tmux/output/stream and /api/tmux/output/export"""
+
+    @staticmethod
+    def history(*chunks, error=None):
+        async def stream(target, escapes=True):
+            if error is not None:
+                raise error
+            for chunk in chunks:
+                yield chunk
+        return stream
+
+    def test_ndjson(self, test_client, mock_tmux_service):
+        mock_tmux_service.stream_history = self.history(b"one\ntw", b"o\n\n")
+
+        response = test_client.get("/api/tmux/output/stream?target=default")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[1] == {"type": "lines", "lines": ["one", "two"]}
+        assert lines[-1] == {"type": "end", "line_count": 2}
+
+    def test_text(self, test_client, mock_tmux_service):
+        mock_tmux_service.stream_history = self.history(b"one\n", b"two\n")
+
+        response = test_client.get("/api/tmux/output/stream?target=default&format=text")
+
+        assert response.text == "one\ntwo\n"
+        assert response.headers["content-type"].startswith("text/plain")
+
+    def test_missing_session(self, test_client, mock_tmux_service):
+        mock_tmux_service.stream_history = self.history(error=LookupError("Session not found"))
+
+        response = test_client.get("/api/tmux/output/stream?target=gone")
+
+        assert response.status_code == 404
+
+    def test_invalid_format(self, test_client, mock_tmux_service):
+        response = test_client.get("/api/tmux/output/stream?target=default&format=xml")
+
+        assert response.status_code == 422
+
+    def test_export(self, test_client, mock_tmux_service):
+        mock_tmux_service.stream_history = self.history(b"one\n", b"two\n")
+
+        response = test_client.get("/api/tmux/output/export?target=work:1")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/gzip"
+        disposition = response.headers["content-disposition"]
+        assert disposition.startswith('attachment; filename="work_1-') and disposition.endswith('.txt.gz"')
+        assert gzip.decompress(response.content) == b"one\ntwo\n"
+
+
+class TestTmuxRouterScrollback:
+    """Tests for /api/tmux/scrollback endpoint"""
+
+    PAGE = {"content": "row1\nrow2", "start": 1, "end": 3, "history_size": 3, "cursor": "MToxOjE"}
+
+    def test_get_page(self, test_client, mock_tmux_service):
+        mock_tmux_service.get_scrollback_page = AsyncMock(return_value=self.PAGE)
+
+        response = test_client.get("/api/tmux/scrollback?target=default&lines=2&cursor=abc")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["content"] == "row1\nrow2"
+        assert data["cursor"] == "MToxOjE"
+        assert data["target"] == "default"
+        mock_tmux_service.get_scrollback_page.assert_called_with("default", lines=2, cursor="abc")
+
+    def test_monitored_target_served_from_memory(self, test_client, mock_tmux_service):
+        history = [f"row{i}" for i in range(10)]
+        mock_tmux_service.seed_scrollback = AsyncMock(return_value=ScrollbackBuffer(history, 10, 10))
+        mock_tmux_service.get_scrollback_page = AsyncMock()
+
+        with test_client.websocket_connect("/api/tmux/ws/default") as ws:
+            ws.receive_json()
+            ws.receive_json()
+            page = test_client.get("/api/tmux/scrollback?target=default&lines=3").json()
+            output = test_client.get("/api/tmux/output?target=default&include_history=true&lines=2").json()
+
+        assert page["content"] == "row7\nrow8\nrow9"
+        assert page["start"] == 7
+        assert output["content"] == "row8\nrow9\nterminal output"
+        mock_tmux_service.get_scrollback_page.assert_not_called()
+        mock_tmux_service.get_output.assert_not_called()
+        mock_tmux_service.seed_scrollback.assert_called_once_with("default")
+
+    def test_zero_history_lines_mean_all_history(self, test_client, mock_tmux_service):
+        history = [f"row{i}" for i in range(10)]
+        mock_tmux_service.seed_scrollback = AsyncMock(return_value=ScrollbackBuffer(history, 10, 10))
+        mock_tmux_service.get_output.return_value = "\n".join([*history, "terminal output"])
+        url = "/api/tmux/output?target=default&include_history=true&lines=0"
+
+        from_tmux = test_client.get(url).json()
+        with test_client.websocket_connect("/api/tmux/ws/default") as ws:
+            ws.receive_json()
+            ws.receive_json()
+            buffered = test_client.get(url).json()
+
+        assert buffered["content"] == from_tmux["content"]
+        mock_tmux_service.get_output.assert_awaited_once_with("default", include_history=True, lines=None)
+        assert test_client.get("/api/tmux/output?target=default&lines=-1").status_code == 422
+
+    def test_monitored_output_served_while_fresh(self, test_client, mock_tmux_service):
+        from app.routers import tmux as tmux_router
+
+        with test_client.websocket_connect("/api/tmux/ws/default") as ws:
+            ws.receive_json()
+            ws.receive_json()
+            cached = test_client.get("/api/tmux/output?target=default").json()
+            mock_tmux_service.get_output.assert_not_called()
+            with patch.object(tmux_router, "OUTPUT_MAX_AGE", 0):
+                captured = test_client.get("/api/tmux/output?target=default").json()
+                test_client.get("/api/tmux/output?target=default&include_history=true")
+            assert mock_tmux_service.get_output.await_count == 2
+
+        assert cached["content"] == captured["content"] == "terminal output"
+        assert cached["target"] == "default"
+
+    def test_unchanged_probe_keeps_output_fresh(self):
+        from app.routers import tmux as tmux_router
+        from app.websocket.frames import FrameStream
+
+        stream = tmux_router.frame_streams["%7"] = FrameStream("%7")
+        try:
+            stream.update("screen")
+            stream.captured_at -= 60
+            assert stream.fresh_content(1.0) is None
+
+            tmux_router._mark_current("%7")
+
+            assert stream.fresh_content(1.0) == "screen"
+        finally:
+            tmux_router.frame_streams.pop("%7", None)
+
+    def test_lines_out_of_range(self, test_client, mock_tmux_service):
+        response = test_client.get("/api/tmux/scrollback?target=default&lines=0")
+
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize("error, status", [
+        (ValueError("Invalid cursor"), 400),
+        (LookupError("Session not found"), 404),
+        (CursorExpired("History was cleared"), 410),
+    ])
+    def test_errors(self, test_client, mock_tmux_service, error, status):
+        mock_tmux_service.get_scrollback_page = AsyncMock(side_effect=error)
+
+        response = test_client.get("/api/tmux/scrollback?target=default&cursor=x")
+
+        assert response.status_code == status
+
+
 class TestTmuxRouterSessions:
     """Tests for /api/tmux/sessions endpoint"""
 
@@ -120,6 +345,42 @@ class TestTmuxRouterHierarchy:
         assert "default" in data["data"]
 
 
+class TestTmuxRouterConditionalRequests:
+    """Tests for ETag / If-None-Match on topology endpoints"""
+
+    @pytest.mark.parametrize("path", ["/api/tmux/sessions", "/api/tmux/hierarchy", "/api/tmux/status"])
+    def test_etag_and_not_modified(self, test_client, mock_tmux_service, path):
+        first = test_client.get(path)
+        etag = first.headers["etag"]
+
+        second = test_client.get(path, headers={"If-None-Match": etag})
+
+        assert first.status_code == 200
+        assert etag.startswith('"') and etag.endswith('"')
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+
+    def test_changed_content_returns_200(self, test_client, mock_tmux_service):
+        etag = test_client.get("/api/tmux/sessions").headers["etag"]
+        mock_tmux_service.get_sessions.return_value = ["default"]
+
+        response = test_client.get("/api/tmux/sessions", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["data"]["sessions"] == ["default"]
+
+    def test_if_none_match_list_and_weak(self, test_client, mock_tmux_service):
+        etag = test_client.get("/api/tmux/hierarchy").headers["etag"]
+
+        response = test_client.get(
+            "/api/tmux/hierarchy", headers={"If-None-Match": f'"other", W/{etag}'}
+        )
+
+        assert response.status_code == 304
+
+
 class TestTmuxRouterCreateSession:
     """Tests for /api/tmux/create-session endpoint"""
 
@@ -270,3 +531,209 @@ class TestTmuxRouterStatus:
         assert data["success"] is True
         assert "sessions" in data["data"]
         assert "active_connections" in data["data"]
+
+
+class TestTmuxWebSocket:
+    """Tests for /api/tmux/ws/{target} framing"""
+
+    def test_legacy_client_gets_full_frames(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws/default") as ws:
+            assert ws.receive_json()["type"] == "heartbeat"
+            frame = ws.receive_json()
+
+        assert frame["content"] == "terminal output"
+        assert frame["target"] == "default"
+        assert "type" not in frame
+
+    def test_delta_client_gets_keyframe_then_resync(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws/default?delta=1") as ws:
+            assert ws.receive_json()["type"] == "heartbeat"
+            keyframe = ws.receive_json()
+            ws.send_json({"type": "resync"})
+            resync = ws.receive_json()
+
+        assert keyframe["type"] == "keyframe"
+        assert keyframe["content"] == "terminal output"
+        assert resync["type"] == "keyframe"
+        assert resync["seq"] == keyframe["seq"]
+
+    def test_render_profile(self, test_client, mock_tmux_service):
+        mock_tmux_service.capture_targets.side_effect = lambda targets: {
+            target: "\x1b[1mbold\x1b[0m" for target in targets}
+        with test_client.websocket_connect("/api/tmux/ws/default?delta=1&render=spans") as ws:
+            assert ws.receive_json()["type"] == "heartbeat"
+            keyframe = ws.receive_json()
+
+        assert keyframe["profile"] == "spans"
+        assert keyframe["lines"] == [[["bold", 0]]]
+
+    def test_choices_event(self, test_client, mock_tmux_service):
+        mock_tmux_service.capture_targets.side_effect = lambda targets: {
+            target: "Do you want to proceed?\n\x1b[36m1. Yes\x1b[0m\n2. No" for target in targets}
+        with test_client.websocket_connect("/api/tmux/ws/default?events=1") as ws:
+            assert ws.receive_json()["type"] == "heartbeat"
+            messages = [ws.receive_json(), ws.receive_json()]
+            # A late joiner gets the pending menu after the screen it is on
+            with test_client.websocket_connect("/api/tmux/ws/default?events=1") as late:
+                late_messages = [late.receive_json() for _ in range(3)]
+
+        choices = next(m for m in messages if m.get("type") == "choices")
+        assert choices["target"] == "default"
+        assert choices["choices"] == [{"number": 1, "text": "Yes"}, {"number": 2, "text": "No"}]
+        assert [m.get("type") for m in late_messages] == ["heartbeat", None, "choices"]
+        assert late_messages[1]["content"].startswith("Do you want to proceed?")
+
+    def test_plain_client_gets_only_output(self, test_client, mock_tmux_service):
+        mock_tmux_service.capture_targets.side_effect = lambda targets: {
+            target: "Do you want to proceed?\n1. Yes\n2. No" for target in targets}
+        with test_client.websocket_connect("/api/tmux/ws/default:0.0") as ws:
+            messages = [ws.receive_json(), ws.receive_json()]
+            with test_client.websocket_connect("/api/tmux/ws/default:0.0") as late:
+                assert late.receive_json()["type"] == "heartbeat"
+                late.send_json({"type": "ping"})
+                assert late.receive_json()["type"] == "pong"
+            ws.send_json({"type": "ping"})
+            messages.append(ws.receive_json())
+
+        assert [m.get("type") for m in messages] == ["heartbeat", None, "pong"]
+        assert set(messages[1]) == {"content", "timestamp", "target"}
+
+    def test_input_is_acknowledged(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws/default") as ws:
+            assert ws.receive_json()["type"] == "heartbeat"
+            ws.send_json({"type": "input", "seq": 1, "items": [{"text": "ls"}, {"key": "Enter"}]})
+            messages = [ws.receive_json(), ws.receive_json()]
+
+        ack = next(m for m in messages if m.get("type") == "input_ack")
+        assert (ack["seq"], ack["ok"]) == (1, True)
+        mock_tmux_service.send_input.assert_awaited_once_with("default", [("text", "ls"), ("key", "Enter")])
+
+    def test_zstd_client_gets_binary_frames(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws/default?compression=zstd") as ws:
+            assert ws.receive_json()["type"] == "heartbeat"
+            payload = ws.receive_bytes()
+
+        content = json.loads(zstandard.ZstdDecompressor().decompress(payload))["content"]
+        assert content == "terminal output"
+
+    def test_compression_stats(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws/default?compression=zstd") as ws:
+            ws.receive_json()
+            ws.receive_bytes()
+            response = test_client.get("/api/tmux/compression")
+
+        stats = response.json()["data"]["default"]
+        assert stats["zstd"]["messages"] == 1
+        assert stats["deflate"] is None
+
+    def test_monitor_stats(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws/default") as ws:
+            ws.receive_json()
+            ws.receive_json()
+            test_client.post("/api/tmux/resize?target=default&cols=100&rows=40")
+            response = test_client.get("/api/tmux/stats")
+
+        data = response.json()["data"]
+        assert [s["target"] for s in data["connections"]] == ["default"]
+        assert data["capture_hub"] is None
+        assert data["pane_aliases"]["aliases"] == 1
+        assert data["resize"]["resizes"] >= 1
+        assert set(data) == {"connections", "capture_hub", "overview", "pane_aliases", "resize", "scrollback"}
+
+    def test_binary_subprotocol(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws/default", subprotocols=[SUBPROTOCOL]) as ws:
+            assert ws.accepted_subprotocol == SUBPROTOCOL
+            announcement = binary.decode(ws.receive_bytes())
+            assert binary.decode(ws.receive_bytes()).type == binary.HEARTBEAT
+            output = binary.decode(ws.receive_bytes())
+            ws.send_bytes(binary.encode_client_message({"type": "ping"}))
+            pong = binary.decode(ws.receive_bytes())
+
+        assert announcement.message() == {"type": "target", "id": announcement.target_id, "target": "default"}
+        assert output.type == binary.OUTPUT
+        assert output.text == "terminal output"
+        assert output.target_id == announcement.target_id
+        assert pong.type == binary.PONG
+
+
+class TestTmuxMultiplexedWebSocket:
+    """Tests for /api/tmux/ws with subscribe/unsubscribe"""
+
+    def test_subscribe_switch_and_input(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws?delta=1") as ws:
+            assert ws.receive_json()["type"] == "heartbeat"
+            ws.send_json({"type": "subscribe", "target": "default"})
+            subscribed = ws.receive_json()
+            keyframe = ws.receive_json()
+            ws.send_json({"type": "subscribe", "target": "test-session", "exclusive": True})
+            switched = ws.receive_json()
+            ws.receive_json()
+            ws.send_json({"type": "input", "id": switched["id"], "seq": 1, "key": "Enter"})
+            ack = ws.receive_json()
+            ws.send_json({"type": "subscribe", "target": "bad target!"})
+            error = ws.receive_json()
+
+        assert subscribed == {"type": "subscribed", "target": "default", "id": subscribed["id"]}
+        assert keyframe["id"] == subscribed["id"]
+        assert keyframe["type"] == "keyframe"
+        assert keyframe["content"] == "terminal output"
+        assert switched["target"] == "test-session"
+        assert (ack["id"], ack["type"], ack["ok"]) == (switched["id"], "input_ack", True)
+        mock_tmux_service.send_input.assert_awaited_once_with("test-session", [("key", "Enter")])
+        assert error == {"type": "error", "target": "bad target!", "error": "invalid target"}
+
+    def test_overview(self, test_client, mock_tmux_service):
+        with test_client.websocket_connect("/api/tmux/ws") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "overview"})
+            overview = ws.receive_json()
+            ws.send_json({"type": "overview", "enabled": False})
+
+        assert overview["type"] == "overview"
+        assert overview["full"] is True
+        assert overview["panes"] == {"default:0.0": ["$ ls"]}
+
+    def test_subscriptions_released_on_disconnect(self, test_client, mock_tmux_service):
+        from app.routers.tmux import capture_scheduler, manager
+
+        with test_client.websocket_connect("/api/tmux/ws") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "subscribe", "targets": ["default", "test-session"]})
+            messages = [ws.receive_json() for _ in range(4)]
+            assert "default" in capture_scheduler
+            ws.send_json({"type": "unsubscribe", "target": "default"})
+            ws.send_json({"type": "ping"})
+            assert ws.receive_json()["type"] == "pong"
+            assert "default" not in capture_scheduler
+
+        assert [m["type"] for m in messages if "type" in m] == ["subscribed", "subscribed"]
+        assert {m["content"] for m in messages if "content" in m} == {"terminal output"}
+        assert "test-session" not in capture_scheduler
+        assert not manager.has_connections_for_session("test-session")
+
+    def test_aliases_share_one_monitor(self, test_client, mock_tmux_service):
+        from app.routers.tmux import capture_scheduler, frame_streams, pane_aliases
+
+        mock_tmux_service.resolve_pane_ids.side_effect = lambda targets: {target: "%0" for target in targets}
+        with test_client.websocket_connect("/api/tmux/ws?delta=1") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "subscribe", "targets": ["default", "default:0.0"]})
+            messages = [ws.receive_json() for _ in range(4)]
+            assert "%0" in capture_scheduler
+            assert "default" not in capture_scheduler
+            assert list(frame_streams) == ["%0"]
+            ws.send_json({"type": "input", "target": "default:0.0", "seq": 1, "key": "Enter"})
+            ws.receive_json()
+            ws.send_json({"type": "unsubscribe", "target": "default"})
+            ws.send_json({"type": "ping"})
+            ws.receive_json()
+            assert "%0" in capture_scheduler
+
+        subscribed = {m["id"]: m["target"] for m in messages if m.get("type") == "subscribed"}
+        frames = [m for m in messages if m.get("type") == "keyframe"]
+        assert sorted(subscribed.values()) == ["default", "default:0.0"]
+        # One frame, encoded under the target each client asked for
+        assert frames and all(m["target"] == subscribed[m["id"]] for m in frames)
+        mock_tmux_service.send_input.assert_awaited_once_with("%0", [("key", "Enter")])
+        assert "%0" not in capture_scheduler
+        assert "default:0.0" not in pane_aliases
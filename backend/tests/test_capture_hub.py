@@ -0,0 +1,130 @@
+"""Tests for the capture hub shared by web workers"""
+import asyncio
+import os
+import shutil
+import tempfile
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.capture_hub import CaptureHub, HubClient
+
+
+class FakeScheduler:
+    def __init__(self, on_output, on_current=None):
+        self.on_output = on_output
+        self.on_current = on_current
+        self.add = MagicMock()
+        self.remove = MagicMock()
+        self.set_interval = MagicMock()
+        self.request = MagicMock()
+        self.close = AsyncMock()
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths must stay short
+    directory = tempfile.mkdtemp(prefix="hub")
+    yield os.path.join(directory, "hub.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestCaptureHub:
+    """Tests for fan-out, dedup and ownership"""
+
+    @pytest.mark.asyncio
+    async def test_workers_share_one_capture(self, socket_path):
+        schedulers = []
+
+        def make_hub():
+            return CaptureHub(lambda *handlers: schedulers.append(FakeScheduler(*handlers)) or schedulers[-1])
+
+        first_outputs, second_outputs = [], []
+        first_current = MagicMock()
+        first = HubClient(socket_path, AsyncMock(side_effect=lambda *a: first_outputs.append(a)), make_hub=make_hub,
+                          on_current=first_current)
+        second = HubClient(socket_path, AsyncMock(side_effect=lambda *a: second_outputs.append(a)),
+                           make_hub=make_hub)
+        try:
+            first.add("main:0")
+            await asyncio.wait_for(first.connected.wait(), 2)
+            second.add("main:0")
+            second.set_interval("main:0", 0.5)
+            await asyncio.wait_for(second.connected.wait(), 2)
+            scheduler = schedulers[0]
+            await wait_for(lambda: scheduler.set_interval.called)
+            assert (first.hub is None) != (second.hub is None)
+
+            await scheduler.on_output("main:0", "hello")
+            await scheduler.on_output("main:0", "hello")
+            await wait_for(lambda: len(first_outputs) == 1 and len(second_outputs) == 1)
+            # The repeat and an unchanged probe only confirm it
+            scheduler.on_current("main:0")
+            await wait_for(lambda: first_current.call_count == 2)
+            first_current.assert_called_with("main:0")
+
+            first.remove("main:0")
+            await scheduler.on_output("main:0", "changed")
+            await wait_for(lambda: len(second_outputs) == 2)
+            second.remove("main:0")
+            await wait_for(lambda: scheduler.remove.called)
+        finally:
+            await second.close()
+            await first.close()
+
+        assert len(schedulers) == 1
+        assert [args.args for args in scheduler.add.call_args_list] == [("main:0",), ("main:0",)]
+        scheduler.set_interval.assert_called_once_with("main:0", 0.5)
+        assert first_outputs == [("main:0", "hello")]
+        assert second_outputs == [("main:0", "hello"), ("main:0", "changed")]
+        scheduler.remove.assert_called_once_with("main:0")
+
+    @pytest.mark.asyncio
+    async def test_late_worker_gets_latest_output(self, socket_path):
+        hub = CaptureHub(FakeScheduler)
+        await hub.start(socket_path)
+        outputs = []
+        client = HubClient(socket_path, AsyncMock(side_effect=lambda *a: outputs.append(a)))
+        try:
+            await hub._on_output("main", "ignored, nobody watches")
+            client.add("main")
+            await asyncio.wait_for(client.connected.wait(), 2)
+            await wait_for(lambda: "main" in hub._watchers)
+            await hub._scheduler.on_output("main", "screen")
+            await wait_for(lambda: outputs)
+
+            late = HubClient(socket_path, AsyncMock(side_effect=lambda *a: outputs.append(a)))
+            late.add("main")
+            await wait_for(lambda: len(outputs) == 2)
+            await late.close()
+        finally:
+            await client.close()
+            await hub.close()
+
+        assert outputs == [("main", "screen"), ("main", "screen")]
+        assert not os.path.exists(socket_path)
+
+    @pytest.mark.asyncio
+    async def test_another_worker_takes_over(self, socket_path):
+        owner = HubClient(socket_path, AsyncMock(), make_hub=lambda: CaptureHub(FakeScheduler))
+        follower = HubClient(socket_path, AsyncMock(), make_hub=lambda: CaptureHub(FakeScheduler),
+                             reconnect_delay=0.01)
+        try:
+            owner.add("main")
+            await asyncio.wait_for(owner.connected.wait(), 2)
+            follower.add("main")
+            await asyncio.wait_for(follower.connected.wait(), 2)
+            assert owner.hub is not None and follower.hub is None
+
+            await owner.close()
+            await wait_for(lambda: follower.hub is not None and follower.connected.is_set())
+            await wait_for(lambda: "main" in follower.hub._watchers)
+        finally:
+            await follower.close()
+            await owner.close()
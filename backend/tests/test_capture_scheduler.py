@@ -0,0 +1,218 @@
+"""Tests for the batched capture scheduler"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.capture_scheduler import CaptureScheduler, ScheduledTarget
+
+
+def make_scheduler(**kwargs):
+    batches = []
+
+    async def capture(targets):
+        batches.append(list(targets))
+        return {target: f"output of {target}" for target in targets}
+
+    on_output = AsyncMock()
+    scheduler = CaptureScheduler(capture, on_output, **kwargs)
+    return scheduler, batches, on_output
+
+
+class TestCaptureScheduler:
+    """Tests for CaptureScheduler batching and intervals"""
+
+    @pytest.mark.asyncio
+    async def test_targets_added_together_share_one_capture(self):
+        scheduler, batches, on_output = make_scheduler(interval=10.0)
+        for target in ("a", "b", "c"):
+            scheduler.add(target)
+
+        await asyncio.sleep(0.02)
+        await scheduler.close()
+
+        assert batches == [["a", "b", "c"]]
+        on_output.assert_any_call("b", "output of b")
+        assert on_output.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_per_target_intervals_honored(self):
+        scheduler, batches, _ = make_scheduler(interval=10.0, jitter=0.0)
+        scheduler.add("fast", interval=0.05)
+        scheduler.add("slow")
+
+        await asyncio.sleep(0.18)
+        await scheduler.close()
+
+        captured = [target for batch in batches for target in batch]
+        assert captured.count("slow") == 1
+        assert captured.count("fast") >= 3
+
+    @pytest.mark.asyncio
+    async def test_set_interval_reschedules_sooner(self):
+        scheduler, batches, _ = make_scheduler(interval=10.0, jitter=0.0)
+        scheduler.add("a")
+        await asyncio.sleep(0.01)
+
+        scheduler.set_interval("a", 0.02)
+        await asyncio.sleep(0.05)
+        await scheduler.close()
+
+        assert len(batches) >= 2
+
+    @pytest.mark.asyncio
+    async def test_request_captures_immediately(self):
+        scheduler, batches, _ = make_scheduler(interval=10.0)
+        scheduler.add("a")
+        await asyncio.sleep(0.01)
+
+        scheduler.request("a")
+        await asyncio.sleep(0.01)
+        await scheduler.close()
+
+        assert batches == [["a"], ["a"]]
+
+    @pytest.mark.asyncio
+    async def test_removed_target_not_captured(self):
+        scheduler, batches, _ = make_scheduler(interval=0.02)
+        scheduler.add("a")
+        scheduler.add("b")
+        await asyncio.sleep(0.01)
+
+        scheduler.remove("a")
+        await asyncio.sleep(0.05)
+        await scheduler.close()
+
+        assert all(batch == ["b"] for batch in batches[1:])
+        assert "a" not in scheduler
+
+    @pytest.mark.asyncio
+    async def test_capture_error_backs_off(self):
+        capture = AsyncMock(side_effect=RuntimeError("boom"))
+        on_output = AsyncMock()
+        scheduler = CaptureScheduler(capture, on_output, interval=0.01)
+        scheduler.add("a")
+
+        await asyncio.sleep(0.05)
+        await scheduler.close()
+
+        capture.assert_called_once()
+        on_output.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_output_subscription_triggers_capture(self):
+        subscription = MagicMock()
+        subscription.available = AsyncMock(return_value=True)
+        woken = asyncio.Event()
+
+        async def wait(timeout, settle=0.0):
+            await woken.wait()
+            woken.clear()
+            return True
+
+        subscription.wait = wait
+        scheduler, batches, _ = make_scheduler(
+            interval=0.01, event_interval=10.0, subscribe=AsyncMock(return_value=subscription)
+        )
+        scheduler.add("a")
+        await asyncio.sleep(0.05)
+        # Evented targets are not polled at the (short) polling interval
+        settled = len(batches)
+        assert settled <= 2
+
+        woken.set()
+        await asyncio.sleep(0.01)
+        await scheduler.close()
+
+        assert len(batches) == settled + 1
+        subscription.close.assert_called_once()
+
+
+class TestActivityGating:
+    """Tests for probe-gated capture and idle backoff"""
+
+    @pytest.mark.asyncio
+    async def test_unchanged_fingerprint_skips_capture(self):
+        probe = AsyncMock(return_value={"a": ("100 0 0,0 %0", 100)})
+        current = MagicMock()
+        scheduler, batches, _ = make_scheduler(interval=0.01, probe=probe, max_interval=0.01,
+                                               on_current=current)
+        scheduler.add("a")
+
+        await asyncio.sleep(0.08)
+        await scheduler.close()
+
+        assert batches == [["a"]]
+        assert probe.call_count > 2
+        # Every skipped capture confirms the last output
+        assert current.call_count == probe.call_count - 1
+        current.assert_called_with("a")
+
+    @pytest.mark.asyncio
+    async def test_changed_fingerprint_captures(self):
+        fingerprints = iter(range(1000))
+        probe = AsyncMock(side_effect=lambda targets: {"a": (f"100 {next(fingerprints)}", 100)})
+        scheduler, batches, _ = make_scheduler(interval=0.01, probe=probe)
+        scheduler.add("a")
+
+        await asyncio.sleep(0.08)
+        await scheduler.close()
+
+        assert len(batches) > 2
+
+    @pytest.mark.asyncio
+    async def test_requested_capture_ignores_probe(self):
+        probe = AsyncMock(return_value={"a": ("100 0", 100)})
+        scheduler, batches, _ = make_scheduler(interval=10.0, probe=probe)
+        scheduler.add("a")
+        await asyncio.sleep(0.01)
+
+        scheduler.request("a")
+        await asyncio.sleep(0.01)
+        await scheduler.close()
+
+        assert batches == [["a"], ["a"]]
+
+    def test_same_second_activity_is_not_trusted(self):
+        entry = ScheduledTarget("a", 1.0)
+        entry.fingerprint = "100 0"
+        entry.captured_second = 100
+
+        assert entry.unchanged(("100 0", 100)) is False
+        entry.captured_second = 101
+        assert entry.unchanged(("100 0", 100)) is True
+        assert entry.unchanged(("101 0", 101)) is False
+        assert entry.unchanged(None) is False
+
+    def test_idle_backoff_and_snap_back(self):
+        scheduler, _, _ = make_scheduler(interval=1.0, max_interval=10.0, jitter=0.0)
+        entry = ScheduledTarget("a", 1.0)
+
+        delays = []
+        for idle in range(6):
+            entry.idle = idle
+            delays.append(scheduler._next_delay(entry))
+        entry.idle = 0
+
+        assert delays == [1.0, 2.0, 4.0, 8.0, 10.0, 10.0]
+        assert scheduler._next_delay(entry) == 1.0
+
+    @pytest.mark.asyncio
+    async def test_request_resets_backoff(self):
+        scheduler, _, _ = make_scheduler(interval=0.1, max_interval=1.0, jitter=0.0)
+        scheduler.add("a", interval=0.1)
+        entry = scheduler._targets["a"]
+        entry.idle = 8
+        assert scheduler._next_delay(entry) == 1.0
+
+        scheduler.request("a")  # e.g. input was sent
+
+        assert entry.idle == 0
+        assert scheduler._next_delay(entry) == 0.1
+        await scheduler.close()
+
+    def test_evented_target_uses_event_interval(self):
+        scheduler, _, _ = make_scheduler(interval=1.0, event_interval=7.0, jitter=0.0)
+        entry = ScheduledTarget("a", 1.0)
+        entry.evented = True
+
+        assert scheduler._next_delay(entry) == 7.0
@@ -0,0 +1,65 @@
+"""Tests for Yes/No menu detection (ported from the Flutter ChoiceDetector tests)"""
+import pytest
+
+from app.choices import ChoiceTracker, detect
+
+YES_NO = [{"number": 1, "text": "Yes"}, {"number": 2, "text": "No"}]
+
+
+class TestDetect:
+    """Tests for detect()"""
+
+    @pytest.mark.parametrize("output", [
+        "",
+        "Pick one:\n1. Option A\n2. Option B\n3. Option C",
+        "1. Only option",
+        "2. Skipped\n3. Also skipped",
+        "Just some regular output\nNo choices here",
+        "1. OK\n2. Cancel",
+    ])
+    def test_no_menu(self, output):
+        assert detect(output) == []
+
+    @pytest.mark.parametrize("output", [
+        "Some prompt text\n1. Yes\n2. No",
+        "Pick:\n\x1b[32m1. Yes\x1b[0m\n\x1b[32m2. No\x1b[0m",
+        "  1. Yes  \n  2. No  ",
+        "Do you want to proceed?\n1. Yes\n2. No\n\n\n",
+    ])
+    def test_yes_no_menu(self, output):
+        assert detect(output) == YES_NO
+
+    def test_only_looks_at_tail_lines(self):
+        lines = [f"line {i}" for i in range(30)]
+
+        assert detect("\n".join(lines + ["1. Yes", "2. No"])) == YES_NO
+        assert detect("\n".join(["1. Yes", "2. No"] + lines)) == []
+
+    def test_longer_yes_no_options(self):
+        output = "❯ 1. Yes\n  2. Yes, and don't ask again\n  3. No, and tell Claude what to do differently"
+
+        assert [c["number"] for c in detect(output)] == [1, 2, 3]
+
+
+class TestChoiceTracker:
+    """Tests for per-frame tracking"""
+
+    @staticmethod
+    def screen(bottom):
+        return [f"output {i}" for i in range(40)] + bottom
+
+    def test_reports_appear_and_disappear(self):
+        tracker = ChoiceTracker()
+
+        assert tracker.update(self.screen([]), None) is None
+        assert tracker.update(self.screen(["1. Yes", "2. No"]), [{"start": 40, "lines": ["1. Yes", "2. No"]}]) == YES_NO
+        assert tracker.update(self.screen(["done", ""]), [{"start": 40, "lines": ["done", ""]}]) == []
+
+    def test_skips_frames_that_did_not_touch_the_tail(self):
+        tracker = ChoiceTracker()
+        lines = self.screen(["1. Yes", "2. No"])
+        tracker.update(lines, None)
+        lines[0] = "changed far above"
+
+        assert tracker.update(lines, [{"start": 0, "lines": ["changed far above"]}]) is None
+        assert tracker.detections == 1
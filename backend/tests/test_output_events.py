@@ -0,0 +1,115 @@
+"""Tests for event-driven pane output notifications"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.output_events import TmuxOutputEvents
+from app.services.tmux_service import TmuxService
+
+
+class TestTmuxOutputEvents:
+    """Tests for TmuxOutputEvents notification dispatch"""
+
+    @pytest.fixture
+    def events(self):
+        return TmuxOutputEvents()
+
+    @pytest.mark.asyncio
+    async def test_output_wakes_matching_pane_only(self, events):
+        resolve = AsyncMock(return_value="%1")
+        watched = events.subscribe("$0", "main", "%1", resolve)
+        other = events.subscribe("$0", "main:1", "%2", resolve)
+
+        events._on_notification("$0", "%output %1 hello\\015\\012")
+
+        assert await watched.wait(0.1) is True
+        assert await other.wait(0.01) is False
+
+    @pytest.mark.asyncio
+    async def test_extended_output_wakes(self, events):
+        subscription = events.subscribe("$0", "main", "%4", AsyncMock())
+
+        events._on_notification("$0", "%extended-output %4 12 : data")
+
+        assert await subscription.wait(0.1) is True
+
+    @pytest.mark.asyncio
+    async def test_idle_pane_times_out(self, events):
+        subscription = events.subscribe("$0", "main", "%1", AsyncMock())
+
+        assert await subscription.wait(0.01) is False
+
+    @pytest.mark.asyncio
+    async def test_output_before_wait_is_not_lost(self, events):
+        subscription = events.subscribe("$0", "main", "%1", AsyncMock())
+
+        events._on_notification("$0", "%output %1 x")
+        events._on_notification("$0", "%output %1 y")
+
+        assert await subscription.wait(0.1) is True
+        assert await subscription.wait(0.01) is False
+
+    @pytest.mark.asyncio
+    async def test_focus_change_reresolves_pane(self, events):
+        resolve = AsyncMock(return_value="%7")
+        subscription = events.subscribe("$0", "main", "%1", resolve)
+
+        events._on_notification("$0", "%window-pane-changed @0 %7")
+        assert await subscription.wait(0.1) is True
+
+        assert subscription.pane_id == "%7"
+        resolve.assert_called_once_with("main")
+        events._on_notification("$0", "%output %7 x")
+        assert await subscription.wait(0.1) is True
+
+    @pytest.mark.asyncio
+    async def test_exit_wakes_session_subscribers(self, events):
+        subscription = events.subscribe("$3", "work", "%9", AsyncMock())
+
+        events._on_notification("$3", "%exit")
+
+        assert await subscription.wait(0.1) is True
+
+    @pytest.mark.asyncio
+    async def test_last_unsubscribe_closes_watcher(self, events):
+        subscription = events.subscribe("$0", "main", "%1", AsyncMock())
+        client = AsyncMock()
+        events._clients["$0"] = client
+
+        subscription.close()
+        await asyncio.sleep(0)
+
+        client.close.assert_called_once()
+        assert events._by_pane == {}
+        assert events._by_session == {}
+
+
+class TestSubscribeOutput:
+    """Tests for TmuxService.subscribe_output"""
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_control_mode(self, monkeypatch):
+        monkeypatch.delenv("TMUX_CONTROL_MODE", raising=False)
+
+        assert await TmuxService().subscribe_output("default") is None
+
+    @pytest.mark.asyncio
+    async def test_resolves_pane_id(self, monkeypatch):
+        monkeypatch.setenv("TMUX_CONTROL_MODE", "1")
+        service = TmuxService()
+        service._output_events = TmuxOutputEvents()
+
+        with patch.object(service, '_execute_tmux_command', AsyncMock(return_value=("$2 %5\n", None, 0))):
+            subscription = await service.subscribe_output("default:1")
+
+        assert subscription.session_id == "$2"
+        assert subscription.pane_id == "%5"
+        assert subscription.target == "default:1"
+
+    @pytest.mark.asyncio
+    async def test_unknown_target(self, monkeypatch):
+        monkeypatch.setenv("TMUX_CONTROL_MODE", "1")
+        service = TmuxService()
+
+        with patch.object(service, '_execute_tmux_command', AsyncMock(return_value=(None, "can't find", 1))):
+            assert await service.subscribe_output("missing") is None
@@ -0,0 +1,73 @@
+"""Tests for the all-panes overview stream"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.overview import MAX_OVERVIEW_LINES, OverviewStream
+
+
+def make_stream(*captures, **kwargs):
+    capture = AsyncMock(side_effect=list(captures))
+    publish = AsyncMock()
+    return OverviewStream(capture, publish, interval=3600, **kwargs), capture, publish
+
+
+def published(publish):
+    return [json.loads(call.args[0]) for call in publish.await_args_list]
+
+
+class TestOverviewStream:
+    """Tests for change detection and client lifetime"""
+
+    @pytest.mark.asyncio
+    async def test_only_changed_panes_are_sent(self):
+        stream, capture, publish = make_stream(
+            {"a:0.0": ["$ ls"], "b:0.0": ["building"]},
+            {"a:0.0": ["$ ls"], "b:0.0": ["done"]},
+            {"a:0.0": ["$ ls"], "b:0.0": ["done"]},
+            {"b:0.0": ["done"]},
+            lines=3,
+        )
+
+        for _ in range(4):
+            await stream.tick()
+
+        capture.assert_awaited_with(3)
+        messages = published(publish)
+        assert [(m["full"], m["panes"], m["removed"]) for m in messages] == [
+            (True, {"a:0.0": ["$ ls"], "b:0.0": ["building"]}, []),
+            (False, {"b:0.0": ["done"]}, []),
+            (False, {}, ["a:0.0"]),
+        ]
+        assert (stream.ticks, stream.published) == (4, 3)
+
+    @pytest.mark.asyncio
+    async def test_failed_capture_keeps_tails(self):
+        stream, _, publish = make_stream({"a:0.0": ["x"]}, None, RuntimeError("gone"), {"a:0.0": ["x"]})
+
+        for _ in range(4):
+            await stream.tick()
+
+        assert len(published(publish)) == 1
+        assert stream.tails == {"a:0.0": ["x"]}
+
+    @pytest.mark.asyncio
+    async def test_runs_only_while_clients_watch(self):
+        stream, capture, publish = make_stream({"a:0.0": ["x"]}, {"a:0.0": ["y"]})
+
+        assert stream.add("phone") is None
+        await asyncio.sleep(0.01)
+        snapshot = json.loads(stream.add("tablet"))
+        stream.remove("phone")
+        stream.remove("tablet")
+        await asyncio.sleep(0.01)
+
+        assert snapshot["full"] and snapshot["panes"] == {"a:0.0": ["x"]}
+        assert capture.await_count == 1
+        assert stream.stats()["clients"] == 0
+        await stream.close()
+
+    def test_lines_are_clamped(self):
+        assert make_stream(lines=0)[0].lines == 1
+        assert make_stream(lines=1000)[0].lines == MAX_OVERVIEW_LINES
@@ -0,0 +1,119 @@
+"""Tests for resolving target aliases to canonical pane ids"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.pane_aliases import PaneAliases
+
+
+def make_aliases(panes):
+    """PaneAliases over a mutable {target: pane id} table"""
+    async def resolve(targets):
+        return {target: panes.get(target) for target in targets}
+
+    on_move = AsyncMock()
+    return PaneAliases(resolve, on_move), on_move
+
+
+class TestPaneAliases:
+    """Tests for attach/detach bookkeeping and re-resolution"""
+
+    @pytest.mark.asyncio
+    async def test_aliases_share_a_key(self):
+        aliases, _ = make_aliases({"main": "%1", "main:0.0": "%1"})
+
+        assert await aliases.attach("main") == "%1"
+        assert await aliases.attach("main:0.0") == "%1"
+        assert sorted(aliases.aliases("%1")) == ["main", "main:0.0"]
+        assert aliases.key("main") == "%1"
+        # Unattached aliases and keys stand for themselves
+        assert aliases.key("other") == "other"
+        assert aliases.aliases("%9") == ["%9"]
+
+        assert aliases.detach("main") is None
+        assert aliases.detach("main:0.0") == "%1"
+        assert not aliases.in_use("%1")
+        await aliases.close()
+
+    @pytest.mark.asyncio
+    async def test_unresolved_alias_is_its_own_key(self):
+        aliases, _ = make_aliases({})
+
+        assert await aliases.attach("later") == "later"
+        assert aliases.detach("later") == "later"
+        assert aliases.detach("never-attached") == "never-attached"
+        await aliases.close()
+
+    @pytest.mark.asyncio
+    async def test_refresh_moves_aliases(self):
+        panes = {"main": "%1", "main:0.0": "%1"}
+        aliases, on_move = make_aliases(panes)
+        await aliases.attach("main")
+        await aliases.attach("main:0.0")
+
+        panes["main"] = "%2"  # Another pane was selected
+        await aliases.refresh()
+        await aliases.refresh()
+
+        on_move.assert_awaited_once_with("main", "%1", "%2")
+        assert aliases.aliases("%1") == ["main:0.0"]
+        assert aliases.aliases("%2") == ["main"]
+        assert aliases.stats()["moves"] == 1
+        await aliases.close()
+
+    @pytest.mark.asyncio
+    async def test_pane_ids_are_not_refreshed(self):
+        aliases, _ = make_aliases({"%3": "%3"})
+
+        await aliases.attach("%3")
+        aliases.topology_changed()
+
+        assert aliases._task is None
+        await aliases.close()
+
+    @pytest.mark.asyncio
+    async def test_topology_change_refreshes_once_per_burst(self):
+        panes = {"main": "%1"}
+        aliases, on_move = make_aliases(panes)
+        await aliases.attach("main")
+        assert aliases._task is None
+
+        panes["main"] = "%2"
+        aliases.topology_changed()
+        aliases.topology_changed()
+        await aliases._task
+
+        on_move.assert_awaited_once_with("main", "%1", "%2")
+        assert aliases.stats()["refreshes"] == 1
+        await aliases.close()
+
+    @pytest.mark.asyncio
+    async def test_change_during_refresh_refreshes_again(self):
+        panes = {"main": "%1"}
+        aliases, on_move = make_aliases(panes)
+        await aliases.attach("main")
+
+        async def moved(alias, old, new):
+            if new == "%2":
+                panes["main"] = "%3"
+                aliases.topology_changed()
+        on_move.side_effect = moved
+
+        panes["main"] = "%2"
+        aliases.topology_changed()
+        await aliases._task
+
+        assert aliases.key("main") == "%3"
+        assert aliases.stats()["refreshes"] == 2
+        await aliases.close()
+
+    @pytest.mark.asyncio
+    async def test_resolve_error_keeps_alias(self):
+        on_move = AsyncMock()
+        aliases = PaneAliases(AsyncMock(side_effect=RuntimeError("tmux gone")), on_move)
+
+        assert await aliases.attach("main") == "main"
+        await aliases.refresh()
+
+        on_move.assert_not_awaited()
+        await aliases.close()
@@ -0,0 +1,125 @@
+"""Tests for coalesced window resizes"""
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.resize import ResizeCoordinator
+
+
+def make_coordinator(policy="latest", current=(80, 24), **kwargs):
+    query = AsyncMock(return_value=("@1", *current) if current else None)
+    resize = AsyncMock(return_value=True)
+    return ResizeCoordinator(query, resize, policy=policy, debounce=0.01, **kwargs), query, resize
+
+
+class TestResizeCoordinator:
+    """Tests for debouncing, policies and skipping"""
+
+    @pytest.mark.asyncio
+    async def test_burst_collapses_into_one_resize(self):
+        coordinator, _, resize = make_coordinator()
+
+        results = await asyncio.gather(*(
+            coordinator.request("main:0.0", "phone", 100 + i, 40) for i in range(5)))
+
+        resize.assert_awaited_once_with("main:0.0", 104, 40)
+        assert {(r.cols, r.rows, r.resized) for r in results} == {(104, 40, True)}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("policy,expected", [
+        ("smallest", (60, 30)),
+        ("largest", (120, 50)),
+        ("latest", (90, 50)),
+    ])
+    async def test_policies(self, policy, expected):
+        coordinator, _, resize = make_coordinator(policy)
+
+        await asyncio.gather(
+            coordinator.request("main:0", "tablet", 120, 30),
+            coordinator.request("main:0.1", "phone", 60, 45),
+            coordinator.request("main:0", "laptop", 90, 50),
+        )
+
+        resize.assert_awaited_once_with("main:0", *expected)
+
+    @pytest.mark.asyncio
+    async def test_unchanged_size_skips_tmux(self):
+        coordinator, query, resize = make_coordinator(current=(100, 40))
+
+        result = await coordinator.request("main", "phone", 100, 40)
+
+        assert (result.resized, coordinator.skipped) == (False, 1)
+        # The size read with the window id is trusted for the flush
+        query.assert_awaited_once_with("main")
+        resize.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_known_window_and_size_skip_queries(self):
+        coordinator, query, resize = make_coordinator()
+
+        await coordinator.request("main", "phone", 100, 40)
+        await coordinator.request("main", "phone", 100, 40)
+        await coordinator.request("main", "phone", 90, 40)
+
+        query.assert_awaited_once_with("main")
+        assert [c.args[1:] for c in resize.await_args_list] == [(100, 40), (90, 40)]
+        assert coordinator.skipped == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_size_is_read_again(self):
+        coordinator, query, resize = make_coordinator(query_ttl=0)
+
+        await coordinator.request("main", "phone", 100, 40)
+
+        assert query.await_count == 2
+        resize.assert_awaited_once_with("main", 100, 40)
+
+    @pytest.mark.asyncio
+    async def test_idle_windows_are_evicted(self):
+        coordinator, _, _ = make_coordinator(client_ttl=0.02)
+        await coordinator.request("main", "http:1.2.3.4", 100, 40)
+        assert "@1" in coordinator._windows
+
+        await asyncio.sleep(0.03)
+        coordinator._evict(time.monotonic())
+
+        assert coordinator._windows == {}
+
+    @pytest.mark.asyncio
+    async def test_forgotten_and_expired_clients_stop_counting(self):
+        coordinator, _, resize = make_coordinator("smallest", client_ttl=0.05)
+        await coordinator.request("main", "old-phone", 40, 30)
+        await asyncio.sleep(0.06)
+        await coordinator.request("main", "tablet", 120, 50)
+        await coordinator.request("main", "phone", 70, 40)
+        coordinator.forget("phone")
+
+        await coordinator.request("main", "laptop", 150, 60)
+
+        assert [c.args[1:] for c in resize.await_args_list] == [(40, 30), (120, 50), (70, 40), (120, 50)]
+
+    @pytest.mark.asyncio
+    async def test_targets_grouped_by_window_id(self):
+        query = AsyncMock(side_effect=lambda target: ("@2" if target.startswith("main") else "@3", 80, 24))
+        resize = AsyncMock(return_value=True)
+        coordinator = ResizeCoordinator(query, resize, policy="smallest", debounce=0.01)
+
+        await asyncio.gather(
+            coordinator.request("main", "phone", 70, 40),
+            coordinator.request("main:0.1", "tablet", 100, 30),
+            coordinator.request("other", "tablet", 100, 30),
+        )
+
+        assert sorted(c.args for c in resize.await_args_list) == [("main:0.1", 70, 30), ("other", 100, 30)]
+
+    @pytest.mark.asyncio
+    async def test_missing_window(self):
+        coordinator, _, resize = make_coordinator(current=None)
+
+        assert await coordinator.request("gone", "phone", 80, 30) is None
+        resize.assert_not_awaited()
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            ResizeCoordinator(AsyncMock(), AsyncMock(), policy="median")
@@ -0,0 +1,254 @@
+"""Tests for scrollback cursors and buffers"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.scrollback import (
+    SYNC_OVERLAP,
+    SYNC_SLACK,
+    CursorExpired,
+    ScrollbackBuffer,
+    ScrollbackCursor,
+    ScrollbackStore,
+)
+
+
+class TestScrollbackCursor:
+    """Tests for ScrollbackCursor"""
+
+    def test_roundtrip(self):
+        token = ScrollbackCursor.for_page(1234, 5678, ["a", "b"]).encode()
+        cursor = ScrollbackCursor.decode(token)
+
+        assert (cursor.end, cursor.history_size, cursor.anchor_rows) == (1234, 5678, 2)
+        assert cursor.matches(["a", "b"])
+        assert not cursor.matches(["a", "c"])
+        assert "=" not in token
+
+    @pytest.mark.parametrize("token", ["", "!!!", "MToy", "Mjox", "MTotMTox", "//79"])
+    def test_rejects_malformed(self, token):
+        with pytest.raises(ValueError):
+            ScrollbackCursor.decode(token)
+
+
+def rows(prefix, count, first=0):
+    return [f"{prefix}{i}" for i in range(first, first + count)]
+
+
+class FakePane:
+    """tmux history stand-in: trims a tenth of `limit` when full, like tmux"""
+
+    def __init__(self, limit=1000):
+        self.limit = limit
+        self.history = []
+        self.seeds = 0
+        # Stands in for #{window_activity}; bumped on every output
+        self.activity = 0
+
+    def scroll(self, lines):
+        self.activity += 1
+        for line in lines:
+            if len(self.history) >= self.limit:
+                del self.history[:self.limit // 10]
+            self.history.append(line)
+
+    async def seed(self, target):
+        self.seeds += 1
+        await asyncio.sleep(0)
+        return ScrollbackBuffer(list(self.history), len(self.history), len(self.history))
+
+    async def sizes(self, targets):
+        return {target: (len(self.history), self.limit, self.activity) for target in targets}
+
+    async def tails(self, plans):
+        return {target: self.history[-count:] for target, count in plans.items()}
+
+
+class TestScrollbackBuffer:
+    """Tests for ScrollbackBuffer"""
+
+    def test_pages_and_tail(self):
+        buffer = ScrollbackBuffer(rows("r", 10), 10, 10)
+
+        first = buffer.page(4, None)
+        second = buffer.page(4, ScrollbackCursor.decode(first["cursor"]))
+
+        assert first["content"] == "r6\nr7\nr8\nr9"
+        assert (second["start"], second["end"]) == (2, 6)
+        assert buffer.page(4, ScrollbackCursor.for_page(2, 10, rows("r", 4, 2)))["cursor"] is None
+        assert buffer.tail(3) == ["r7", "r8", "r9"]
+        assert buffer.tail(None) == rows("r", 10)
+
+    def test_unanchored_cursor_defers_to_tmux(self):
+        buffer = ScrollbackBuffer(rows("r", 10), 10, 10)
+
+        # Issued by tmux after it trimmed: index 6 is not "x6" here
+        assert buffer.page(4, ScrollbackCursor.for_page(6, 10, rows("x", 4, 6))) is None
+
+    def test_trimmed_buffer_defers_to_tmux(self):
+        buffer = ScrollbackBuffer(rows("r", 10), 10, 10)
+        buffer.trim(1)
+
+        assert buffer.start == 1
+        assert buffer.tail(None) is None
+        assert buffer.tail(20) is None
+        assert buffer.page(4, ScrollbackCursor(3, 10)) is None
+
+    def test_future_cursor_expires(self):
+        buffer = ScrollbackBuffer(rows("r", 10), 10, 10)
+
+        with pytest.raises(CursorExpired):
+            buffer.page(4, ScrollbackCursor(5, 50))
+
+    def test_plan_sync(self):
+        buffer = ScrollbackBuffer(rows("r", 100), 100, 100)
+
+        assert buffer.plan_sync(100, 2000) == 0
+        assert buffer.plan_sync(130, 2000) == 30 + SYNC_OVERLAP + SYNC_SLACK
+        assert buffer.plan_sync(10, 2000) is None
+        # Near history-limit the size says nothing about what scrolled in
+        assert buffer.plan_sync(95, 110) == 95
+
+    def test_plan_sync_skips_quiet_pane_at_history_limit(self):
+        buffer = ScrollbackBuffer(rows("r", 100), 100, 100)
+        buffer.activity, buffer.synced_second = 50, 60
+
+        assert buffer.plan_sync(100, 105, 50) == 0
+        assert buffer.plan_sync(100, 105, 61) == 100
+        assert buffer.plan_sync(100, 105) == 100
+        # Output in the second the size was read leaves the activity as it was
+        buffer.synced_second = 50
+        assert buffer.plan_sync(100, 105, 50) == 100
+
+    def test_new_rows_lines_up_overlap(self):
+        buffer = ScrollbackBuffer(rows("r", 100), 100, 100)
+
+        assert buffer.new_rows(rows("r", 20, 80) + ["n0", "n1"]) == ["n0", "n1"]
+        # More scrolled in after the size was read
+        assert buffer.new_rows(rows("r", 18, 82) + ["n0", "n1", "n2", "n3"]) == ["n0", "n1", "n2", "n3"]
+        assert buffer.new_rows(["x", "y"]) is None
+
+    def test_new_rows_needs_whole_capture_to_line_up(self):
+        buffer = ScrollbackBuffer(rows("r", 10) + [""] * 8, 18, 18)
+
+        # The newest rows repeat the buffer's last eight, but r9 is not above them
+        assert buffer.new_rows(["r8", "r9"] + [""] * 8 + ["n0"] + [""] * 8) == ["n0"] + [""] * 8
+
+    def test_new_rows_rejects_ambiguous_overlap(self):
+        buffer = ScrollbackBuffer(rows("r", 10) + [""] * 20, 30, 30)
+
+        # As many blank rows scrolled in as were captured: no offset is certain
+        assert buffer.new_rows([""] * 12) is None
+
+
+class TestScrollbackStore:
+    """Tests for ScrollbackStore"""
+
+    @pytest.mark.asyncio
+    async def test_sync_follows_history_through_trimming(self):
+        pane = FakePane(limit=100)
+        pane.scroll(rows("a", 40))
+        store = ScrollbackStore(pane.seed, pane.sizes, pane.tails)
+        await store.get("main")
+
+        expected = rows("a", 40)
+        for batch in range(10):
+            new = rows(f"b{batch}_", 30)
+            pane.scroll(new)
+            expected += new
+            await store.sync(["main"])
+
+        buffer = await store.get("main")
+        assert list(buffer.lines) == expected
+        assert buffer.end == len(expected)
+        assert len(pane.history) < len(expected)
+        assert pane.seeds == 1
+
+    @pytest.mark.asyncio
+    async def test_quiet_pane_at_history_limit_is_not_recaptured(self):
+        pane = FakePane(limit=100)
+        pane.scroll(rows("a", 100))
+        tails = AsyncMock(side_effect=pane.tails)
+        store = ScrollbackStore(pane.seed, pane.sizes, tails)
+        await store.get("main")
+
+        pane.scroll(rows("b", 5))
+        await store.sync(["main"])
+        await store.sync(["main"])
+        await store.sync(["main"])
+
+        tails.assert_awaited_once()
+        assert list((await store.get("main")).lines)[-5:] == rows("b", 5)
+
+    @pytest.mark.asyncio
+    async def test_stale_buffer_syncs_on_read(self):
+        pane = FakePane()
+        pane.scroll(rows("a", 5))
+        tails = AsyncMock(side_effect=pane.tails)
+        store = ScrollbackStore(pane.seed, pane.sizes, tails)
+        await store.get("main")
+
+        pane.scroll(rows("b", 3))
+        store.mark_stale("main")
+        store.mark_stale("main")
+        store.mark_stale("unbuffered")
+        tails.assert_not_awaited()
+
+        buffer = await store.get("main")
+        await store.get("main")
+
+        assert list(buffer.lines) == rows("a", 5) + rows("b", 3)
+        tails.assert_awaited_once()
+        assert pane.seeds == 1
+
+    @pytest.mark.asyncio
+    async def test_cleared_history_drops_buffer(self):
+        pane = FakePane()
+        pane.scroll(rows("a", 50))
+        store = ScrollbackStore(pane.seed, pane.sizes, pane.tails)
+        await store.get("main")
+
+        pane.history = rows("c", 3)
+        await store.sync(["main"])
+
+        assert "main" not in store
+        assert store.bytes == 0
+
+    @pytest.mark.asyncio
+    async def test_seeding_is_single_flight(self):
+        pane = FakePane()
+        pane.scroll(rows("a", 5))
+        store = ScrollbackStore(pane.seed, pane.sizes, pane.tails)
+
+        first, second = await asyncio.gather(store.get("main"), store.get("main"))
+
+        assert first is second
+        assert pane.seeds == 1
+
+    @pytest.mark.asyncio
+    async def test_budget_evicts_least_recently_used(self):
+        pane = FakePane()
+        pane.scroll(rows("line", 10))
+        one_buffer = ScrollbackBuffer(list(pane.history), 10, 10).bytes
+        store = ScrollbackStore(pane.seed, pane.sizes, pane.tails, budget=one_buffer * 2)
+
+        await store.get("a")
+        await store.get("b")
+        await store.get("a")
+        await store.get("c")
+
+        assert "a" in store and "c" in store
+        assert "b" not in store
+        assert store.bytes <= one_buffer * 2
+
+    @pytest.mark.asyncio
+    async def test_budget_trims_single_buffer(self):
+        pane = FakePane()
+        pane.scroll(rows("line", 100))
+        store = ScrollbackStore(pane.seed, pane.sizes, pane.tails, budget=1000)
+
+        buffer = await store.get("a")
+
+        assert store.bytes == buffer.bytes <= 1000
+        assert buffer.lines[-1] == "line99"
+        assert not buffer.complete
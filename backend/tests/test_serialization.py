@@ -0,0 +1,28 @@
+"""Tests for the shared JSON encoder"""
+import json
+import pytest
+
+from app.models import ApiResponse, TmuxOutput
+from app.serialization import dumps, json_response
+
+
+class TestDumps:
+    """Tests for dumps / json_response"""
+
+    def test_compact_unicode_output(self):
+        assert dumps({"content": "héllo ✓", "n": 1}) == '{"content":"héllo ✓","n":1}'
+
+    def test_encodes_pydantic_models(self):
+        payload = {"data": TmuxOutput(content="x", timestamp="t", target="main")}
+
+        assert json.loads(dumps(payload)) == {"data": {"content": "x", "timestamp": "t", "target": "main"}}
+
+    def test_rejects_unknown_types(self):
+        with pytest.raises(TypeError):
+            dumps({"value": object()})
+
+    def test_json_response(self):
+        response = json_response(ApiResponse(success=True, message="ok", data={"sessions": ["a"]}))
+
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == {"success": True, "message": "ok", "data": {"sessions": ["a"]}}
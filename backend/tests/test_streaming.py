@@ -0,0 +1,75 @@
+"""Tests for streamed full-history bodies"""
+import gzip
+import json
+import pytest
+
+from app import streaming
+from app.streaming import gzip_chunks, ndjson_lines, prepend
+
+
+async def chunks_of(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(body):
+    return [part async for part in body]
+
+
+def records(parts):
+    return [json.loads(line) for line in b"".join(parts).splitlines()]
+
+
+class TestNdjsonLines:
+    """Tests for ndjson_lines"""
+
+    @pytest.mark.asyncio
+    async def test_lines_split_across_chunks(self):
+        # "é" split between chunks, a line split between chunks
+        data = "first\nsecond é\nthird\n".encode()
+        parts = await collect(ndjson_lines(chunks_of(data[:3], data[3:13], data[13:]), "main"))
+
+        result = records(parts)
+        assert result[0]["type"] == "start"
+        assert result[0]["target"] == "main"
+        assert result[1] == {"type": "lines", "lines": ["first", "second é", "third"]}
+        assert result[-1] == {"type": "end", "line_count": 3}
+
+    @pytest.mark.asyncio
+    async def test_trailing_blank_lines_dropped(self):
+        parts = await collect(ndjson_lines(chunks_of(b"a\n\nb\n\n\n", b"\n"), "main"))
+
+        assert records(parts)[1:] == [
+            {"type": "lines", "lines": ["a", "", "b"]},
+            {"type": "end", "line_count": 3},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_batches(self, monkeypatch):
+        monkeypatch.setattr(streaming, "NDJSON_BATCH_LINES", 2)
+        parts = await collect(ndjson_lines(chunks_of(b"1\n2\n3\n4\n5"), "main"))
+
+        batches = [r["lines"] for r in records(parts) if r["type"] == "lines"]
+        assert batches == [["1", "2"], ["3", "4"], ["5"]]
+
+    @pytest.mark.asyncio
+    async def test_error_mid_stream(self):
+        async def failing():
+            yield b"a\n"
+            raise RuntimeError("pipe broke")
+
+        result = records(await collect(ndjson_lines(failing(), "main")))
+
+        assert result[-1] == {"type": "error", "message": "pipe broke"}
+
+
+class TestGzipChunks:
+    """Tests for gzip_chunks / prepend"""
+
+    @pytest.mark.asyncio
+    async def test_roundtrip(self):
+        data = b"".join(f"line {i}\n".encode() for i in range(5000))
+        parts = await collect(gzip_chunks(prepend(data[:100], chunks_of(data[100:4000], data[4000:]))))
+
+        assert gzip.decompress(b"".join(parts)) == data
+        assert sum(len(part) for part in parts) < len(data) / 4
@@ -0,0 +1,292 @@
+"""Tests for the tmux control-mode client"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services import tmux_control
+from app.services.tmux_control import (
+    TmuxControlClient,
+    TmuxControlError,
+    TmuxControlUnavailable,
+    quote_tmux_arg,
+)
+from app.services.tmux_service import TmuxService
+
+
+class FakeControlProcess:
+    """Minimal stand-in for a `tmux -C attach-session` subprocess.
+
+    Each command line written to stdin is answered by `responder`, which
+    returns (ok, lines) or None to leave the command unanswered.
+    """
+
+    def __init__(self, responder=None, attach_ok=True):
+        self.stdout = asyncio.StreamReader()
+        self.stdin = self
+        self.returncode = None
+        self.commands = []
+        self.responder = responder or (lambda line: (True, []))
+        self._cmdnum = 100
+        self._block(attach_ok, [] if attach_ok else ["no sessions"], flags=0)
+        if not attach_ok:
+            self.exit()
+
+    def _block(self, ok, lines, flags=1):
+        self._cmdnum += 1
+        guard = f"1700000000 {self._cmdnum} {flags}"
+        out = [f"%begin {guard}", *lines, f"{'%end' if ok else '%error'} {guard}"]
+        self.stdout.feed_data(("\n".join(out) + "\n").encode())
+
+    def write(self, data):
+        for line in data.decode().splitlines():
+            self.commands.append(line)
+            reply = self.responder(line)
+            if reply is not None:
+                self._block(*reply)
+
+    async def drain(self):
+        pass
+
+    def exit(self):
+        self.stdout.feed_data(b"%exit\n")
+        self.stdout.feed_eof()
+        self.returncode = 0
+
+    def kill(self):
+        if self.returncode is None:
+            self.stdout.feed_eof()
+            self.returncode = -9
+
+    async def wait(self):
+        return self.returncode
+
+
+@pytest.fixture
+def fake_spawn():
+    """Patch subprocess creation to hand out FakeControlProcess instances"""
+    processes = []
+
+    def install(factory):
+        async def spawn(*args, **kwargs):
+            process = factory()
+            processes.append(process)
+            return process
+
+        return patch('asyncio.create_subprocess_exec', side_effect=spawn)
+
+    install.processes = processes
+    return install
+
+
+class TestQuoteTmuxArg:
+    """Tests for quote_tmux_arg"""
+
+    def test_plain(self):
+        assert quote_tmux_arg("capture-pane") == '"capture-pane"'
+
+    def test_escapes_parser_specials(self):
+        assert quote_tmux_arg('say "hi" $HOME \\') == '"say \\"hi\\" \\$HOME \\\\"'
+
+    def test_control_characters_become_octal(self):
+        assert quote_tmux_arg("a\nb\x1b") == '"a\\012b\\033"'
+
+    def test_semicolon_stays_literal(self):
+        assert quote_tmux_arg(";") == '";"'
+
+
+class TestTmuxControlClient:
+    """Tests for TmuxControlClient"""
+
+    @pytest.fixture
+    async def client(self):
+        client = TmuxControlClient()
+        yield client
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_execute_returns_block_output(self, client, fake_spawn):
+        with fake_spawn(lambda: FakeControlProcess(lambda line: (True, ["default", "work"]))):
+            result = await client.execute(["list-sessions", "-F", "#{session_name}"])
+
+        assert result == ("default\nwork\n", None, 0)
+        assert fake_spawn.processes[0].commands == ['"list-sessions" "-F" "#{session_name}"']
+
+    @pytest.mark.asyncio
+    async def test_execute_error_block(self, client, fake_spawn):
+        with fake_spawn(lambda: FakeControlProcess(lambda line: (False, ["can't find session: x"]))):
+            stdout, stderr, returncode = await client.execute(["has-session", "-t", "x"])
+
+        assert stdout is None
+        assert "can't find session" in stderr
+        assert returncode == 1
+
+    @pytest.mark.asyncio
+    async def test_empty_output(self, client, fake_spawn):
+        with fake_spawn(lambda: FakeControlProcess()):
+            assert await client.execute(["send-keys", "-t", "a", "Enter"]) == (None, None, 0)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_matched_in_order(self, client, fake_spawn):
+        with fake_spawn(lambda: FakeControlProcess(lambda line: (True, [line.split()[-1].strip('"')]))):
+            results = await asyncio.gather(
+                *[client.execute(["display-message", "-p", str(i)]) for i in range(20)]
+            )
+
+        assert [r[0] for r in results] == [f"{i}\n" for i in range(20)]
+        assert len(fake_spawn.processes) == 1
+
+    @pytest.mark.asyncio
+    async def test_foreign_blocks_and_notifications_ignored(self, client, fake_spawn):
+        def responder(line):
+            process = fake_spawn.processes[-1]
+            process.stdout.feed_data(b"%sessions-changed\n")
+            process._block(True, ["%end 1 2 1"], flags=0)
+            return (True, ["%end 1700000000 1 1", "real"])
+
+        with fake_spawn(lambda: FakeControlProcess(responder)):
+            stdout, _, _ = await client.execute(["capture-pane", "-p"])
+
+        assert stdout == "%end 1700000000 1 1\nreal\n"
+
+    @pytest.mark.asyncio
+    async def test_attach_failure_is_unavailable(self, client, fake_spawn):
+        with fake_spawn(lambda: FakeControlProcess(attach_ok=False)):
+            with pytest.raises(TmuxControlUnavailable):
+                await client.execute(["list-sessions"])
+            # Reconnects are throttled after a failure
+            with pytest.raises(TmuxControlUnavailable):
+                await client.execute(["list-sessions"])
+
+        assert len(fake_spawn.processes) == 1
+
+    @pytest.mark.asyncio
+    async def test_reconnects_after_server_restart(self, client, fake_spawn):
+        with fake_spawn(lambda: FakeControlProcess(lambda line: (True, ["ok"]))):
+            await client.execute(["list-sessions"])
+            fake_spawn.processes[0].exit()
+            await asyncio.sleep(0)
+            assert client.connected is False
+
+            stdout, _, _ = await client.execute(["list-sessions"])
+
+        assert stdout == "ok\n"
+        assert len(fake_spawn.processes) == 2
+
+    @pytest.mark.asyncio
+    async def test_unstarted_command_is_unavailable_on_exit(self, client, fake_spawn):
+        def responder(line):
+            fake_spawn.processes[-1].exit()
+            return None
+
+        with fake_spawn(lambda: FakeControlProcess(responder)):
+            with pytest.raises(TmuxControlUnavailable):
+                await client.execute(["list-sessions"])
+
+    @pytest.mark.asyncio
+    async def test_started_command_is_error_on_exit(self, client, fake_spawn):
+        def responder(line):
+            process = fake_spawn.processes[-1]
+            process.stdout.feed_data(b"%begin 1700000000 1 1\n")
+            process.exit()
+            return None
+
+        with fake_spawn(lambda: FakeControlProcess(responder)):
+            with pytest.raises(TmuxControlError):
+                await client.execute(["kill-server"])
+
+    @pytest.mark.asyncio
+    async def test_timeout_drops_connection(self, client, fake_spawn):
+        with patch.object(tmux_control, 'COMMAND_TIMEOUT', 0.01):
+            with fake_spawn(lambda: FakeControlProcess(lambda line: None)):
+                with pytest.raises(TmuxControlError):
+                    await client.execute(["list-sessions"])
+
+        assert client.connected is False
+
+    @pytest.mark.asyncio
+    async def test_socket_path_passed_to_attach(self, fake_spawn):
+        client = TmuxControlClient("/tmp/tmux-test/sock")
+        with fake_spawn(lambda: FakeControlProcess()) as mock_exec:
+            await client.execute(["list-sessions"])
+            await client.close()
+
+        args = mock_exec.call_args[0]
+        assert args[:5] == ("tmux", "-S", "/tmp/tmux-test/sock", "-C", "attach-session")
+
+
+class TestTmuxServiceControlMode:
+    """Tests for TmuxService routing through the control client"""
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        monkeypatch.setenv("TMUX_CONTROL_MODE", "1")
+        service = TmuxService()
+        service._control = AsyncMock()
+        return service
+
+    def test_disabled_by_default(self, monkeypatch):
+        monkeypatch.delenv("TMUX_CONTROL_MODE", raising=False)
+        assert TmuxService()._control is None
+
+    def test_shared_client_per_socket(self, monkeypatch):
+        monkeypatch.setenv("TMUX_CONTROL_MODE", "1")
+        assert TmuxService()._control is TmuxService()._control
+
+    @pytest.mark.asyncio
+    async def test_commands_use_control_client(self, service, mock_subprocess):
+        mock_exec, _ = mock_subprocess
+        service._control.execute.return_value = (None, None, 0)
+
+        result = await service.session_exists("default")
+
+        assert result is True
+        service._control.execute.assert_called_once_with(["has-session", "-t", "default"])
+        mock_exec.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_subprocess_when_unavailable(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+        service._control.execute.side_effect = TmuxControlUnavailable("no server")
+
+        result = await service.session_exists("default")
+
+        assert result is True
+        mock_exec.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_send_input_pipelined_in_order(self, service, mock_subprocess):
+        mock_exec, _ = mock_subprocess
+        service._control.execute.return_value = (None, None, 0)
+
+        result = await service.send_input("default", [("text", "ls;"), ("key", "Enter")])
+
+        assert result is True
+        assert [c.args[0] for c in service._control.execute.call_args_list] == [
+            ["send-keys", "-t", "default", "-l", "--", "ls;"],
+            ["send-keys", "-t", "default", "Enter"],
+        ]
+        mock_exec.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_send_input_falls_back_only_if_nothing_sent(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+        service._control.execute.side_effect = [(None, None, 0), TmuxControlError("connection lost")]
+
+        assert await service.send_input("default", [("text", "ls"), ("key", "Enter")]) is False
+        mock_exec.assert_not_called()
+
+        service._control.execute.side_effect = TmuxControlUnavailable("no server")
+        assert await service.send_input("default", [("text", "ls"), ("key", "Enter")]) is True
+        mock_exec.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_no_fallback_after_command_sent(self, service, mock_subprocess):
+        mock_exec, _ = mock_subprocess
+        service._control.execute.side_effect = TmuxControlError("connection lost")
+
+        result = await service.send_command("ls", "default")
+
+        assert result is False
+        mock_exec.assert_not_called()
@@ -1,12 +1,16 @@
+import asyncio
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+from app.services.scrollback import CursorExpired
+from app.services.tmux_topology import parse_pane_records
 from app.services.tmux_service import (
     TmuxService,
     validate_tmux_target,
     validate_tmux_name,
     MAX_TARGET_LENGTH,
     MAX_COMMAND_LENGTH,
+    MAX_INPUT_ITEMS,
 )
 
 
@@ -29,6 +33,11 @@ class TestValidateTmuxTarget:
         assert validate_tmux_target("session:window.pane") is True
         assert validate_tmux_target("my-session:my-window.0") is True
 
+    def test_valid_pane_id(self):
+        assert validate_tmux_target("%3") is True
+        assert validate_tmux_target("%") is False
+        assert validate_tmux_target("%3:0") is False
+
     def test_invalid_empty(self):
         assert validate_tmux_target("") is False
         assert validate_tmux_target(None) is False
@@ -128,15 +137,53 @@ class TestTmuxService:
 
         assert result is False
 
+    @pytest.mark.asyncio
+    async def test_send_input_single_chained_call(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+
+        result = await service.send_input("default", [
+            ("text", "git commit -m "), ("text", "'-wip;'"), ("key", "Enter"),
+            ("key", "Escape"), ("text", "ls;"),
+        ])
+
+        assert result is True
+        mock_exec.assert_called_once()
+        assert list(mock_exec.call_args.args) == [
+            "tmux", "send-keys", "-t", "default", "-l", "--", "git commit -m '-wip;'",
+            ";", "send-keys", "-t", "default", "Enter", "Escape",
+            ";", "send-keys", "-t", "default", "-l", "--", "ls\\;",
+        ]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("items", [
+        [],
+        [("key", "Enter")] * (MAX_INPUT_ITEMS + 1),
+        [("key", "C-c Enter")],
+        [("text", "a" * (MAX_COMMAND_LENGTH + 1))],
+        [("mouse", "x")],
+    ])
+    async def test_send_input_rejects_bad_batches(self, service, mock_subprocess, items):
+        mock_exec, _ = mock_subprocess
+
+        assert await service.send_input("default", items) is False
+        mock_exec.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_send_input_failure(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 1
+        mock_process.communicate = AsyncMock(return_value=(b"", b"can't find pane: gone"))
+
+        assert await service.send_input("gone", [("key", "Enter")]) is False
+
     @pytest.mark.asyncio
     async def test_get_output_success(self, service, mock_subprocess):
         mock_exec, mock_process = mock_subprocess
         mock_process.returncode = 0
         mock_process.communicate = AsyncMock(return_value=(b"terminal output", b""))
 
-        # Mock session_exists to return True
-        with patch.object(service, 'session_exists', AsyncMock(return_value=True)):
-            result = await service.get_output("default")
+        result = await service.get_output("default")
 
         assert result == "terminal output"
 
@@ -148,19 +195,72 @@ class TestTmuxService:
 
     @pytest.mark.asyncio
     async def test_get_output_session_not_found(self, service, mock_subprocess):
-        with patch.object(service, 'session_exists', AsyncMock(return_value=False)):
-            result = await service.get_output("nonexistent")
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 1
+        mock_process.communicate = AsyncMock(return_value=(b"", b"can't find pane: nonexistent"))
+
+        result = await service.get_output("nonexistent")
 
         assert result == "Session not found"
 
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("target,stderr", [
+        ("gone:1", "can't find session: gone"),
+        ("default", "no server running on /tmp/tmux-0/default"),
+        ("default", "error connecting to /tmp/tmux-0/default (No such file or directory)"),
+    ])
+    async def test_get_output_missing_session_errors(self, service, mock_subprocess, target, stderr):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 1
+        mock_process.communicate = AsyncMock(return_value=(b"", stderr.encode()))
+
+        assert await service.get_output(target) == "Session not found"
+
+    @pytest.mark.asyncio
+    async def test_get_output_missing_window_is_error(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 1
+        mock_process.communicate = AsyncMock(return_value=(b"", b"can't find window: 5"))
+
+        result = await service.get_output("default:5")
+
+        assert result == "Error: can't find window: 5"
+
+    @pytest.mark.asyncio
+    async def test_get_output_single_command(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+        mock_process.communicate = AsyncMock(return_value=(b"terminal output", b""))
+
+        await service.get_output("default")
+
+        mock_exec.assert_called_once()
+        assert "capture-pane" in mock_exec.call_args[0]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_get_output_shares_one_capture(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+        mock_process.communicate = AsyncMock(return_value=(b"terminal output", b""))
+
+        results = await asyncio.gather(
+            service.get_output("default"), service.get_output("default"),
+            service.get_output("default", include_history=True),
+        )
+        await service.get_output("default")
+
+        assert results == ["terminal output"] * 3
+        # One capture for the two identical reads, one for history, one later
+        assert mock_exec.call_count == 3
+        assert service._output_captures == {}
+
     @pytest.mark.asyncio
     async def test_get_output_with_history(self, service, mock_subprocess):
         mock_exec, mock_process = mock_subprocess
         mock_process.returncode = 0
         mock_process.communicate = AsyncMock(return_value=(b"history output", b""))
 
-        with patch.object(service, 'session_exists', AsyncMock(return_value=True)):
-            result = await service.get_output("default", include_history=True)
+        result = await service.get_output("default", include_history=True)
 
         assert result == "history output"
         # Verify -S flag was used
@@ -173,24 +273,352 @@ class TestTmuxService:
         mock_process.returncode = 0
         mock_process.communicate = AsyncMock(return_value=(b"limited output", b""))
 
-        with patch.object(service, 'session_exists', AsyncMock(return_value=True)):
-            result = await service.get_output("default", include_history=True, lines=500)
+        result = await service.get_output("default", include_history=True, lines=500)
 
         assert result == "limited output"
         # Verify lines flag was used
         call_args = mock_exec.call_args[0]
         assert "-500" in call_args
 
+    @pytest.mark.asyncio
+    async def test_capture_targets_single_invocation(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+
+        def chained_output(*args, **kwargs):
+            tokens = [a for a in mock_exec.call_args[0] if ':' in a and a.split(':')[1].isdigit()
+                      and len(a.split(':')[0]) == 16]
+            out = f"one\n{tokens[0]}\ntwo\nlines\n{tokens[1]}\n"
+            return (out.encode(), b"")
+
+        mock_process.communicate = AsyncMock(side_effect=chained_output)
+
+        result = await service.capture_targets(["default", "work:1"])
+
+        assert result == {"default": "one", "work:1": "two\nlines"}
+        mock_exec.assert_called_once()
+        args = mock_exec.call_args[0]
+        assert args.count("capture-pane") == 2
+        assert ";" in args
+
+    @pytest.mark.asyncio
+    async def test_capture_targets_retries_after_failed_target(self, service):
+        calls = []
+
+        async def fake_execute(cmd):
+            calls.append(cmd)
+            marker = cmd[cmd.index("display-message") + 2]
+            if len(calls) == 1:
+                # First target captured, second missing: tmux stops the chain
+                return f"first\n{marker}\n", "can't find session: gone", 1
+            return f"third\n{marker}\n", None, 0
+
+        with patch.object(service, '_execute_tmux_command', fake_execute):
+            result = await service.capture_targets(["default", "gone:0", "work"])
+
+        assert result == {"default": "first", "gone:0": "Session not found", "work": "third"}
+        assert len(calls) == 2
+        assert calls[1].count("capture-pane") == 1
+
+    @pytest.mark.asyncio
+    async def test_capture_targets_no_server(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 1
+        mock_process.communicate = AsyncMock(return_value=(b"", b"no server running on /tmp/tmux-0/default"))
+
+        result = await service.capture_targets(["a", "b", "c"])
+
+        assert result == {"a": "Session not found", "b": "Session not found", "c": "Session not found"}
+        mock_exec.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_probe_targets(self, service):
+        calls = []
+
+        async def fake_execute(cmd):
+            calls.append(cmd)
+            marker = cmd[cmd.index(";") + 3]
+            # First probe succeeds, second target is missing: tmux stops the chain
+            return f"1700000000 12 3,4 %1 80x24 0\n{marker}\n", "can't find session: gone", 1
+
+        with patch.object(service, '_execute_tmux_command', fake_execute):
+            result = await service.probe_targets(["default", "gone:1"])
+
+        assert result == {"default": ("1700000000 12 3,4 %1 80x24 0", 1700000000), "gone:1": None}
+        assert len(calls) == 1
+        assert calls[0][1:5] == ["display-message", "-p", "-t", "default"]
+
+    @pytest.mark.asyncio
+    async def test_probe_targets_rejects_empty_formats(self, service):
+        async def fake_execute(cmd):
+            marker = cmd[cmd.index(";") + 3]
+            # tmux can answer for a vanished target with every field empty
+            return f"  ,  x \n{marker}\n", "", 0
+
+        with patch.object(service, '_execute_tmux_command', fake_execute):
+            result = await service.probe_targets(["gone"])
+
+        assert result == {"gone": None}
+
+    @staticmethod
+    def fake_scrollback(history, limit=2000):
+        """_execute_sequence stand-in for a pane whose history is `history` (oldest first)"""
+        calls = []
+
+        async def execute_sequence(commands):
+            calls.append(commands)
+            size = (f"{len(history)} {limit}\n", None, 0)
+            capture = commands[1]
+            first = int(capture[capture.index("-S") + 1]) + len(history)
+            last = int(capture[capture.index("-E") + 1]) + len(history)
+            rows = history[max(0, first):max(0, last + 1)]
+            return [size, ("".join(f"{row}\n" for row in rows), None, 0), size]
+
+        return execute_sequence, calls
+
+    @pytest.mark.asyncio
+    async def test_scrollback_pages_follow_cursor(self, service):
+        history = [f"row{i}" for i in range(250)]
+        execute_sequence, calls = self.fake_scrollback(history)
+
+        with patch.object(service, '_execute_sequence', execute_sequence):
+            first = await service.get_scrollback_page("default", lines=100)
+            # New output scrolls in between pages
+            history.extend(f"new{i}" for i in range(30))
+            second = await service.get_scrollback_page("default", lines=100, cursor=first["cursor"])
+            third = await service.get_scrollback_page("default", lines=100, cursor=second["cursor"])
+
+        assert (first["start"], first["end"]) == (150, 250)
+        assert first["content"].split("\n")[0] == "row150"
+        assert second["content"].split("\n") == [f"row{i}" for i in range(50, 150)]
+        assert second["history_size"] == 280
+        assert third["content"].split("\n") == [f"row{i}" for i in range(50)]
+        assert third["cursor"] is None
+        # The second page was first captured at the cursor's history size
+        # and re-captured once the new size was seen
+        assert len(calls) == 4
+        assert calls[0][1][-4:] == ["-S", "-100", "-E", "-1"]
+
+    @pytest.mark.asyncio
+    async def test_scrollback_empty_history(self, service):
+        execute_sequence, _ = self.fake_scrollback([])
+
+        with patch.object(service, '_execute_sequence', execute_sequence):
+            page = await service.get_scrollback_page("default")
+
+        assert page == {"content": "", "start": 0, "end": 0, "history_size": 0, "cursor": None}
+
+    @pytest.mark.asyncio
+    async def test_scrollback_cleared_history_expires_cursor(self, service):
+        history = [f"row{i}" for i in range(300)]
+        execute_sequence, _ = self.fake_scrollback(history)
+
+        with patch.object(service, '_execute_sequence', execute_sequence):
+            page = await service.get_scrollback_page("default", lines=100)
+            history.clear()
+            with pytest.raises(CursorExpired):
+                await service.get_scrollback_page("default", cursor=page["cursor"])
+
+    @staticmethod
+    def scroll(history, lines, limit):
+        """Append rows like tmux: a tenth of history-limit is dropped when it is full"""
+        for line in lines:
+            if len(history) >= limit:
+                del history[:limit // 10]
+            history.append(line)
+
+    @pytest.mark.asyncio
+    async def test_scrollback_cursor_survives_trim_at_history_limit(self, service):
+        history = [f"row{i}" for i in range(100)]
+        execute_sequence, _ = self.fake_scrollback(history, limit=100)
+
+        with patch.object(service, '_execute_sequence', execute_sequence):
+            first = await service.get_scrollback_page("default", lines=20)
+            # tmux trims 20 of the oldest rows while these scroll in
+            self.scroll(history, [f"N{i}" for i in range(12)], limit=100)
+            second = await service.get_scrollback_page("default", lines=20, cursor=first["cursor"])
+
+        assert first["content"].split("\n") == [f"row{i}" for i in range(80, 100)]
+        assert second["content"].split("\n") == [f"row{i}" for i in range(60, 80)]
+        assert (second["start"], second["end"]) == (40, 60)
+
+    @pytest.mark.asyncio
+    async def test_scrollback_cursor_trimmed_away_expires(self, service):
+        history = [f"row{i}" for i in range(100)]
+        execute_sequence, _ = self.fake_scrollback(history, limit=100)
+
+        with patch.object(service, '_execute_sequence', execute_sequence):
+            first = await service.get_scrollback_page("default", lines=20)
+            self.scroll(history, [f"N{i}" for i in range(95)], limit=100)
+            with pytest.raises(CursorExpired):
+                await service.get_scrollback_page("default", lines=20, cursor=first["cursor"])
+
+    @pytest.mark.asyncio
+    async def test_scrollback_errors(self, service):
+        async def missing(commands):
+            return [(None, "can't find pane: gone", 1)] * 3
+
+        with pytest.raises(ValueError):
+            await service.get_scrollback_page("bad;target")
+        with pytest.raises(ValueError):
+            await service.get_scrollback_page("default", cursor="not-a-cursor")
+        with patch.object(service, '_execute_sequence', missing):
+            with pytest.raises(LookupError):
+                await service.get_scrollback_page("gone")
+
+    @pytest.mark.asyncio
+    async def test_history_sizes_and_tails(self, service):
+        async def fake_per_target(targets, make_args):
+            commands = {target: make_args(target) for target in targets}
+            if commands["default"][0] == "display-message":
+                return {"default": ("120 2000 1760000000\n", None, 0), "gone": (None, "can't find pane: gone", 1)}
+            return {"default": ("a\nb\n", None, 0), "gone": (None, "can't find pane: gone", 1)}
+
+        with patch.object(service, '_execute_per_target', fake_per_target):
+            sizes = await service.history_sizes(["default", "gone"])
+            tails = await service.capture_history_tails({"default": 2, "gone": 5})
+
+        assert sizes == {"default": (120, 2000, 1760000000), "gone": None}
+        assert tails == {"default": ["a", "b"], "gone": None}
+
+    @pytest.mark.asyncio
+    async def test_capture_pane_tails(self, service):
+        records = "".join(f"$0\tmain\t{w}\tbash\t1\t1\t%{w}\t0\t1\t80\t24\tbash\n" for w in range(3))
+        calls = []
+
+        async def fake_per_target(targets, make_args):
+            calls.append([make_args(target) for target in targets])
+            return {"%0": ("one\ntwo  \nthree\n\n\n", None, 0), "%1": ("\n\n", None, 0),
+                    "%2": (None, "can't find pane: %2", 1)}
+
+        with patch.object(service, '_list_pane_records', AsyncMock(return_value=parse_pane_records(records))), \
+                patch.object(service, '_execute_per_target', fake_per_target):
+            tails = await service.capture_pane_tails(2)
+
+        assert tails == {"main:0.0": ["two", "three"], "main:1.0": []}
+        assert calls == [[["capture-pane", "-p", "-t", f"%{w}"] for w in range(3)]]
+
+    @pytest.mark.asyncio
+    async def test_resolve_pane_ids(self, service):
+        records = "$0\tmain\t0\tbash\t1\t1\t%4\t0\t1\t80\t24\tbash\n"
+        calls = []
+
+        async def fake_per_target(targets, make_args):
+            calls.append(list(targets))
+            return {"ma": ("%4\n", None, 0), "gone": (None, "can't find session: gone", 1)}
+
+        with patch.object(service, '_list_pane_records', AsyncMock(return_value=parse_pane_records(records))), \
+                patch.object(service, '_execute_per_target', fake_per_target):
+            first = await service.resolve_pane_ids(["main", "main:0.0", "ma", "gone", "bad target"])
+            second = await service.resolve_pane_ids(["ma", "gone"])
+
+        assert first == {"main": "%4", "main:0.0": "%4", "ma": "%4", "gone": None, "bad target": None}
+        assert second == {"ma": "%4", "gone": None}
+        # Only what the snapshot cannot answer goes to tmux, once per snapshot
+        assert calls == [["ma", "gone"]]
+
+    @pytest.mark.asyncio
+    async def test_seed_scrollback(self, service):
+        execute_sequence, _ = self.fake_scrollback([f"row{i}" for i in range(30)])
+
+        with patch.object(service, '_execute_sequence', execute_sequence):
+            buffer = await service.seed_scrollback("default", lines=20)
+
+        assert (buffer.start, buffer.end, buffer.history_size) == (10, 30, 30)
+        assert buffer.lines[0] == "row10"
+        assert not buffer.complete
+
+    @pytest.mark.asyncio
+    async def test_stream_history_reads_incrementally(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.stdout.read = AsyncMock(side_effect=[b"one\n", b"two\n", b""])
+        mock_process.wait = AsyncMock(return_value=0)
+
+        chunks = [chunk async for chunk in service.stream_history("default", chunk_size=4)]
+
+        assert chunks == [b"one\n", b"two\n"]
+        args = mock_exec.call_args[0]
+        assert args[args.index("-S") + 1] == "-"
+        mock_process.stdout.read.assert_called_with(4)
+
+    @pytest.mark.asyncio
+    async def test_stream_history_missing_session(self, service, mock_subprocess):
+        _, mock_process = mock_subprocess
+        mock_process.returncode = None
+        mock_process.stdout.read = AsyncMock(return_value=b"")
+        mock_process.stderr.read = AsyncMock(return_value=b"can't find session: gone")
+
+        async def wait():
+            mock_process.returncode = 1
+            return 1
+        mock_process.wait = AsyncMock(side_effect=wait)
+
+        with pytest.raises(LookupError):
+            async for _ in service.stream_history("gone:0"):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_capture_targets_invalid_target(self, service, mock_subprocess):
+        mock_exec, _ = mock_subprocess
+
+        result = await service.capture_targets(["bad;target"])
+
+        assert result == {"bad;target": "Error: Invalid target format"}
+        mock_exec.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_get_sessions_success(self, service, mock_subprocess):
         mock_exec, mock_process = mock_subprocess
         mock_process.returncode = 0
-        mock_process.communicate = AsyncMock(return_value=(b"default\ntest-session\n", b""))
+        mock_process.communicate = AsyncMock(return_value=(
+            b"$0\tdefault\t0\tbash\t1\t1\t%0\t0\t1\t80\t24\tbash\n"
+            b"$1\ttest-session\t0\tbash\t1\t1\t%1\t0\t1\t80\t24\tbash\n",
+            b""
+        ))
 
         result = await service.get_sessions()
 
         assert result == ["default", "test-session"]
 
+    @pytest.mark.asyncio
+    async def test_sessions_and_hierarchy_share_cached_snapshot(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+        mock_process.communicate = AsyncMock(return_value=(
+            b"$0\tdefault\t0\tbash\t1\t1\t%0\t0\t1\t80\t24\tbash\n", b""
+        ))
+
+        assert await service.get_sessions() == ["default"]
+        assert "default" in await service.get_hierarchy()
+        assert await service.get_sessions() == ["default"]
+
+        assert mock_exec.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_mutation_invalidates_topology(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+        mock_process.communicate = AsyncMock(return_value=(
+            b"$0\tdefault\t0\tbash\t1\t1\t%0\t0\t1\t80\t24\tbash\n", b""
+        ))
+        await service.get_sessions()
+
+        await service.create_session("new-session")
+        await service.get_sessions()
+
+        # list-panes, new-session, list-panes
+        assert mock_exec.call_count == 3
+
+    def test_topology_listeners(self, service):
+        listener = MagicMock()
+        service.add_topology_listener(listener)
+
+        service.invalidate_topology()
+        service._on_control_notification("%window-renamed @1 logs")
+        service._on_control_notification("%output %1 hello")
+
+        assert listener.call_count == 2
+
     @pytest.mark.asyncio
     async def test_get_sessions_empty(self, service, mock_subprocess):
         mock_exec, mock_process = mock_subprocess
@@ -259,7 +687,11 @@ class TestTmuxService:
     async def test_get_windows_success(self, service, mock_subprocess):
         mock_exec, mock_process = mock_subprocess
         mock_process.returncode = 0
-        mock_process.communicate = AsyncMock(return_value=(b"0|bash|1|1\n1|vim|0|1\n", b""))
+        mock_process.communicate = AsyncMock(return_value=(
+            b"$0\tdefault\t0\tbash\t1\t1\t%0\t0\t1\t80\t24\tbash\n"
+            b"$0\tdefault\t1\tvim\t0\t1\t%1\t0\t1\t80\t24\tvim\n",
+            b""
+        ))
 
         result = await service.get_windows("default")
 
@@ -281,7 +713,9 @@ class TestTmuxService:
     async def test_get_panes_success(self, service, mock_subprocess):
         mock_exec, mock_process = mock_subprocess
         mock_process.returncode = 0
-        mock_process.communicate = AsyncMock(return_value=(b"0|1|bash|80x24\n", b""))
+        mock_process.communicate = AsyncMock(return_value=(
+            b"$0\tdefault\t0\tbash\t1\t1\t%0\t0\t1\t80\t24\tbash\n", b""
+        ))
 
         result = await service.get_panes("default", "0")
 
@@ -401,17 +835,45 @@ class TestTmuxService:
         mock_exec, mock_process = mock_subprocess
         mock_process.returncode = 0
 
-        # Mock the necessary methods
-        with patch.object(service, 'get_sessions', AsyncMock(return_value=["default"])):
-            with patch.object(service, 'get_windows', AsyncMock(return_value=[
-                {"index": "0", "name": "bash", "active": True, "pane_count": 1}
-            ])):
-                with patch.object(service, 'get_panes', AsyncMock(return_value=[
-                    {"index": "0", "active": True, "command": "bash", "size": "80x24"}
-                ])):
-                    result = await service.get_hierarchy()
+        mock_process.communicate = AsyncMock(return_value=(
+            b"$0\tdefault\t0\tbash\t1\t1\t%0\t0\t1\t80\t24\tbash\n", b""
+        ))
+
+        result = await service.get_hierarchy()
 
         assert "default" in result
         assert result["default"]["name"] == "default"
         assert "0" in result["default"]["windows"]
 
+    @pytest.mark.asyncio
+    async def test_get_hierarchy_single_tmux_call(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 0
+        mock_process.communicate = AsyncMock(return_value=(
+            b"$0\tdefault\t0\tbash\t1\t2\t%0\t0\t1\t80\t12\tbash\n"
+            b"$0\tdefault\t0\tbash\t1\t2\t%1\t1\t0\t80\t11\tvim\n"
+            b"$1\twork\t0\tzsh\t1\t1\t%2\t0\t1\t120\t40\tzsh\n",
+            b""
+        ))
+
+        result = await service.get_hierarchy()
+
+        assert mock_exec.call_count == 1
+        call_args = mock_exec.call_args[0]
+        assert "list-panes" in call_args
+        assert "-a" in call_args
+        assert list(result) == ["default", "work"]
+        window = result["default"]["windows"]["0"]
+        assert window["pane_count"] == 2
+        assert window["panes"]["1"] == {"index": "1", "active": False, "command": "vim", "size": "80x11"}
+
+    @pytest.mark.asyncio
+    async def test_get_hierarchy_no_server(self, service, mock_subprocess):
+        mock_exec, mock_process = mock_subprocess
+        mock_process.returncode = 1
+        mock_process.communicate = AsyncMock(return_value=(b"", b"no server running"))
+
+        result = await service.get_hierarchy()
+
+        assert result == {}
+
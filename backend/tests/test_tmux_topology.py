@@ -0,0 +1,236 @@
+"""Tests for tmux topology records and cache"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from app.services.tmux_topology import (
+    PANE_FORMAT,
+    PaneRecord,
+    TopologyCache,
+    TopologySnapshot,
+    build_hierarchy,
+    parse_pane_records,
+    window_summaries,
+)
+
+ROWS = (
+    "$0\tdefault\t0\tbash\t1\t2\t%0\t0\t1\t80\t12\tbash\n"
+    "$0\tdefault\t0\tbash\t1\t2\t%1\t1\t0\t80\t11\tpython3\n"
+    "$0\tdefault\t1\tlogs\t0\t1\t%2\t0\t1\t80\t24\ttail\n"
+)
+
+
+class TestPaneRecord:
+    """Tests for PaneRecord parsing"""
+
+    def test_format_field_count_matches_parser(self):
+        assert len(PANE_FORMAT.split("\t")) == len(PaneRecord.__slots__)
+
+    def test_parse(self):
+        record = PaneRecord.parse("$3\twork\t2\teditor\t1\t1\t%7\t0\t1\t120\t40\tvim")
+
+        assert record.session_id == "$3"
+        assert record.session_name == "work"
+        assert record.window_index == "2"
+        assert record.window_active is True
+        assert record.pane_id == "%7"
+        assert record.size == "120x40"
+        assert record.command == "vim"
+
+    def test_command_may_contain_tabs(self):
+        record = PaneRecord.parse("$0\ts\t0\tw\t1\t1\t%0\t0\t1\t80\t24\ta\tb")
+
+        assert record.command == "a\tb"
+
+    def test_malformed_row(self):
+        assert PaneRecord.parse("0|bash|1|1") is None
+
+    def test_no_instance_dict(self):
+        record = PaneRecord.parse("$0\ts\t0\tw\t1\t1\t%0\t0\t1\t80\t24\tbash")
+
+        assert not hasattr(record, "__dict__")
+
+
+class TestTopologyHelpers:
+    """Tests for hierarchy and window helpers"""
+
+    def test_parse_skips_blank_and_malformed(self):
+        records = parse_pane_records(ROWS + "\ngarbage\n")
+
+        assert [r.pane_id for r in records] == ["%0", "%1", "%2"]
+
+    def test_parse_empty(self):
+        assert parse_pane_records(None) == []
+
+    def test_window_summaries(self):
+        windows = window_summaries(parse_pane_records(ROWS))
+
+        assert windows == [
+            {"index": "0", "name": "bash", "active": True, "pane_count": 2},
+            {"index": "1", "name": "logs", "active": False, "pane_count": 1},
+        ]
+
+    def test_build_hierarchy(self):
+        hierarchy = build_hierarchy(parse_pane_records(ROWS))
+
+        session = hierarchy["default"]
+        assert session["name"] == "default"
+        assert list(session["windows"]) == ["0", "1"]
+        assert session["windows"]["0"]["panes"]["1"] == {
+            "index": "1", "active": False, "command": "python3", "size": "80x11"
+        }
+
+
+class TestTopologySnapshotResolve:
+    """Tests for resolving targets to pane ids from a snapshot"""
+
+    @pytest.fixture
+    def snapshot(self):
+        return TopologySnapshot(parse_pane_records(ROWS))
+
+    @pytest.mark.parametrize("target", ["default", "default:", "default:0", "default:0.0", "default:bash.0"])
+    def test_spellings_of_one_pane(self, snapshot, target):
+        assert snapshot.resolve(target) == "%0"
+
+    def test_pane_and_window(self, snapshot):
+        assert snapshot.resolve("default:0.1") == "%1"
+        assert snapshot.resolve("default:logs") == "%2"
+        assert snapshot.resolve("%2") == "%2"
+
+    @pytest.mark.parametrize("target", ["%9", "other", "default:5", "default:0.7", "def", "0", "bash"])
+    def test_unknown_or_ambiguous_left_to_tmux(self, snapshot, target):
+        assert snapshot.resolve(target) is None
+
+
+class TestTopologyCache:
+    """Tests for TopologyCache"""
+
+    @pytest.fixture
+    def loader(self):
+        return AsyncMock(return_value=parse_pane_records(ROWS))
+
+    @pytest.mark.asyncio
+    async def test_snapshot_fields(self, loader):
+        snapshot = await TopologyCache(loader).get()
+
+        assert snapshot.sessions == ["default"]
+        assert list(snapshot.hierarchy["default"]["windows"]) == ["0", "1"]
+
+    @pytest.mark.asyncio
+    async def test_reuses_snapshot_within_ttl(self, loader):
+        cache = TopologyCache(loader, ttl=60)
+
+        first = await cache.get()
+        second = await cache.get()
+
+        assert first is second
+        loader.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_refreshes_after_ttl(self, loader):
+        cache = TopologyCache(loader, ttl=0)
+
+        await cache.get()
+        await cache.get()
+
+        assert loader.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_refresh(self):
+        release = asyncio.Event()
+        calls = 0
+
+        async def slow_loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return parse_pane_records(ROWS)
+
+        cache = TopologyCache(slow_loader, ttl=60)
+        waiters = [asyncio.ensure_future(cache.get()) for _ in range(10)]
+        await asyncio.sleep(0)
+        release.set()
+        snapshots = await asyncio.gather(*waiters)
+
+        assert calls == 1
+        assert all(s is snapshots[0] for s in snapshots)
+
+    @pytest.mark.asyncio
+    async def test_invalidate_forces_refresh(self, loader):
+        cache = TopologyCache(loader, ttl=60)
+
+        await cache.get()
+        cache.invalidate()
+        await cache.get()
+
+        assert loader.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_refresh_started_before_invalidate_is_not_reused(self):
+        release = asyncio.Event()
+        results = [parse_pane_records(ROWS), []]
+
+        async def loader():
+            result = results.pop(0)
+            if result:
+                await release.wait()
+            return result
+
+        cache = TopologyCache(loader, ttl=60)
+        stale = asyncio.ensure_future(cache.get())
+        await asyncio.sleep(0)
+        cache.invalidate()
+        fresh = await cache.get()
+        release.set()
+        await stale
+
+        assert fresh.sessions == []
+        assert (await cache.get()) is fresh
+
+    @pytest.mark.asyncio
+    async def test_version_change_forces_refresh(self, loader):
+        version = 0
+        cache = TopologyCache(loader, ttl=60, version=lambda: version)
+
+        await cache.get()
+        version += 1
+        await cache.get()
+        await cache.get()
+
+        assert loader.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_on_change_when_layout_differs(self, loader):
+        changes = []
+        cache = TopologyCache(loader, ttl=0, on_change=lambda: changes.append(1))
+
+        await cache.get()
+        await cache.get()
+        # Resized panes resolve the same
+        loader.return_value = parse_pane_records(ROWS.replace("\t80\t", "\t100\t"))
+        await cache.get()
+        assert changes == []
+
+        # Focus moved to the second pane
+        loader.return_value = parse_pane_records(
+            ROWS.replace("%0\t0\t1", "%0\t0\t0").replace("%1\t1\t0", "%1\t1\t1"))
+        await cache.get()
+        assert changes == [1]
+
+    @pytest.mark.asyncio
+    async def test_loader_error_not_cached(self, loader):
+        loader.side_effect = [RuntimeError("boom"), parse_pane_records(ROWS)]
+        cache = TopologyCache(loader, ttl=60)
+
+        with pytest.raises(RuntimeError):
+            await cache.get()
+        snapshot = await cache.get()
+
+        assert snapshot.sessions == ["default"]
+
+    @pytest.mark.asyncio
+    async def test_tmux_error_gives_empty_snapshot(self):
+        snapshot = await TopologyCache(AsyncMock(return_value=None)).get()
+
+        assert snapshot.sessions == []
+        assert snapshot.hierarchy == {}
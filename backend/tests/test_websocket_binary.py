@@ -0,0 +1,162 @@
+"""Tests for the binary WebSocket frame format"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock
+
+from app.websocket import binary
+from app.websocket.frames import FrameStream, apply_delta
+from app.websocket.manager import ConnectionManager
+
+SCREEN = "\x1b[1;32muser@host\x1b[0m:~$ ls\nfile \"quoted\" \\ backslash\n\x1b[31mred\x1b[0m"
+
+
+class TestEncodeDecode:
+    """Tests for the header, payload encodings and reference decoder"""
+
+    def test_header_layout(self):
+        data = binary.encode(binary.OUTPUT, b"abc", seq=7, target_id=3, base=0, timestamp_ms=1234)
+
+        assert binary.HEADER.size == 24
+        assert data[:4] == bytes([1, binary.OUTPUT, 0, 0])
+        assert data[4:8] == (7).to_bytes(4, "big")
+        assert data[8:12] == (3).to_bytes(4, "big")
+        assert data[16:24] == (1234).to_bytes(8, "big")
+        assert data[24:] == b"abc"
+
+    def test_output_frame_is_raw_utf8(self):
+        frame = FrameStream("main").update(SCREEN)
+
+        _, data = frame.binary_message("keyframe", target_id=5)
+        decoded = binary.decode(data)
+
+        assert decoded.type == binary.OUTPUT
+        assert decoded.seq == frame.seq
+        assert decoded.target_id == 5
+        assert decoded.timestamp_ms == frame.timestamp_ms
+        assert decoded.text == SCREEN
+        assert len(data) == binary.HEADER.size + len(SCREEN.encode())
+        assert len(data) < len(frame.keyframe_message())
+
+    def test_delta_roundtrip(self):
+        stream = FrameStream("main")
+        lines = [f"line {i} " + "." * 40 for i in range(20)]
+        first = stream.update("\n".join(lines))
+        second = stream.update("\n".join(lines[:3] + ["changed", ""] + lines[5:] + ["added"]))
+
+        _, data = second.binary_message("delta", target_id=1)
+        decoded = binary.decode(data)
+        delta = decoded.message()
+
+        assert decoded.type == binary.DELTA
+        assert decoded.base == first.seq
+        assert apply_delta(first.lines, delta["line_count"], delta["changes"]) == second.lines
+
+    def test_render_profiles(self):
+        frame = FrameStream("main").update(SCREEN)
+
+        plain = binary.decode(frame.binary_message("keyframe", 1, profile="plain")[1])
+        spans = binary.decode(frame.binary_message("keyframe", 1, compressed=True, profile="spans")[1])
+
+        assert plain.flags == 0
+        assert plain.text == "user@host:~$ ls\nfile \"quoted\" \\ backslash\nred"
+        assert spans.flags == binary.FLAG_JSON | binary.FLAG_ZSTD
+        assert spans.message() == json.loads(frame.binary_payload("keyframe", "spans"))
+        assert spans.message()["lines"][0][0] == ["user@host", 0]
+
+    def test_empty_lines_survive_delta(self):
+        payload = binary.encode_delta_payload(3, [{"start": 0, "lines": ["", ""]}])
+
+        assert binary.decode_delta_payload(payload) == {
+            "line_count": 3, "changes": [{"start": 0, "lines": ["", ""]}]}
+
+    def test_control_and_keepalive_frames(self):
+        heartbeat = binary.decode(binary.heartbeat_frame(2))
+        pong = binary.decode(binary.pong_frame(2))
+        control = binary.decode(binary.target_announcement("main:0", 2))
+
+        assert (heartbeat.type, heartbeat.payload, heartbeat.target_id) == (binary.HEARTBEAT, b"", 2)
+        assert pong.type == binary.PONG
+        assert control.type == binary.CONTROL
+        assert control.message() == {"type": "target", "id": 2, "target": "main:0"}
+
+    def test_rejects_unknown_version_and_short_frames(self):
+        data = bytearray(binary.heartbeat_frame(1))
+        data[0] = 2
+
+        with pytest.raises(ValueError):
+            binary.decode(bytes(data))
+        with pytest.raises(ValueError):
+            binary.decode(b"\x01\x03")
+
+    def test_compressed_frame_with_dictionary(self):
+        stream = FrameStream("main")
+        stream.codec.train_samples = 16
+        stream.codec.dict_size = 4096
+        frames = [stream.update(f"{SCREEN}\nline {i}\n" + "x" * (i % 7)) for i in range(20)]
+        for frame in frames:
+            dict_id, data = frame.binary_message("keyframe", target_id=1, compressed=True)
+
+        dictionary = binary.decode(binary.dictionary_frame(dict_id, stream.codec.dictionary, 1))
+        decoded = binary.decode(data, {dictionary.seq: dictionary.payload})
+
+        assert dict_id != 0
+        assert decoded.flags & binary.FLAG_ZSTD
+        assert decoded.text == frames[-1].content
+        with pytest.raises(ValueError):
+            binary.decode(data)
+
+    def test_frame_encoded_once(self):
+        frame = FrameStream("main").update(SCREEN)
+
+        assert frame.binary_message("full", 1) is frame.binary_message("full", 1)
+
+    def test_client_messages(self):
+        assert binary.parse_client_message(binary.encode_client_message({"type": "ping"})) == {"type": "ping"}
+        assert binary.parse_client_message(
+            binary.encode_client_message({"type": "resync"})) == {"type": "resync"}
+        assert binary.parse_client_message(b"garbage") is None
+        assert binary.parse_client_message(binary.encode(binary.CONTROL, b"not json")) is None
+
+
+class TestBinaryConnections:
+    """Tests for binary-format delivery in ConnectionManager"""
+
+    @pytest.mark.asyncio
+    async def test_announces_target_and_sends_bytes(self):
+        manager = ConnectionManager()
+        ws = AsyncMock()
+        await manager.connect(ws, "main", binary_frames=True)
+        try:
+            await manager.send_heartbeat(ws, "main")
+            await manager.send_personal_message('{"type":"error"}', ws, "main")
+            await manager.broadcast_frame("main", FrameStream("main").update(SCREEN))
+            for _ in range(5):
+                await asyncio.sleep(0)
+        finally:
+            manager.disconnect(ws, "main")
+
+        ws.accept.assert_called_once_with(subprotocol=binary.SUBPROTOCOL)
+        ws.send_text.assert_not_called()
+        decoded = [binary.decode(c.args[0]) for c in ws.send_bytes.call_args_list]
+        assert [d.type for d in decoded] == [binary.CONTROL, binary.HEARTBEAT, binary.CONTROL, binary.OUTPUT]
+        target_id = decoded[0].message()["id"]
+        assert all(d.target_id == target_id for d in decoded)
+        assert decoded[2].message() == {"type": "error"}
+        assert decoded[3].text == SCREEN
+
+    @pytest.mark.asyncio
+    async def test_target_ids_are_shared_per_target(self):
+        manager = ConnectionManager()
+        a, b, c = AsyncMock(), AsyncMock(), AsyncMock()
+        await manager.connect(a, "main", binary_frames=True)
+        await manager.connect(b, "main", binary_frames=True)
+        await manager.connect(c, "other", binary_frames=True)
+        try:
+            ids = [manager.connection_states[ws].target_id for ws in (a, b, c)]
+        finally:
+            for ws, target in ((a, "main"), (b, "main"), (c, "other")):
+                manager.disconnect(ws, target)
+
+        assert ids[0] == ids[1] != ids[2]
+        assert manager.target_ids == {}
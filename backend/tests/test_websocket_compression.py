@@ -0,0 +1,156 @@
+"""Tests for negotiated frame compression"""
+import asyncio
+import base64
+import hashlib
+import json
+import pytest
+import zstandard
+from unittest.mock import AsyncMock
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, OP_PING, OP_TEXT
+
+from app.websocket.compression import MULTIPLEXED_STATS_KEY, ZstdFrameCodec, deflate_stats
+from app.websocket.deflate import MeasuredDeflate, stats_key
+from app.websocket.frames import FrameStream
+from app.websocket.manager import ConnectionManager
+
+
+def screen(i):
+    prompt = "\x1b[1;32muser@host\x1b[0m:\x1b[1;34m~/project\x1b[0m$ "
+    rows = [f"{prompt}ls -la  # {i}"]
+    rows += [f"-rw-r--r-- 1 user user {n * 37:>6} Jan {n % 28 + 1:>2} file_{(n + i) % 90}.txt" for n in range(40)]
+    return "\n".join(rows)
+
+
+def decompress(payload, dictionaries):
+    dict_id = zstandard.get_frame_parameters(payload).dict_id
+    if dict_id:
+        return zstandard.ZstdDecompressor(dict_data=dictionaries[dict_id]).decompress(payload).decode()
+    return zstandard.ZstdDecompressor().decompress(payload).decode()
+
+
+class TestZstdFrameCodec:
+    """Tests for ZstdFrameCodec"""
+
+    def test_roundtrip_without_dictionary(self):
+        codec = ZstdFrameCodec(train_samples=1000)
+
+        dict_id, payload = codec.compress(screen(0))
+
+        assert dict_id == 0
+        assert decompress(payload, {}) == screen(0)
+
+    def test_trains_dictionary_after_samples(self):
+        codec = ZstdFrameCodec(train_samples=32, dict_size=4096)
+        for i in range(32):
+            codec.compress(screen(i))
+
+        dict_id, payload = codec.compress(screen(99))
+        message = json.loads(codec.dictionary_message())
+        dictionary = zstandard.ZstdCompressionDict(base64.b64decode(message["data"]))
+
+        assert dict_id != 0
+        assert message["type"] == "zstd_dictionary"
+        assert message["id"] == dict_id == dictionary.dict_id()
+        assert decompress(payload, {dict_id: dictionary}) == screen(99)
+
+    def test_retrains_when_ratio_degrades(self):
+        codec = ZstdFrameCodec(train_samples=16, dict_size=4096)
+        for i in range(32):
+            codec.compress(screen(i))
+        first = codec.dict_id
+        assert codec.baseline is not None
+
+        # Similar screens keep the dictionary
+        for i in range(16, 32):
+            codec.compress(screen(i))
+        assert codec.dict_id == first
+
+        # The pane switches to unrelated content
+        for i in range(32):
+            codec.compress("\n".join(hashlib.sha256(f"{i}.{n}".encode()).hexdigest() for n in range(40)))
+        second = codec.dict_id
+
+        assert second not in (0, first)
+        assert codec.trainings == 2
+        # The previous dictionary stays available for frames compressed with it
+        assert codec.knows(first) and codec.dictionary_for(first) is not None
+        assert json.loads(codec.dictionary_message(first))["id"] == first
+        dict_id, payload = codec.compress(screen(0))
+        dictionary = zstandard.ZstdCompressionDict(codec.dictionary_for(dict_id))
+        assert decompress(payload, {dict_id: dictionary}) == screen(0)
+
+    def test_stats(self):
+        codec = ZstdFrameCodec(train_samples=1000)
+        for i in range(5):
+            codec.compress(screen(i))
+
+        stats = codec.stats.as_dict()
+
+        assert stats["messages"] == 5
+        assert stats["ratio"] > 2
+        assert stats["compressed_bytes"] < stats["raw_bytes"]
+
+    def test_frame_compressed_once(self):
+        stream = FrameStream("default")
+        frame = stream.update(screen(0))
+
+        assert frame.compressed("full") is frame.compressed("full")
+        assert stream.compression_stats()["messages"] == 1
+
+
+class TestZstdConnections:
+    """Tests for zstd-mode delivery in ConnectionManager"""
+
+    @pytest.mark.asyncio
+    async def test_dictionary_sent_before_first_frame_using_it(self):
+        manager = ConnectionManager()
+        ws = AsyncMock()
+        await manager.connect(ws, "default", compression="zstd")
+        stream = FrameStream("default")
+        stream.codec.train_samples = 8
+        stream.codec.dict_size = 4096
+        try:
+            for i in range(10):
+                await manager.broadcast_frame("default", stream.update(screen(i)))
+                for _ in range(5):
+                    await asyncio.sleep(0)
+        finally:
+            manager.disconnect(ws, "default")
+
+        texts = [c.args[0] for c in ws.send_text.call_args_list]
+        binaries = [c.args[0] for c in ws.send_bytes.call_args_list]
+        assert len(binaries) == 10
+        assert len(texts) == 1
+        dictionary_message = json.loads(texts[0])
+        dictionaries = {dictionary_message["id"]: zstandard.ZstdCompressionDict(
+            base64.b64decode(dictionary_message["data"]))}
+        decoded = [json.loads(decompress(payload, dictionaries)) for payload in binaries]
+        assert [m["content"] for m in decoded] == [screen(i) for i in range(10)]
+        assert zstandard.get_frame_parameters(binaries[-1]).dict_id == dictionary_message["id"]
+
+
+class TestMeasuredDeflate:
+    """Tests for permessage-deflate statistics"""
+
+    def test_records_data_frames_only(self):
+        extension = MeasuredDeflate(PerMessageDeflate(False, False, 15, 15), "main")
+        deflate_stats.pop("main", None)
+        try:
+            data = screen(0).encode()
+            encoded = extension.encode(Frame(OP_TEXT, data))
+            extension.encode(Frame(OP_PING, b"x"))
+
+            stats = deflate_stats["main"].as_dict()
+            assert stats["messages"] == 1
+            assert stats["raw_bytes"] == len(data)
+            assert stats["compressed_bytes"] == len(encoded.data) < len(data)
+            assert extension.name == "permessage-deflate"
+        finally:
+            deflate_stats.pop("main", None)
+
+    def test_stats_keys(self):
+        assert stats_key("/api/tmux/ws/main:0.1") == "main:0.1"
+        assert stats_key("/api/tmux/ws") == MULTIPLEXED_STATS_KEY
+        assert stats_key("/api/tmux/ws/") == MULTIPLEXED_STATS_KEY
+        assert stats_key("/api/files/ws") is None
@@ -0,0 +1,220 @@
+"""Tests for versioned WebSocket output frames"""
+import json
+import pytest
+from unittest.mock import patch
+
+from app.websocket import frames
+from app.models import TmuxOutput
+from app.websocket.frames import FrameStream, apply_delta, diff_lines, heartbeat_message, pong_message
+
+
+def screen(rows):
+    return "\n".join(rows)
+
+
+BASE = [f"line {i} " + "x" * 40 for i in range(20)]
+
+
+class TestDiffLines:
+    """Tests for diff_lines / apply_delta"""
+
+    def test_single_changed_line(self):
+        new = list(BASE)
+        new[5] = "spinner |"
+
+        assert diff_lines(BASE, new) == [{"start": 5, "lines": ["spinner |"]}]
+
+    def test_consecutive_changes_grouped(self):
+        new = list(BASE)
+        new[3], new[4], new[9] = "a", "b", "c"
+
+        assert diff_lines(BASE, new) == [
+            {"start": 3, "lines": ["a", "b"]},
+            {"start": 9, "lines": ["c"]},
+        ]
+
+    @pytest.mark.parametrize("new", [
+        BASE[:12],
+        BASE + ["extra", "rows"],
+        ["changed"] + BASE[1:15] + ["tail"],
+    ])
+    def test_apply_delta_roundtrip(self, new):
+        assert apply_delta(BASE, len(new), diff_lines(BASE, new)) == new
+
+
+class TestFrameStream:
+    """Tests for FrameStream sequencing"""
+
+    def test_first_frame_is_keyframe(self):
+        frame = FrameStream("default").update(screen(BASE))
+
+        assert frame.seq == 1
+        assert frame.delta_message() is None
+        assert json.loads(frame.keyframe_message())["content"] == screen(BASE)
+
+    def test_unchanged_content_yields_nothing(self):
+        stream = FrameStream("default")
+        stream.update(screen(BASE))
+
+        assert stream.update(screen(BASE)) is None
+
+    def test_small_change_is_delta(self):
+        stream = FrameStream("default")
+        stream.update(screen(BASE))
+        new = list(BASE)
+        new[19] = "spinner /"
+
+        frame = stream.update(screen(new))
+        message = json.loads(frame.delta_message())
+
+        assert message["type"] == "delta"
+        assert message["seq"] == 2
+        assert message["base"] == 1
+        assert message["line_count"] == 20
+        assert message["changes"] == [{"start": 19, "lines": ["spinner /"]}]
+        assert len(frame.delta_message()) < len(frame.full_message()) / 5
+
+    def test_large_change_is_keyframe(self):
+        stream = FrameStream("default")
+        stream.update(screen(BASE))
+
+        frame = stream.update(screen([line.upper() for line in BASE]))
+
+        assert frame.delta_message() is None
+
+    def test_periodic_keyframe(self):
+        stream = FrameStream("default")
+        stream.update(screen(BASE))
+        with patch.object(frames, 'KEYFRAME_INTERVAL', 3):
+            kinds = []
+            for i in range(6):
+                new = list(BASE)
+                new[0] = f"tick {i}"
+                frame = stream.update(screen(new))
+                kinds.append("delta" if frame.delta_message() else "key")
+
+        assert kinds == ["delta", "delta", "key", "delta", "delta", "key"]
+
+    def test_full_message_matches_legacy_format(self):
+        frame = FrameStream("main:0").update("hello \x1b[1mworld\x1b[0m \"quoted\"")
+
+        message = json.loads(frame.full_message())
+        assert TmuxOutput(**message).content == frame.content
+        assert list(message) == ["content", "timestamp", "target"]
+
+    def test_messages_encoded_once(self):
+        frame = FrameStream("default").update("hello")
+
+        assert frame.full_message() is frame.full_message()
+        assert frame.keyframe_message() is frame.keyframe_message()
+
+    def test_fresh_content(self):
+        stream = FrameStream("default")
+        assert stream.fresh_content(1.0) is None
+
+        with patch.object(frames.time, "monotonic", return_value=100.0):
+            stream.update(screen(BASE))
+        with patch.object(frames.time, "monotonic", return_value=105.0):
+            stream.update(screen(BASE))  # Unchanged captures count too
+        with patch.object(frames.time, "monotonic", return_value=105.5):
+            assert stream.fresh_content(1.0) == screen(BASE)
+        with patch.object(frames.time, "monotonic", return_value=106.5):
+            assert stream.fresh_content(1.0) is None
+
+    def test_message_for_client_state(self):
+        stream = FrameStream("default")
+        stream.update(screen(BASE))
+        new = list(BASE)
+        new[0] = "changed"
+        frame = stream.update(screen(new))
+
+        assert frame.message_for(delta=False, client_seq=1) == frame.full_message()
+        assert frame.message_for(delta=True, client_seq=1) == frame.delta_message()
+        assert frame.message_for(delta=True, client_seq=None) == frame.keyframe_message()
+        assert frame.message_for(delta=True, client_seq=0) == frame.keyframe_message()
+
+
+class TestControlEnvelopes:
+    """Tests for the precomputed heartbeat/pong envelopes"""
+
+    @pytest.mark.parametrize("build,kind", [(heartbeat_message, "heartbeat"), (pong_message, "pong")])
+    def test_envelope_is_valid_json(self, build, kind):
+        message = json.loads(build())
+
+        assert message["type"] == kind
+        assert set(message) == {"type", "timestamp"}
+
+
+class TestRenderProfiles:
+    """Tests for the plain and spans render profiles"""
+
+    ROWS = [f"\x1b[1mrow {i}\x1b[0m " + "-" * 40 for i in range(20)]
+
+    def test_plain_keyframe_and_delta(self):
+        stream = FrameStream("default")
+        first = stream.update(screen(self.ROWS))
+        rows = list(self.ROWS)
+        rows[3] = "\x1b[31mred\x1b[0m"
+        second = stream.update(screen(rows))
+
+        keyframe = json.loads(first.keyframe_message("plain"))
+        delta = json.loads(second.delta_message("plain"))
+        assert keyframe["content"].split("\n")[0] == "row 0 " + "-" * 40
+        assert delta["changes"] == [{"start": 3, "lines": ["red"]}]
+        assert TmuxOutput(**json.loads(first.full_message("plain"))).content == keyframe["content"]
+
+    def test_spans_keyframe(self):
+        frame = FrameStream("default").update("\x1b[1mbold\x1b[0m text")
+
+        message = json.loads(frame.keyframe_message("spans"))
+
+        assert "content" not in message
+        assert message["profile"] == "spans"
+        assert message["styles"] == [{"bold": True}, {}]
+        assert message["lines"] == [[["bold", 0], [" text", 1]]]
+
+    def test_spans_delta_resends_lines_whose_inherited_style_changed(self):
+        stream = FrameStream("default")
+        rows = ["prompt"] + [f"output line {i} " + "." * 40 for i in range(10)]
+        stream.update(screen(rows))
+        rows[0] = "prompt \x1b[32m"
+        frame = stream.update(screen(rows))
+
+        raw = json.loads(frame.delta_message())
+        spans = json.loads(frame.delta_message("spans"))
+
+        assert raw["changes"] == [{"start": 0, "lines": ["prompt \x1b[32m"]}]
+        assert [change["start"] for change in spans["changes"]] == [0]
+        assert len(spans["changes"][0]["lines"]) == len(rows)
+        assert spans["styles"][spans["changes"][0]["lines"][1][0][1]] == {"fg": 2}
+
+    def test_each_profile_rendered_once(self):
+        frame = FrameStream("default").update(screen(self.ROWS))
+
+        with patch.object(frames.ansi, "strip_ansi", wraps=frames.ansi.strip_ansi) as strip:
+            frame.full_message("plain")
+            frame.keyframe_message("plain")
+            frame.binary_payload("keyframe", "plain")
+
+        assert strip.call_count == len(self.ROWS)
+        assert frame.keyframe_message("spans") is frame.keyframe_message("spans")
+        assert frame.keyframe_message("raw") is frame.keyframe_message()
+
+
+class TestChoiceEvents:
+    """Tests for choices events on frames"""
+
+    def test_menu_events(self):
+        stream = FrameStream("main:0")
+        assert stream.update(screen(BASE)).choices is None
+        frame = stream.update(screen(BASE + ["1. Yes", "2. No"]))
+
+        message = json.loads(frame.choices_message())
+        assert message["type"] == "choices"
+        assert message["seq"] == frame.seq
+        assert message["choices"] == [{"number": 1, "text": "Yes"}, {"number": 2, "text": "No"}]
+        assert stream.current_choices_message() == frame.choices_message()
+
+        cleared = stream.update(screen(BASE + ["$"]))
+        assert json.loads(cleared.choices_message())["choices"] == []
+        assert stream.current_choices_message() is None
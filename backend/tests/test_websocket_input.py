@@ -0,0 +1,112 @@
+"""Tests for keystroke input over the WebSocket"""
+import asyncio
+import json
+import pytest
+
+from app.services.tmux_service import MAX_INPUT_ITEMS
+from app.websocket.input import InputQueue, parse_input_message
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+class TestParseInputMessage:
+    """Tests for input message parsing"""
+
+    @pytest.mark.parametrize("message,expected", [
+        ({"seq": 1, "items": [{"text": "ls"}, {"key": "Enter"}]}, (1, [("text", "ls"), ("key", "Enter")])),
+        ({"seq": 2, "key": "C-c"}, (2, [("key", "C-c")])),
+        ({"seq": 3, "text": "y"}, (3, [("text", "y")])),
+        ({"seq": 4, "items": [{"text": "a", "key": "Enter"}]}, (4, None)),
+        ({"seq": 5, "items": [{"key": "C-c Enter"}]}, (5, None)),
+        ({"seq": 6}, (6, None)),
+        ({"items": [{"text": "ls"}]}, (None, None)),
+        ({"seq": True, "text": "x"}, (None, None)),
+    ])
+    def test_parse(self, message, expected):
+        assert parse_input_message({"type": "input", **message}) == expected
+
+
+class TestInputQueue:
+    """Tests for ordering, burst merging and acks"""
+
+    @staticmethod
+    def make_queue():
+        sent, acks = [], []
+        release = asyncio.Event()
+        release.set()
+
+        async def send(items):
+            await release.wait()
+            sent.append(items)
+            return True
+
+        async def ack(message):
+            acks.append(json.loads(message))
+
+        return InputQueue(send, ack), sent, acks, release
+
+    @pytest.mark.asyncio
+    async def test_burst_merged_while_call_in_flight(self):
+        queue, sent, acks, release = self.make_queue()
+        release.clear()
+        queue.submit(1, [("text", "l")])
+        await settle()
+        for seq, ch in enumerate("s -la", start=2):
+            queue.submit(seq, [("text", ch)])
+        queue.submit(7, [("key", "Enter")])
+
+        release.set()
+        await settle()
+        queue.close()
+
+        assert sent == [[("text", "l")], [("text", c) for c in "s -la"] + [("key", "Enter")]]
+        assert [(a["seq"], a["count"], a["ok"]) for a in acks] == [(1, 1, True), (7, 6, True)]
+        assert (queue.calls, queue.messages) == (2, 7)
+
+    @pytest.mark.asyncio
+    async def test_retransmits_dropped(self):
+        queue, sent, acks, _ = self.make_queue()
+
+        assert queue.submit(5, [("text", "a")]) is True
+        assert queue.submit(5, [("text", "a")]) is False
+        assert queue.submit(3, [("text", "b")]) is False
+        await settle()
+        queue.close()
+
+        assert sent == [[("text", "a")]]
+
+    @pytest.mark.asyncio
+    async def test_invalid_message_keeps_its_place(self):
+        queue, sent, acks, release = self.make_queue()
+        release.clear()
+        queue.submit(1, [("text", "a")])
+        await settle()
+        queue.submit(2, [("text", "b")])
+        queue.submit(3, None)
+        queue.submit(4, [("text", "c")])
+
+        release.set()
+        await settle()
+        queue.close()
+
+        assert sent == [[("text", "a")], [("text", "b")], [("text", "c")]]
+        assert [(a["seq"], a["ok"]) for a in acks] == [(1, True), (2, True), (3, False), (4, True)]
+        assert acks[2]["error"] == "invalid input"
+
+    @pytest.mark.asyncio
+    async def test_merge_respects_item_limit(self):
+        queue, sent, acks, release = self.make_queue()
+        release.clear()
+        queue.submit(0, [("key", "Up")])
+        await settle()
+        for seq in range(1, MAX_INPUT_ITEMS + 2):
+            queue.submit(seq, [("key", "Up")])
+
+        release.set()
+        await settle()
+        queue.close()
+
+        assert [len(items) for items in sent] == [1, MAX_INPUT_ITEMS, 1]
@@ -1,16 +1,39 @@
 """Tests for WebSocket connection manager"""
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
-from app.websocket.manager import ConnectionManager
+from app.websocket.frames import FrameStream
+from app.websocket.manager import CONTROL_QUEUE_LIMIT, ConnectionManager, ConnectionState
+
+
+async def drain():
+    """Let connection writer tasks send what is queued"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def stop_writers(manager):
+    writers = [state.writer for state in manager.connection_states.values() if state.writer is not None]
+    for writer in writers:
+        writer.cancel()
+    await asyncio.gather(*writers, return_exceptions=True)
+
+
+def blocking_send(released):
+    async def send_text(message):
+        await released.wait()
+    return AsyncMock(side_effect=send_text)
 
 
 class TestConnectionManager:
     """Tests for ConnectionManager class"""
 
     @pytest.fixture
-    def manager(self):
+    async def manager(self):
         """Create a fresh ConnectionManager for each test"""
-        return ConnectionManager()
+        manager = ConnectionManager()
+        yield manager
+        await stop_writers(manager)
 
     @pytest.fixture
     def mock_websocket(self):
@@ -186,3 +209,324 @@ class TestConnectionManager:
         manager.active_connections["session2"] = [ws3]
 
         assert manager.get_total_connections() == 3
+
+
+class TestConnectionManagerFrames:
+    """Tests for per-connection frame encoding"""
+
+    @pytest.fixture
+    async def manager(self):
+        manager = ConnectionManager()
+        yield manager
+        await stop_writers(manager)
+
+    @staticmethod
+    def make_ws():
+        ws = AsyncMock()
+        ws.accept = AsyncMock()
+        ws.send_text = AsyncMock()
+        return ws
+
+    @pytest.mark.asyncio
+    async def test_delta_and_legacy_clients(self, manager):
+        legacy, modern = self.make_ws(), self.make_ws()
+        await manager.connect(legacy, "default")
+        await manager.connect(modern, "default", delta=True)
+        stream = FrameStream("default")
+        rows = [f"row {i} " + "-" * 30 for i in range(10)]
+
+        first = stream.update("\n".join(rows))
+        await manager.broadcast_frame("default", first)
+        await drain()
+        rows[9] = "changed"
+        second = stream.update("\n".join(rows))
+        await manager.broadcast_frame("default", second)
+        await drain()
+
+        assert [c.args[0] for c in legacy.send_text.call_args_list] == [
+            first.full_message(), second.full_message()
+        ]
+        assert [c.args[0] for c in modern.send_text.call_args_list] == [
+            first.keyframe_message(), second.delta_message()
+        ]
+
+    @pytest.mark.asyncio
+    async def test_late_joiner_gets_keyframe_instead_of_delta(self, manager):
+        stream = FrameStream("default")
+        rows = [f"row {i} " + "-" * 30 for i in range(10)]
+        stream.update("\n".join(rows))
+        rows[0] = "changed"
+        frame = stream.update("\n".join(rows))
+        ws = self.make_ws()
+        await manager.connect(ws, "default", delta=True)
+
+        await manager.broadcast_frame("default", frame)
+        await drain()
+
+        ws.send_text.assert_called_once_with(frame.keyframe_message())
+
+    @pytest.mark.asyncio
+    async def test_send_frame_forced_keyframe(self, manager):
+        ws = self.make_ws()
+        await manager.connect(ws, "default", delta=True)
+        frame = FrameStream("default").update("hello")
+        await manager.broadcast_frame("default", frame)
+        await drain()
+
+        await manager.send_frame(ws, "default", frame, keyframe=True)
+        await drain()
+
+        assert ws.send_text.call_args_list[-1].args[0] == frame.keyframe_message()
+
+    def test_disconnect_drops_state(self, manager):
+        ws = self.make_ws()
+        manager.active_connections["default"] = [ws]
+        manager.connection_states[ws] = ConnectionState()
+
+        manager.disconnect(ws, "default")
+
+        assert ws not in manager.connection_states
+
+
+class TestConnectionManagerQueues:
+    """Tests for per-connection send queues and backpressure"""
+
+    @pytest.fixture
+    async def manager(self):
+        manager = ConnectionManager()
+        yield manager
+        await stop_writers(manager)
+
+    @staticmethod
+    def make_ws():
+        ws = AsyncMock()
+        ws.accept = AsyncMock()
+        ws.send_text = AsyncMock()
+        return ws
+
+    @staticmethod
+    def make_frames(count):
+        stream = FrameStream("default")
+        rows = [f"row {i} " + "-" * 30 for i in range(10)]
+        frames = []
+        for i in range(count):
+            rows[0] = f"tick {i}"
+            frames.append(stream.update("\n".join(rows)))
+        return frames
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_block_others(self, manager):
+        blocked = asyncio.Event()
+        slow, fast = self.make_ws(), self.make_ws()
+        slow.send_text = blocking_send(blocked)
+        await manager.connect(slow, "default")
+        await manager.connect(fast, "default")
+        frames = self.make_frames(3)
+
+        for frame in frames:
+            await manager.broadcast_frame("default", frame)
+            await drain()
+
+        assert [c.args[0] for c in fast.send_text.call_args_list] == [f.full_message() for f in frames]
+        blocked.set()
+        await drain()
+        # The slow client skipped the frame that was superseded while it was stuck
+        assert [c.args[0] for c in slow.send_text.call_args_list] == [
+            frames[0].full_message(), frames[2].full_message()
+        ]
+        stats = {s["frames_sent"]: s for s in manager.get_connection_stats()}
+        assert stats[2]["frames_dropped"] == 1
+        assert stats[3]["frames_dropped"] == 0
+
+    @pytest.mark.asyncio
+    async def test_dropped_deltas_fall_back_to_keyframe(self, manager):
+        blocked = asyncio.Event()
+        ws = self.make_ws()
+        ws.send_text = blocking_send(blocked)
+        await manager.connect(ws, "default", delta=True)
+        frames = self.make_frames(4)
+
+        for frame in frames:
+            await manager.broadcast_frame("default", frame)
+            await drain()
+        blocked.set()
+        await drain()
+
+        sent = [c.args[0] for c in ws.send_text.call_args_list]
+        assert sent == [frames[0].keyframe_message(), frames[3].keyframe_message()]
+
+    @pytest.mark.asyncio
+    async def test_control_messages_never_dropped(self, manager):
+        blocked = asyncio.Event()
+        ws = self.make_ws()
+        ws.send_text = blocking_send(blocked)
+        await manager.connect(ws, "default")
+
+        for i in range(5):
+            await manager.send_personal_message(f"pong {i}", ws, "default")
+        for frame in self.make_frames(3):
+            await manager.broadcast_frame("default", frame)
+        await drain()
+        # "pong 0" is being sent; four pongs and the newest frame wait
+        assert manager.get_connection_stats()[0]["queue_depth"] == 5
+        blocked.set()
+        await drain()
+
+        sent = [c.args[0] for c in ws.send_text.call_args_list]
+        assert sent[:5] == [f"pong {i}" for i in range(5)]
+        assert len(sent) == 6
+
+    @pytest.mark.asyncio
+    async def test_control_overflow_disconnects(self, manager):
+        ws = self.make_ws()
+        ws.send_text = blocking_send(asyncio.Event())
+        await manager.connect(ws, "default")
+
+        for i in range(CONTROL_QUEUE_LIMIT + 1):
+            await manager.send_personal_message(f"pong {i}", ws, "default")
+        await drain()
+
+        assert not manager.has_connections_for_session("default")
+        ws.close.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_send_error_disconnects(self, manager):
+        ws = self.make_ws()
+        ws.send_text.side_effect = Exception("Connection closed")
+        await manager.connect(ws, "default")
+
+        await manager.send_personal_message("hello", ws, "default")
+        await drain()
+
+        assert not manager.has_connections_for_session("default")
+        assert ws not in manager.connection_states
+
+
+class TestConnectionManagerProfiles:
+    """Tests for per-connection render profiles"""
+
+    @pytest.fixture
+    async def manager(self):
+        manager = ConnectionManager()
+        yield manager
+        await stop_writers(manager)
+
+    @pytest.mark.asyncio
+    async def test_each_connection_gets_its_profile(self, manager):
+        sockets = {}
+        for profile in ("raw", "plain", "spans"):
+            ws = AsyncMock()
+            await manager.connect(ws, "default", delta=True, profile=profile)
+            sockets[profile] = ws
+        frame = FrameStream("default").update("\x1b[1mhi\x1b[0m")
+
+        await manager.broadcast_frame("default", frame)
+        await drain()
+
+        for profile, ws in sockets.items():
+            ws.send_text.assert_called_once_with(frame.keyframe_message(profile))
+        assert {s["profile"] for s in manager.get_connection_stats()} == {"raw", "plain", "spans"}
+
+
+class TestConnectionManagerSubscriptions:
+    """Tests for multiplexed connections"""
+
+    @pytest.fixture
+    async def manager(self):
+        manager = ConnectionManager()
+        yield manager
+        await stop_writers(manager)
+
+    @staticmethod
+    def sent(ws):
+        return [call.args[0] for call in ws.send_text.call_args_list]
+
+    @pytest.mark.asyncio
+    async def test_subscribe_and_tagged_frames(self, manager):
+        ws = AsyncMock()
+        await manager.accept(ws, delta=True)
+        first = manager.subscribe(ws, "a")
+        second = manager.subscribe(ws, "b")
+        frame_a = FrameStream("a").update("in a")
+        frame_b = FrameStream("b").update("in b")
+
+        await manager.broadcast_frame("a", frame_a)
+        await manager.broadcast_frame("b", frame_b)
+        await drain()
+
+        assert first != second
+        assert manager.subscribe(ws, "a") == first
+        assert self.sent(ws) == [
+            '{"type":"subscribed","target":"a","id":%d}' % first,
+            '{"type":"subscribed","target":"b","id":%d}' % second,
+            frame_a.message("keyframe", target_id=first),
+            frame_b.message("keyframe", target_id=second),
+        ]
+        assert self.sent(ws)[2].startswith('{"id":%d,"type":"keyframe"' % first)
+
+    @pytest.mark.asyncio
+    async def test_unsubscribe_stops_frames(self, manager):
+        ws = AsyncMock()
+        await manager.accept(ws)
+        manager.subscribe(ws, "a")
+        frame = FrameStream("a").update("queued")
+        await manager.broadcast_frame("a", frame)
+
+        assert manager.unsubscribe(ws, "a")
+        assert not manager.unsubscribe(ws, "a")
+        await manager.broadcast_frame("a", frame)
+        await drain()
+
+        assert len(self.sent(ws)) == 1  # Only the subscribed message
+        assert not manager.has_connections_for_session("a")
+        assert manager.target_ids == {}
+
+    @pytest.mark.asyncio
+    async def test_messages_about_a_target_are_tagged(self, manager):
+        ws = AsyncMock()
+        await manager.accept(ws)
+        target_id = manager.subscribe(ws, "a")
+
+        await manager.broadcast_to_session("a", '{"type":"choices"}')
+        await manager.send_personal_message('{"type":"input_ack"}', ws, "a")
+        await manager.send_pong(ws, None)
+        await drain()
+
+        sent = self.sent(ws)[1:]
+        assert sent[:2] == ['{"id":%d,"type":"choices"}' % target_id, '{"id":%d,"type":"input_ack"}' % target_id]
+        assert sent[2].startswith('{"type":"pong"')
+
+    @pytest.mark.asyncio
+    async def test_events_only_for_clients_that_opted_in(self, manager):
+        plain, opted, delta = AsyncMock(), AsyncMock(), AsyncMock()
+        await manager.connect(plain, "a")
+        await manager.connect(opted, "a", events=True)
+        await manager.connect(delta, "a", delta=True)
+
+        await manager.broadcast_event("a", '{"type":"choices"}')
+        await drain()
+
+        assert self.sent(plain) == []
+        assert self.sent(opted) == self.sent(delta) == ['{"type":"choices"}']
+
+    @pytest.mark.asyncio
+    async def test_subscription_limit(self, manager):
+        ws = AsyncMock()
+        await manager.accept(ws)
+        with patch("app.websocket.manager.MAX_SUBSCRIPTIONS", 2):
+            assert manager.subscribe(ws, "a") is not None
+            assert manager.subscribe(ws, "b") is not None
+            assert manager.subscribe(ws, "c") is None
+
+    @pytest.mark.asyncio
+    async def test_disconnect_returns_targets(self, manager):
+        ws = AsyncMock()
+        other = AsyncMock()
+        await manager.accept(ws)
+        await manager.connect(other, "b")
+        manager.subscribe(ws, "a")
+        manager.subscribe(ws, "b")
+
+        assert manager.target_for_id(ws, manager.target_ids["b"]) == "b"
+        assert sorted(manager.disconnect(ws)) == ["a", "b"]
+        assert list(manager.active_connections) == ["b"]
@@ -34,7 +34,7 @@ class ClaudeCodeControl < Formula
       export STATE_DIR="#{var}/claude-code-control"
       export PYTHONPATH="#{libexec}"
       mkdir -p "$STATE_DIR"
-      exec "#{libexec}/bin/uvicorn" backend.app.main:app \\
+      exec "#{libexec}/bin/python" -m backend.app \\
         --host "${HOST:-0.0.0.0}" \\
         --port "${PORT:-8192}" \\
         "$@"